@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str = 'gemini', window_size: int = 20, window_seconds: float = 60.0,
+                 min_calls: int = 5, failure_rate_threshold: float = 0.5, slow_call_seconds: float = 10.0,
+                 slow_call_rate_threshold: float = 0.8, open_seconds: float = 30.0,
+                 half_open_max_calls: int = 1, clock=time.monotonic):
+        """Circuit breaker over a rolling window of call outcomes and latencies
+
+        The circuit opens once at least ``min_calls`` recent calls (the last
+        ``window_size`` within ``window_seconds``) show a failure rate or a
+        slow-call rate at or above its threshold. While open, callers should
+        skip the protected call entirely. After ``open_seconds`` up to
+        ``half_open_max_calls`` probe calls are let through: a successful
+        probe closes the circuit, a failed one re-opens it.
+        """
+        self.name = name
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._half_open_calls = 0
+        self._calls = deque(maxlen=window_size)  # (timestamp, ok, latency)
+        self._counters = {
+            'successes': 0,
+            'failures': 0,
+            'rejected': 0,
+            'opened': 0
+        }
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the cool-down has passed"""
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def _refresh_state(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+
+    def _prune(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _open(self, now: float):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._half_open_calls = 0
+        self._counters['opened'] += 1
+        print(f"🔌 Circuit '{self.name}' opened - routing to fallback for {self.open_seconds:.0f}s")
+
+    def allow_request(self) -> bool:
+        """Whether the protected call may be attempted; every allowed call must be recorded"""
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self._counters['rejected'] += 1
+            return False
+
+    def record_success(self, latency: float = 0.0):
+        """Record a completed call; slow calls count against the slow-call rate"""
+        self._record(True, latency)
+
+    def record_failure(self, latency: float = 0.0):
+        """Record a failed or timed-out call"""
+        self._record(False, latency)
+
+    def _record(self, ok: bool, latency: float):
+        with self._lock:
+            now = self._clock()
+            self._counters['successes' if ok else 'failures'] += 1
+            self._refresh_state()
+
+            if self._state == self.HALF_OPEN:
+                if ok and latency < self.slow_call_seconds:
+                    print(f"🔌 Circuit '{self.name}' closed - probe call succeeded")
+                    self._state = self.CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+            if self._state == self.OPEN:
+                return  # Late result of a call started before the circuit opened
+
+            self._calls.append((now, ok, latency))
+            self._prune(now)
+            if len(self._calls) >= self.min_calls:
+                failure_rate, slow_rate = self._rates()
+                if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                    self._open(now)
+
+    def _rates(self):
+        if not self._calls:
+            return 0.0, 0.0
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        slow = sum(1 for _, _, latency in self._calls if latency >= self.slow_call_seconds)
+        return failures / len(self._calls), slow / len(self._calls)
+
+    def trip(self):
+        """Open the circuit immediately (e.g. after a failed startup probe)"""
+        with self._lock:
+            if self._state != self.OPEN:
+                self._open(self._clock())
+
+    def reset(self):
+        """Close the circuit and forget recent outcomes"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._opened_at = None
+            self._calls.clear()
+
+    def snapshot(self) -> Dict:
+        """Circuit state and rolling-window statistics for health reporting"""
+        with self._lock:
+            now = self._clock()
+            self._refresh_state()
+            self._prune(now)
+            failure_rate, slow_rate = self._rates()
+            latencies = [latency for _, _, latency in self._calls]
+            return {
+                'name': self.name,
+                'state': self._state,
+                'window_calls': len(self._calls),
+                'failure_rate': round(failure_rate, 3),
+                'slow_call_rate': round(slow_rate, 3),
+                'avg_latency_seconds': round(sum(latencies) / len(latencies), 3) if latencies else None,
+                'max_latency_seconds': round(max(latencies), 3) if latencies else None,
+                'retry_in_seconds': round(max(0.0, self.open_seconds - (now - self._opened_at)), 1) if self._state == self.OPEN else None,
+                **self._counters
+            }
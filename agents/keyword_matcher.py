@@ -0,0 +1,233 @@
+import re
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Joins texts for batch scanning; neither character is ever part of a keyword
+BATCH_SEPARATOR = '\x00'
+BATCH_SEPARATOR_STANDIN = '\x01'
+
+def _flatten(lists) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Concatenate lists of ints into (values, start of each list, length of each list)"""
+    lists = [list(values) for values in lists]
+    lengths = np.fromiter((len(values) for values in lists), dtype=np.int64, count=len(lists))
+    starts = np.cumsum(lengths) - lengths
+    flat = np.fromiter((value for values in lists for value in values), dtype=np.int64, count=int(lengths.sum()))
+    return flat, starts, lengths
+
+def _expand(rows: np.ndarray, ids: np.ndarray, flat: np.ndarray, starts: np.ndarray,
+            lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(row, value) pairs for every value in the flattened list of each id"""
+    counts = lengths[ids]
+    first = np.cumsum(counts) - counts
+    positions = np.arange(int(counts.sum())) - np.repeat(first - starts[ids], counts)
+    return np.repeat(rows, counts), flat[positions]
+
+class KeywordMatcher:
+    def __init__(self, keyword_tables: Dict[str, Dict[str, List[str]]]):
+        """Compile keyword tables into a prefix trie and one combined regex
+
+        ``keyword_tables`` maps a table name (e.g. 'emotion', 'crisis') to an
+        ordered dict of category -> keywords. The regex is factored along the
+        trie and wrapped in a capturing lookahead, so a single C-level pass
+        over the text yields, for every offset, the longest keyword starting
+        there; its keyword prefixes give the remaining (overlapping) hits,
+        such as 'hate' inside 'hate myself'.
+        """
+        self.keyword_tables = keyword_tables
+        self.keywords: List[str] = []
+        self.keyword_labels: List[List[Tuple[str, str]]] = []
+
+        # Trie state: transitions and the keyword id ending at each state
+        self._goto: List[Dict[str, int]] = [{}]
+        self._terminal: List[int] = [-1]
+
+        keyword_ids = {}
+        for table, categories in keyword_tables.items():
+            for category, keywords in categories.items():
+                for keyword in keywords:
+                    if not keyword:
+                        continue
+                    if keyword not in keyword_ids:
+                        keyword_ids[keyword] = len(self.keywords)
+                        self.keywords.append(keyword)
+                        self.keyword_labels.append([])
+                        self._add_keyword(keyword_ids[keyword], keyword)
+                    self.keyword_labels[keyword_ids[keyword]].append((table, category))
+
+        # For every keyword, the ids of all keywords that are a prefix of it
+        # (itself included, shortest first)
+        self._prefix_ids: List[Tuple[int, ...]] = []
+        for keyword in self.keywords:
+            prefix_ids = []
+            state = 0
+            for char in keyword:
+                state = self._goto[state][char]
+                if self._terminal[state] >= 0:
+                    prefix_ids.append(self._terminal[state])
+            self._prefix_ids.append(tuple(prefix_ids))
+        self._keyword_index = keyword_ids
+
+        # Flat (CSR-style) lookups for batch scoring: keyword -> keywords it
+        # implies (its prefixes) and keyword -> table category columns, so a
+        # batch costs memory proportional to its hits, not the lexicon squared
+        self.categories: List[Tuple[str, str]] = [
+            (table, category)
+            for table, categories in keyword_tables.items()
+            for category in categories
+        ]
+        category_columns = {label: column for column, label in enumerate(self.categories)}
+        self._prefix_flat, self._prefix_starts, self._prefix_lengths = _flatten(self._prefix_ids)
+        self._label_flat, self._label_starts, self._label_lengths = _flatten(
+            [category_columns[label] for label in labels] for labels in self.keyword_labels
+        )
+
+        if self.keywords:
+            trie_pattern = self._state_pattern(0)
+            self._start_pattern = re.compile(f"(?=({trie_pattern}))", re.DOTALL)
+            # Batch variant also reports the separator joining texts together
+            self._batch_pattern = re.compile(f"(?=({re.escape(BATCH_SEPARATOR)}|{trie_pattern}))", re.DOTALL)
+        else:
+            self._start_pattern = None
+            self._batch_pattern = None
+
+    def _add_keyword(self, keyword_id: int, keyword: str):
+        """Insert a keyword into the trie"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._terminal.append(-1)
+                self._goto[state][char] = next_state
+            state = next_state
+        self._terminal[state] = keyword_id
+
+    def _state_pattern(self, state: int) -> str:
+        """Regex matching the longest keyword path below a trie state
+
+        Continuations past a complete keyword are optional and greedy, so the
+        captured text is the longest keyword starting at an offset; every
+        shorter keyword starting there is one of its prefixes.
+        """
+        branches = []
+        for char, next_state in self._goto[state].items():
+            branch = re.escape(char)
+            if self._goto[next_state]:
+                branch += f"(?:{self._state_pattern(next_state)})"
+                if self._terminal[next_state] >= 0:
+                    branch += '?'
+            branches.append(branch)
+        return '|'.join(branches)
+
+    def _match_ids(self, text: str) -> List[Tuple[int, int]]:
+        """Return (end offset, keyword id) pairs for every occurrence in text"""
+        if self._start_pattern is None:
+            return []
+        keyword_index = self._keyword_index
+        prefix_ids = self._prefix_ids
+        keywords = self.keywords
+        hits = []
+        for match in self._start_pattern.finditer(text):
+            start = match.start()
+            for keyword_id in prefix_ids[keyword_index[match.group(1)]]:
+                hits.append((start + len(keywords[keyword_id]), keyword_id))
+        return hits
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """Return every (start, end, keyword) occurrence in text, ordered by start offset"""
+        keywords = self.keywords
+        return [
+            (end - len(keywords[keyword_id]), end, keywords[keyword_id])
+            for end, keyword_id in self._match_ids(text)
+        ]
+
+    def _count_ids(self, matched: List[Tuple[int, int]]) -> Dict[str, Dict[str, int]]:
+        """Turn matched keyword ids into distinct-keyword counts per table category"""
+        hits = {}
+        for keyword_id in set(keyword_id for _, keyword_id in matched):
+            for label in self.keyword_labels[keyword_id]:
+                hits[label] = hits.get(label, 0) + 1
+
+        counts = {}
+        for table, categories in self.keyword_tables.items():
+            table_counts = {}
+            if hits:
+                for category in categories:
+                    if (table, category) in hits:
+                        table_counts[category] = hits[(table, category)]
+            counts[table] = table_counts
+        return counts
+
+    def count(self, text: str) -> Dict[str, Dict[str, int]]:
+        """Scan text once and return only the per-category counts"""
+        return self._count_ids(self._match_ids(text))
+
+    def scan(self, text: str) -> Dict:
+        """Scan text once and return per-category counts and match offsets
+
+        Counts are the number of distinct keywords of a category present in
+        the text, listed in the category order of each table and omitting
+        categories without hits. Offsets refer to ``text`` as given, so pass
+        the already-lowercased message.
+        """
+        matched = self._match_ids(text)
+        keywords = self.keywords
+        return {
+            'counts': self._count_ids(matched),
+            'matches': [
+                {
+                    'keyword': keywords[keyword_id],
+                    'start': end - len(keywords[keyword_id]),
+                    'end': end
+                }
+                for end, keyword_id in matched
+            ]
+        }
+
+    def count_batch(self, texts: List[str], chunk_size: int = 10000) -> Dict[str, np.ndarray]:
+        """Count keywords for many texts at once
+
+        Returns one int32 matrix per table, shaped (len(texts), categories),
+        with the same distinct-keyword counts ``count`` gives per text. Each
+        chunk of texts is joined and scanned by a single regex call; hits are
+        turned into counts with vectorized gathers and ``np.bincount``
+        instead of per-text Python bookkeeping.
+        """
+        counts = np.zeros((len(texts), len(self.categories)), dtype=np.int32)
+        if self._batch_pattern is not None:
+            token_ids = dict(self._keyword_index)
+            token_ids[BATCH_SEPARATOR] = -1
+            for offset in range(0, len(texts), chunk_size):
+                chunk = texts[offset:offset + chunk_size]
+                joined = BATCH_SEPARATOR.join(chunk)
+                if joined.count(BATCH_SEPARATOR) != len(chunk) - 1:
+                    joined = BATCH_SEPARATOR.join(text.replace(BATCH_SEPARATOR, BATCH_SEPARATOR_STANDIN) for text in chunk)
+
+                # Longest keyword at each offset, interleaved with separators
+                tokens = self._batch_pattern.findall(joined)
+                ids = np.fromiter(map(token_ids.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+                is_separator = ids < 0
+                rows = np.cumsum(is_separator)[~is_separator]
+
+                # Every keyword implied by each longest hit, deduplicated per text
+                keyword_rows, keyword_ids = _expand(
+                    rows, ids[~is_separator], self._prefix_flat, self._prefix_starts, self._prefix_lengths
+                )
+                present = np.unique(keyword_rows * len(self.keywords) + keyword_ids)
+                # ...then each present keyword's categories, tallied per text
+                label_rows, label_columns = _expand(
+                    present // len(self.keywords), present % len(self.keywords),
+                    self._label_flat, self._label_starts, self._label_lengths
+                )
+                counts[offset:offset + len(chunk)] = np.bincount(
+                    label_rows * len(self.categories) + label_columns,
+                    minlength=len(chunk) * len(self.categories)
+                ).reshape(len(chunk), len(self.categories))
+
+        result = {}
+        column = 0
+        for table, categories in self.keyword_tables.items():
+            result[table] = counts[:, column:column + len(categories)]
+            column += len(categories)
+        return result
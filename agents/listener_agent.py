@@ -1,5 +1,7 @@
 import re
 from typing import Dict, List
+import numpy as np
+from agents.keyword_matcher import KeywordMatcher
 
 class ListenerAgent:
     def __init__(self):
@@ -18,17 +20,25 @@ class ListenerAgent:
             'medium': ['hate myself', 'worthless', 'useless', 'no hope', 'can\'t go on', 'nothing matters'],
             'low': ['really down', 'terrible day', 'everything wrong', 'feel awful', 'can\'t handle']
         }
+        
+        self.refresh_keywords()
+    
+    def refresh_keywords(self):
+        """Compile emotion and crisis keywords into one matcher (call again after editing the lexicon)"""
+        self.keyword_matcher = KeywordMatcher({
+            'emotion': self.emotion_keywords,
+            'crisis': self.crisis_keywords
+        })
     
     def analyze_message(self, message: str) -> Dict:
         """Analyze user message for emotions and crisis indicators"""
         message_lower = message.lower()
         
+        # Single pass over the message for every emotion and crisis keyword
+        keyword_counts = self.keyword_matcher.count(message_lower)
+        
         # Analyze emotions
-        emotion_scores = {}
-        for emotion, keywords in self.emotion_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in message_lower)
-            if score > 0:
-                emotion_scores[emotion] = score
+        emotion_scores = keyword_counts['emotion']
         
         # Determine primary emotion
         if emotion_scores:
@@ -42,8 +52,9 @@ class ListenerAgent:
         crisis_level = 'none'
         needs_escalation = False
         
-        for level, keywords in self.crisis_keywords.items():
-            if any(keyword in message_lower for keyword in keywords):
+        crisis_scores = keyword_counts['crisis']
+        for level in self.crisis_keywords:
+            if level in crisis_scores:
                 crisis_level = level
                 if level in ['high', 'medium']:
                     needs_escalation = True
@@ -61,4 +72,55 @@ class ListenerAgent:
             },
             'message_length': len(message),
             'word_count': len(message.split())
-        }
\ No newline at end of file
+        }
+    
+    def analyze_batch(self, messages: List[str]) -> Dict:
+        """Analyze many messages at once, e.g. to re-score stored conversations offline
+        
+        Produces the same primary emotion, confidence and crisis decisions as
+        analyze_message, returned as NumPy arrays aligned with ``messages``
+        (emotion_counts is a messages x emotions matrix in emotion_keywords order).
+        """
+        emotions = list(self.emotion_keywords)
+        crisis_levels = list(self.crisis_keywords)
+        keyword_counts = self.keyword_matcher.count_batch([message.lower() for message in messages])
+        emotion_counts = keyword_counts['emotion']
+        crisis_counts = keyword_counts['crisis']
+        
+        message_length = np.fromiter(map(len, messages), dtype=np.int64, count=len(messages))
+        word_count = np.fromiter((len(message.split()) for message in messages), dtype=np.int64, count=len(messages))
+        rows = np.arange(len(messages))
+        
+        # Primary emotion: highest count, ties go to the first emotion listed
+        primary_emotion = np.full(len(messages), 'neutral', dtype=object)
+        confidence = np.full(len(messages), 0.5)
+        if emotions:
+            primary_index = emotion_counts.argmax(axis=1)
+            primary_score = emotion_counts[rows, primary_index]
+            has_emotion = primary_score > 0
+            primary_emotion[has_emotion] = np.array(emotions, dtype=object)[primary_index[has_emotion]]
+            confidence[has_emotion] = np.minimum(
+                primary_score[has_emotion] / word_count[has_emotion] * 10, 1.0
+            )
+        
+        # Crisis level: first level (high, medium, low) with any keyword hit
+        crisis_level = np.full(len(messages), 'none', dtype=object)
+        if crisis_levels:
+            crisis_hits = crisis_counts > 0
+            has_crisis = crisis_hits.any(axis=1)
+            level_index = crisis_hits.argmax(axis=1)
+            crisis_level[has_crisis] = np.array(crisis_levels, dtype=object)[level_index[has_crisis]]
+        needs_escalation = np.isin(crisis_level, ['high', 'medium'])
+        
+        return {
+            'emotions': emotions,
+            'emotion_counts': emotion_counts,
+            'primary_emotion': primary_emotion,
+            'confidence': confidence,
+            'crisis_levels': crisis_levels,
+            'crisis_counts': crisis_counts,
+            'crisis_level': crisis_level,
+            'needs_escalation': needs_escalation,
+            'message_length': message_length,
+            'word_count': word_count
+        }
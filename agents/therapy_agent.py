@@ -1,35 +1,237 @@
-import google.generativeai as genai
 import os
-from typing import List, Dict, Any
+import re
+from typing import List, Dict, Any, Iterator
 import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 import random
+from agents.circuit_breaker import CircuitBreaker
+from cache import create_cache
 
 class TherapyAgent:
-    def __init__(self):
-        """Initialize the Therapy Agent with Gemini 2.0 Flash"""
+    # Generation settings shared by every Gemini call
+    GENERATION_CONFIG = {
+        'temperature': 0.3,  # Lower temperature for more consistent, professional responses
+        'top_p': 0.8,        # Focused on most likely tokens for therapeutic consistency
+        'top_k': 20,         # More focused responses
+        'max_output_tokens': 400,  # Longer responses for therapeutic depth
+    }
+    
+    SAFETY_SETTINGS = [
+        {
+            "category": "HARM_CATEGORY_HARASSMENT",
+            "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+        },
+        {
+            "category": "HARM_CATEGORY_HATE_SPEECH",
+            "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+        },
+        {
+            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+            "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+        },
+        {
+            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+            "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+        },
+    ]
+    
+    # Fallback reply templates per category, rendered with the user's name at selection time
+    FALLBACK_RESPONSES = {
+        'sadness': [
+            "I can hear the sadness in what you're sharing, {username}, and I want you to acknowledge how brave it is to reach out when you're struggling. Sadness often carries important information about what matters to us. I'm curious - what thoughts have been most present for you during these difficult moments?",
+            
+            "I'm noticing the heaviness in what you're describing, {username}. When we're feeling sad, it can feel like we're carrying a weight that no one else can see. What's been the hardest part about what you're going through? Sometimes just naming the struggle can help us feel less alone in it.",
+            
+            "Thank you for trusting me with these feelings, {username}. Sadness can be so isolating, but you're not alone in this experience. What would it feel like to give yourself permission to feel this way without judgment? What do you think your sadness might be trying to tell you?",
+            
+            "I can sense the depth of what you're experiencing, {username}. Sadness often comes with a lot of self-criticism, but reaching out like this shows real strength. What's been your experience of trying to cope with these feelings? Sometimes the ways we try to help ourselves can give us important clues about what we really need."
+        ],
+        
+        'anxiety': [
+            "I notice there's a lot of worry and tension in what you're telling me, {username}. Anxiety can feel so overwhelming, like your mind is racing ahead to all the 'what-ifs.' Let's take a moment to ground ourselves in the present. Can you tell me what thoughts are contributing most to these anxious feelings?",
+            
+            "I'm hearing the anxiety in your voice, {username}, and I want you to know that anxiety is your brain's way of trying to protect you. It's working overtime, but that doesn't mean the threats are real. What would it feel like to take a few deep breaths together? What's the most immediate thing that's worrying you right now?",
+            
+            "Anxiety can feel like being stuck in a loop of worry, {username}. It's exhausting trying to manage all those 'what if' thoughts. Sometimes anxiety is our brain's way of trying to solve a problem, but it's just spinning in circles. What do you think your anxiety is trying to solve for you?",
+            
+            "I can hear how overwhelming this anxiety feels, {username}. It's like your nervous system is stuck in high alert. What would it feel like to acknowledge that your anxiety is trying to help, even if it's not being very helpful right now? What's one small thing that might help you feel a bit more grounded?"
+        ],
+        
+        'greeting': [
+            "Hello {username}! I'm here and ready to listen. How are you feeling today? What's been on your mind lately?",
+            
+            "Hi {username}! Thank you for reaching out. I'm here to support you. What would you like to talk about today?",
+            
+            "Hey {username}! I'm glad you're here. How can I help you today? What's been your experience lately?",
+            
+            "Hello {username}! I'm here to listen and support you. What's been on your mind? How are you doing?"
+        ],
+        
+        'gratitude': [
+            "You're very welcome, {username}! I'm here for you whenever you need support. Is there anything else you'd like to talk about?",
+            
+            "Thank you for your kind words, {username}. I'm glad I could help. What else is on your mind today?",
+            
+            "That means a lot to me, {username}. I'm here to support you. Is there anything else you'd like to explore?",
+            
+            "You're welcome, {username}! I'm here whenever you need someone to talk to. What's next for you?"
+        ],
+        
+        'work_stress': [
+            "I can hear how challenging the job search process has been for you, {username}. It's completely normal to feel overwhelmed by the uncertainty and constant applications. What's been the most difficult part about this experience for you?",
+            
+            "Job searching can be such a rollercoaster, {username}. The constant overthinking and rejection can really take a toll on your mental health. What do you think might help you feel a bit more grounded during this process?",
+            
+            "I understand how stressful this job search journey can be, {username}. It's like you're carrying this constant weight of uncertainty. What would it feel like to acknowledge that this is genuinely hard work?",
+            
+            "The job market can feel so overwhelming, {username}. It's okay to feel frustrated and anxious about this. What's one small thing that might help you feel a bit more in control?"
+        ],
+        
+        'sleep_issues': [
+            "Sleep is so crucial for our mental health, {username}. When we're stressed, it can really mess with our sleep patterns. Your brain is probably running through all the 'what ifs' when you're trying to rest. What do you think might help you feel more relaxed before bed?",
+            
+            "I hear how difficult the sleep issues have been, {username}. It's exhausting when your mind won't quiet down. What's been your experience of trying to get rest? Sometimes just acknowledging that it's hard can help.",
+            
+            "Sleep problems can feel so isolating, {username}. It's like you're the only one awake while everyone else is resting. What would it feel like to be gentle with yourself about this? What do you think your body might need right now?",
+            
+            "I can sense how much this is affecting you, {username}. Poor sleep can make everything else feel so much harder. What's been your experience of trying to manage this? Sometimes the ways we try to help ourselves can give us important clues."
+        ],
+        
+        'overthinking': [
+            "Overthinking is like having a broken record in your head, isn't it, {username}? Your brain is trying to solve a problem, but it's just spinning in circles. What do you think your mind is trying to figure out?",
+            
+            "I can hear how exhausting this overthinking has been, {username}. It's like your mind is stuck in problem-solving mode. What would it feel like to give your brain permission to take a break? What might help you feel more present?",
+            
+            "Overthinking can feel so overwhelming, {username}. It's like you're constantly trying to anticipate every possible outcome. What do you think your overthinking is trying to protect you from?",
+            
+            "I understand how challenging this constant thinking can be, {username}. It's exhausting trying to manage all those thoughts. What would it feel like to acknowledge that your mind is working hard, even if it's not being very helpful right now?"
+        ],
+        
+        'not_well': [
+            "I hear that you're not feeling well, {username}. That can be really hard to deal with, especially when you're not sure exactly what's wrong. Sometimes our bodies and minds just feel off, and that's completely normal. What do you think might be contributing to feeling this way?",
+            
+            "I'm sorry you're not feeling well, {username}. It's okay to not be okay, and reaching out like this shows real strength. What would it feel like to be gentle with yourself about not feeling well? What kind of support do you think might help you feel a bit better?",
+            
+            "I can hear that you're struggling, {username}. Not feeling well can be so frustrating and isolating. What's been the hardest part about what you're experiencing? Sometimes just naming what's difficult can help us feel less alone in it.",
+            
+            "Thank you for telling me you're not feeling well, {username}. It takes courage to admit when we're struggling. What would it feel like to give yourself permission to not be okay right now? What do you think you might need to help you through this?"
+        ],
+        
+        'neutral': [
+            "Thank you for taking the time to share with me, {username}. I'm here to listen and understand your experience without judgment. Sometimes it can be helpful to check in with ourselves - what's been on your mind lately? What feels most important for you to explore or work through today?",
+            
+            "I appreciate you reaching out, {username}. It takes courage to open up, even when we're not sure what to say. What's been your experience lately? Sometimes just starting with what's present for us right now can lead to important insights.",
+            
+            "I'm here to listen, {username}. There's no pressure to have everything figured out - we can simply start wherever you are right now. What feels most present for you in this moment? What would be most helpful for you to explore or work through?",
+            
+            "Thank you for trusting me with your thoughts, {username}. I want you to know that whatever you're experiencing is valid and worth exploring. What's been on your mind? Sometimes the things we think are 'small' can actually be quite significant when we give them space."
+        ]
+    }
+    
+    # Message phrases that pick a fallback category, checked in this order
+    FALLBACK_CONTEXT_PHRASES = (
+        ('not_well', ('not feeling well', 'not good', 'not okay', 'not fine', 'feeling bad', 'feeling terrible', 'feeling awful')),
+        ('greeting', ('how are you', 'how do you do', 'hello', 'hi', 'hey')),
+        ('gratitude', ('thank you', 'thanks', 'appreciate')),
+        ('work_stress', ('job', 'work', 'employment', 'career', 'interview')),
+        ('sleep_issues', ('sleep', 'bed', 'rest', 'tired', 'exhausted')),
+        ('overthinking', ('overthink', 'overthinking', 'constant thoughts', 'racing mind')),
+    )
+    FALLBACK_CONTEXT_PATTERNS = tuple(
+        (context, re.compile('|'.join(re.escape(phrase) for phrase in phrases)))
+        for context, phrases in FALLBACK_CONTEXT_PHRASES
+    )
+    
+    def __init__(self, model=None, generation_timeout: float = None, max_workers: int = None):
+        """Initialize the Therapy Agent with Gemini 2.0 Flash
+        
+        ``model`` can be any object with a ``generate_content`` method (e.g. a
+        local fake for tests); when given, Gemini is not configured. Model
+        calls run on a bounded worker pool and give up after
+        ``generation_timeout`` seconds, falling back to a template response.
+        A circuit breaker skips the model entirely while it keeps failing or
+        running slow, and probes it again after a cool-down.
+        
+        Construction does no network I/O: Gemini is configured on first use
+        and probed by ``warm_up``, which callers run off the request path.
+        """
         self.api_key = os.getenv('GEMINI_API_KEY')
         self.model = None
-        self.is_connected = False
-        self.response_cache = {}  # Cache to avoid immediate repetition
-        
-        if self.api_key:
-            try:
-                print("🔧 Configuring Gemini 2.0 Flash...")
-                genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel('gemini-2.0-flash-exp')  # Updated model
-                print("✅ Gemini 2.0 Flash model initialized")
-                
-                # Quick connection test with timeout
-                self.is_connected = self._quick_test()
-                
-            except Exception as e:
-                print(f"⚠️ Gemini initialization failed: {e}")
-                self.model = None
-                self.is_connected = False
-        else:
+        self.warmed_up = False
+        self._model_lock = threading.Lock()
+        self._model_init_failed = False
+        
+        # Last fallback template per user and category, to avoid immediate
+        # repetition; RESPONSE_CACHE_URL=sqlite:///path shares it across workers
+        self.response_cache = create_cache(
+            os.getenv('RESPONSE_CACHE_URL'),
+            maxsize=int(os.getenv('RESPONSE_CACHE_SIZE', '10000')),
+            ttl=float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '86400')),
+            namespace='therapy_fallback'
+        )
+        
+        # Bounded pool so slow Gemini calls never pin request threads
+        if generation_timeout is None:
+            generation_timeout = float(os.getenv('GEMINI_TIMEOUT_SECONDS', '15'))
+        self.generation_timeout = generation_timeout
+        self.max_workers = max_workers or int(os.getenv('GEMINI_MAX_WORKERS', '8'))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='therapy-agent')
+        self._calls_lock = threading.Lock()
+        self._in_flight = 0
+        self._timed_out_calls = 0
+        
+        # Health-aware routing between Gemini and the fallback responses
+        self.circuit_breaker = CircuitBreaker(
+            name='gemini',
+            window_size=int(os.getenv('GEMINI_BREAKER_WINDOW', '20')),
+            min_calls=int(os.getenv('GEMINI_BREAKER_MIN_CALLS', '5')),
+            failure_rate_threshold=float(os.getenv('GEMINI_BREAKER_FAILURE_RATE', '0.5')),
+            slow_call_seconds=float(os.getenv('GEMINI_BREAKER_SLOW_SECONDS', str(self.generation_timeout * 0.8))),
+            open_seconds=float(os.getenv('GEMINI_BREAKER_OPEN_SECONDS', '30'))
+        )
+        
+        if model is not None:
+            self.model = model
+        elif not self.api_key:
             print("⚠️ GEMINI_API_KEY not found in environment variables")
     
+    def _ensure_model(self):
+        """Configure the Gemini model on first use (local setup only, no API call)"""
+        if self.model is not None or not self.api_key or self._model_init_failed:
+            return self.model
+        
+        with self._model_lock:
+            if self.model is None and not self._model_init_failed:
+                try:
+                    print("🔧 Configuring Gemini 2.0 Flash...")
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self.model = genai.GenerativeModel('gemini-2.0-flash-exp')  # Updated model
+                    print("✅ Gemini 2.0 Flash model initialized")
+                except Exception as e:
+                    print(f"⚠️ Gemini initialization failed: {e}")
+                    self._model_init_failed = True
+        return self.model
+    
+    def warm_up(self) -> bool:
+        """Configure the model and probe it once; meant to run in the background
+        
+        A failed probe trips the circuit breaker, so requests are served by
+        fallback responses until a later half-open probe succeeds.
+        """
+        connected = False
+        if self._ensure_model():
+            connected = self._quick_test()
+            if connected:
+                self.circuit_breaker.reset()
+            else:
+                self.circuit_breaker.trip()
+        self.warmed_up = True
+        return connected
+    
     def _quick_test(self) -> bool:
         """Quick test with timeout to avoid hanging"""
         try:
@@ -37,170 +239,109 @@ class TherapyAgent:
                 return False
             
             print("🧪 Testing Gemini connection (5s timeout)...")
-            
-            # Set a timeout for the API call
-            import signal
-            
-            def timeout_handler(signum, frame):
-                raise TimeoutError("API call timed out")
-            
-            # Set timeout (only works on Unix systems)
-            try:
-                signal.signal(signal.SIGALRM, timeout_handler)
-                signal.alarm(5)  # 5 second timeout
-                
-                response = self.model.generate_content("Test")
-                signal.alarm(0)  # Cancel the alarm
-                
-                print("✅ Gemini API test successful!")
-                return True
-                
-            except (TimeoutError, AttributeError):
-                # Windows doesn't support signal.alarm, use a different approach
-                print("⏰ Testing with alternative method...")
-                response = self.model.generate_content("Test")
-                print("✅ Gemini API test successful!")
-                return True
+            # Runs on the worker pool, so it works from any thread
+            self._generate_with_deadline("Test", timeout=5)
+            print("✅ Gemini API test successful!")
+            return True
                 
         except Exception as e:
             print(f"❌ Gemini API test failed: {e}")
             return False
     
+    @property
+    def is_connected(self) -> bool:
+        """Whether requests are currently routed to Gemini (model configured and circuit not open)"""
+        return self.model is not None and self.circuit_breaker.state != CircuitBreaker.OPEN
+    
     def test_api_connection(self) -> bool:
         """Test if Gemini API is working"""
-        if not self.is_connected:
+        if self._ensure_model() and not self.is_connected:
             print("🔄 API not initially connected, retrying...")
-            self.is_connected = self._quick_test()
+            if self._quick_test():
+                self.circuit_breaker.reset()
         
         return self.is_connected
     
+    @property
+    def in_flight(self) -> int:
+        """Number of model calls currently queued or running on the worker pool"""
+        return self._in_flight
+    
+    def get_status(self) -> Dict:
+        """Snapshot of model call state for health reporting"""
+        return {
+            'connected': self.is_connected,
+            'in_flight': self._in_flight,
+            'max_workers': self.max_workers,
+            'timeout_seconds': self.generation_timeout,
+            'timed_out_calls': self._timed_out_calls,
+            'circuit_breaker': self.circuit_breaker.snapshot(),
+            'response_cache': self.response_cache.stats()
+        }
+    
+    def _run_model_call(self, *args, **kwargs):
+        """Worker-side wrapper that keeps the in-flight count accurate"""
+        try:
+            return self.model.generate_content(*args, **kwargs)
+        finally:
+            with self._calls_lock:
+                self._in_flight -= 1
+    
+    def _generate_with_deadline(self, *args, timeout: float = None, **kwargs):
+        """Run generate_content on the worker pool, raising TimeoutError past the deadline
+        
+        The deadline includes time spent waiting for a free worker. A call
+        that times out keeps its worker until the model returns, so the pool
+        size also bounds how many abandoned calls can pile up.
+        """
+        if timeout is None:
+            timeout = self.generation_timeout
+        with self._calls_lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(self._run_model_call, *args, **kwargs)
+        except Exception:
+            with self._calls_lock:
+                self._in_flight -= 1
+            raise
+        
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._calls_lock:
+                self._timed_out_calls += 1
+                # A call still waiting for a worker is dropped outright
+                if future.cancel():
+                    self._in_flight -= 1
+            raise TimeoutError(f"Gemini call exceeded {timeout:.1f}s deadline")
+    
     def generate_empathetic_response(self, message: str, emotion_data: Dict, user_history: List = None, username: str = "Akashpatel2609", context: Dict = None) -> str:
         """Generate an empathetic response using Gemini 2.0 Flash with enhanced context"""
+        if not self._ensure_model():
+            print("⚠️ Gemini not available, using fallback response")
+            return self.get_fallback_response(emotion_data.get('primary_emotion', 'neutral'), username, message)
+        # Build the prompt first: once allow_request() hands out a (half-open
+        # probe) slot, every path must report back to the breaker
+        try:
+            prompt = self._build_prompt(message, emotion_data, user_history, username, context)
+        except Exception as e:
+            print(f"❌ Error building prompt: {e}")
+            return self.get_fallback_response(emotion_data.get('primary_emotion', 'neutral'), username, message)
+        if not self.circuit_breaker.allow_request():
+            print("🔌 Gemini circuit open, using fallback response")
+            return self.get_fallback_response(emotion_data.get('primary_emotion', 'neutral'), username, message)
+        
+        call_started = time.perf_counter()
         try:
-            if not self.model or not self.is_connected:
-                print("⚠️ Gemini not available, using fallback response")
-                return self.get_fallback_response(emotion_data.get('primary_emotion', 'neutral'), username, message)
-            
-            # Create enhanced context from user history and additional context
-            history_context = ""
-            if user_history:
-                recent_history = user_history[-5:]  # Last 5 conversations for better context
-                history_context = "Recent conversation context:\n"
-                for msg, resp, emotion, timestamp in recent_history:
-                    history_context += f"User: {msg}\nEmotion: {emotion}\n\n"
-            
             primary_emotion = emotion_data.get('primary_emotion', 'neutral')
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')
-            
-            # Enhanced context information
-            context_info = ""
-            if context:
-                sentiment = context.get('sentiment_score', 'neutral')
-                time_of_day = context.get('time_of_day', 12)
-                previous_emotions = context.get('previous_emotions', [])
-                
-                # Time-based context
-                if 5 <= time_of_day < 12:
-                    time_context = "morning"
-                elif 12 <= time_of_day < 17:
-                    time_context = "afternoon"
-                elif 17 <= time_of_day < 22:
-                    time_context = "evening"
-                else:
-                    time_context = "night"
-                
-                context_info = f"""
-                Additional Context:
-                - Sentiment: {sentiment}
-                - Time of day: {time_context}
-                - Message length: {context.get('message_length', 0)} characters
-                - Conversation history: {context.get('user_history_length', 0)} previous interactions
-                - Recent emotions: {', '.join(previous_emotions[-3:]) if previous_emotions else 'none'}
-                """
-            
-            prompt = f"""
-            You are Dr. Mira, a licensed clinical psychologist with 15+ years of experience specializing in cognitive behavioral therapy, anxiety disorders, depression, and trauma-informed care. You provide evidence-based therapeutic interventions.
-
-            THERAPEUTIC APPROACH:
-            - Use active listening and reflective statements
-            - Apply CBT techniques: identify thoughts, feelings, behaviors
-            - Practice Socratic questioning to promote insight
-            - Validate emotions while exploring underlying thoughts
-            - Use mindfulness and grounding techniques when appropriate
-            - Maintain professional therapeutic boundaries
-            - Apply motivational interviewing principles
-            - Use person-centered therapy warmth and genuineness
-
-            EVIDENCE-BASED TECHNIQUES TO INCORPORATE:
-            For Anxiety: Cognitive restructuring, exposure concepts, breathing techniques
-            For Depression: Behavioral activation, thought challenging, mood monitoring
-            For Anger: Emotion regulation, trigger identification, coping skills
-            For Trauma: Grounding techniques, safety, present-moment awareness
-            For General Support: Unconditional positive regard, empathic reflection
-
-            THERAPEUTIC LANGUAGE PATTERNS:
-            - "I notice..." (observation without judgment)
-            - "Help me understand..." (invitation to explore)
-            - "What comes up for you when..." (emotional exploration)
-            - "I'm curious about..." (gentle inquiry)
-            - "Many people in similar situations find..." (normalization)
-            - "What would it look like if..." (behavioral experimentation)
-            - "How does that sit with you?" (checking in)
-
-            CLIENT INFORMATION:
-            Name: {username}
-            Current emotional state: {primary_emotion}
-            Session timestamp: {current_time}
-
-            {history_context}
-            {context_info}
-
-            CLIENT'S CURRENT STATEMENT: "{message}"
-
-            THERAPEUTIC RESPONSE INSTRUCTIONS:
-            1. Start with validation and reflection of their emotional experience
-            2. Use one therapeutic technique appropriate to their concern
-            3. Ask one open-ended question to deepen exploration
-            4. Keep response 150-250 words, conversational yet professional
-            5. If crisis indicators present, address safety and provide resources
-            6. Avoid advice-giving; focus on helping them discover their own insights
-            7. Use their name naturally within the conversation
-
-            Provide your therapeutic response as Dr. Mira:
-            """
-            
-            generation_config = {
-                'temperature': 0.3,  # Lower temperature for more consistent, professional responses
-                'top_p': 0.8,        # Focused on most likely tokens for therapeutic consistency
-                'top_k': 20,         # More focused responses
-                'max_output_tokens': 400,  # Longer responses for therapeutic depth
-            }
-            
-            safety_settings = [
-                {
-                    "category": "HARM_CATEGORY_HARASSMENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_HATE_SPEECH",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-            ]
             
             print(f"🤖 Generating enhanced response for {username}...")
-            response = self.model.generate_content(
+            response = self._generate_with_deadline(
                 prompt,
-                generation_config=generation_config,
-                safety_settings=safety_settings
+                generation_config=self.GENERATION_CONFIG,
+                safety_settings=self.SAFETY_SETTINGS
             )
+            self.circuit_breaker.record_success(time.perf_counter() - call_started)
             
             if response.candidates and response.candidates[0].content.parts:
                 result = response.text.strip()
@@ -210,151 +351,248 @@ class TherapyAgent:
                 print("⚠️ Response was filtered, using fallback")
                 return self.get_fallback_response(primary_emotion, username, message)
             
+        except TimeoutError as e:
+            print(f"⏰ {e}, using fallback response")
+            self.circuit_breaker.record_failure(time.perf_counter() - call_started)
+            return self.get_fallback_response(emotion_data.get('primary_emotion', 'neutral'), username, message)
         except Exception as e:
             print(f"❌ Error generating response: {e}")
+            self.circuit_breaker.record_failure(time.perf_counter() - call_started)
             return self.get_fallback_response(emotion_data.get('primary_emotion', 'neutral'), username, message)
     
+    def _run_stream_call(self, chunks: queue.Queue, cancelled: threading.Event, *args, **kwargs):
+        """Worker-side streaming call: pushes text chunks, then a final marker"""
+        try:
+            if cancelled.is_set():
+                # Timed out or abandoned while waiting for a worker
+                chunks.put(('end', None))
+                return
+            for chunk in self.model.generate_content(*args, stream=True, **kwargs):
+                if cancelled.is_set():
+                    break
+                try:
+                    text = chunk.text
+                except ValueError:
+                    text = ''  # Chunk was filtered by the safety settings
+                if text:
+                    chunks.put(('chunk', text))
+            chunks.put(('end', None))
+        except Exception as e:
+            chunks.put(('error', e))
+        finally:
+            with self._calls_lock:
+                self._in_flight -= 1
+    
+    def stream_empathetic_response(self, message: str, emotion_data: Dict, user_history: List = None, username: str = "Akashpatel2609", context: Dict = None) -> Iterator[str]:
+        """Yield the Gemini response text chunk by chunk as it is generated
+        
+        Each chunk must arrive within ``generation_timeout``. If the model is
+        unavailable, fails or times out before producing any text, the
+        fallback response is yielded as a single chunk instead.
+        """
+        primary_emotion = emotion_data.get('primary_emotion', 'neutral')
+        if not self._ensure_model():
+            print("⚠️ Gemini not available, using fallback response")
+            yield self.get_fallback_response(primary_emotion, username, message)
+            return
+        try:
+            prompt = self._build_prompt(message, emotion_data, user_history, username, context)
+        except Exception as e:
+            print(f"❌ Error building prompt: {e}")
+            yield self.get_fallback_response(primary_emotion, username, message)
+            return
+        if not self.circuit_breaker.allow_request():
+            print("🔌 Gemini circuit open, using fallback response")
+            yield self.get_fallback_response(primary_emotion, username, message)
+            return
+        
+        chunks = queue.Queue()
+        cancelled = threading.Event()
+        
+        print(f"🤖 Streaming enhanced response for {username}...")
+        call_started = time.perf_counter()
+        with self._calls_lock:
+            self._in_flight += 1
+        try:
+            self._executor.submit(
+                self._run_stream_call, chunks, cancelled, prompt,
+                generation_config=self.GENERATION_CONFIG,
+                safety_settings=self.SAFETY_SETTINGS
+            )
+        except Exception as e:
+            with self._calls_lock:
+                self._in_flight -= 1
+            print(f"❌ Error starting response stream: {e}")
+            self.circuit_breaker.record_failure(time.perf_counter() - call_started)
+            yield self.get_fallback_response(primary_emotion, username, message)
+            return
+        
+        produced = 0
+        failed = False
+        first_chunk_latency = None
+        try:
+            while True:
+                try:
+                    kind, payload = chunks.get(timeout=self.generation_timeout)
+                except queue.Empty:
+                    with self._calls_lock:
+                        self._timed_out_calls += 1
+                    print(f"⏰ Gemini stream stalled for {self.generation_timeout:.1f}s")
+                    failed = True
+                    break
+                if kind == 'chunk':
+                    if first_chunk_latency is None:
+                        first_chunk_latency = time.perf_counter() - call_started
+                    produced += len(payload)
+                    yield payload
+                elif kind == 'error':
+                    print(f"❌ Error streaming response: {payload}")
+                    failed = True
+                    break
+                else:
+                    break
+        finally:
+            # Also reached when the client disconnects mid-stream
+            cancelled.set()
+            # Stream health is judged on time to first chunk
+            if failed:
+                self.circuit_breaker.record_failure(time.perf_counter() - call_started)
+            else:
+                self.circuit_breaker.record_success(first_chunk_latency or time.perf_counter() - call_started)
+        
+        if produced:
+            print(f"✅ Enhanced response streamed: {produced} characters")
+        else:
+            yield self.get_fallback_response(primary_emotion, username, message)
+    
+    def _build_prompt(self, message: str, emotion_data: Dict, user_history: List = None, username: str = "Akashpatel2609", context: Dict = None) -> str:
+        """Build the Dr. Mira prompt from the message, history and context"""
+        # Create enhanced context from user history and additional context
+        history_context = ""
+        if user_history:
+            recent_history = user_history[-5:]  # Last 5 conversations for better context
+            history_context = "Recent conversation context:\n"
+            for msg, resp, emotion, timestamp in recent_history:
+                history_context += f"User: {msg}\nEmotion: {emotion}\n\n"
+        
+        primary_emotion = emotion_data.get('primary_emotion', 'neutral')
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')
+        
+        # Enhanced context information
+        context_info = ""
+        if context:
+            sentiment = context.get('sentiment_score', 'neutral')
+            time_of_day = context.get('time_of_day', 12)
+            previous_emotions = context.get('previous_emotions', [])
+            
+            # Time-based context
+            if 5 <= time_of_day < 12:
+                time_context = "morning"
+            elif 12 <= time_of_day < 17:
+                time_context = "afternoon"
+            elif 17 <= time_of_day < 22:
+                time_context = "evening"
+            else:
+                time_context = "night"
+            
+            context_info = f"""
+            Additional Context:
+            - Sentiment: {sentiment}
+            - Time of day: {time_context}
+            - Message length: {context.get('message_length', 0)} characters
+            - Conversation history: {context.get('user_history_length', 0)} previous interactions
+            - Recent emotions: {', '.join(previous_emotions[-3:]) if previous_emotions else 'none'}
+            """
+        
+        prompt = f"""
+        You are Dr. Mira, a licensed clinical psychologist with 15+ years of experience specializing in cognitive behavioral therapy, anxiety disorders, depression, and trauma-informed care. You provide evidence-based therapeutic interventions.
+
+        THERAPEUTIC APPROACH:
+        - Use active listening and reflective statements
+        - Apply CBT techniques: identify thoughts, feelings, behaviors
+        - Practice Socratic questioning to promote insight
+        - Validate emotions while exploring underlying thoughts
+        - Use mindfulness and grounding techniques when appropriate
+        - Maintain professional therapeutic boundaries
+        - Apply motivational interviewing principles
+        - Use person-centered therapy warmth and genuineness
+
+        EVIDENCE-BASED TECHNIQUES TO INCORPORATE:
+        For Anxiety: Cognitive restructuring, exposure concepts, breathing techniques
+        For Depression: Behavioral activation, thought challenging, mood monitoring
+        For Anger: Emotion regulation, trigger identification, coping skills
+        For Trauma: Grounding techniques, safety, present-moment awareness
+        For General Support: Unconditional positive regard, empathic reflection
+
+        THERAPEUTIC LANGUAGE PATTERNS:
+        - "I notice..." (observation without judgment)
+        - "Help me understand..." (invitation to explore)
+        - "What comes up for you when..." (emotional exploration)
+        - "I'm curious about..." (gentle inquiry)
+        - "Many people in similar situations find..." (normalization)
+        - "What would it look like if..." (behavioral experimentation)
+        - "How does that sit with you?" (checking in)
+
+        CLIENT INFORMATION:
+        Name: {username}
+        Current emotional state: {primary_emotion}
+        Session timestamp: {current_time}
+
+        {history_context}
+        {context_info}
+
+        CLIENT'S CURRENT STATEMENT: "{message}"
+
+        THERAPEUTIC RESPONSE INSTRUCTIONS:
+        1. Start with validation and reflection of their emotional experience
+        2. Use one therapeutic technique appropriate to their concern
+        3. Ask one open-ended question to deepen exploration
+        4. Keep response 150-250 words, conversational yet professional
+        5. If crisis indicators present, address safety and provide resources
+        6. Avoid advice-giving; focus on helping them discover their own insights
+        7. Use their name naturally within the conversation
+
+        Provide your therapeutic response as Dr. Mira:
+        """
+        
+        return prompt
+    
     def get_fallback_response(self, emotion: str, username: str = "Akashpatel2609", message: str = "") -> str:
         """Enhanced professional therapeutic fallback responses when AI is unavailable"""
-        import random
-        
         # Check message content for specific context
         message_lower = message.lower()
         
         # Determine context from message content
         context = 'neutral'
-        if any(phrase in message_lower for phrase in ['not feeling well', 'not good', 'not okay', 'not fine', 'feeling bad', 'feeling terrible', 'feeling awful']):
-            context = 'not_well'
-        elif any(word in message_lower for word in ['how are you', 'how do you do', 'hello', 'hi', 'hey']):
-            context = 'greeting'
-        elif any(word in message_lower for word in ['thank you', 'thanks', 'appreciate']):
-            context = 'gratitude'
-        elif any(word in message_lower for word in ['job', 'work', 'employment', 'career', 'interview']):
-            context = 'work_stress'
-        elif any(word in message_lower for word in ['sleep', 'bed', 'rest', 'tired', 'exhausted']):
-            context = 'sleep_issues'
-        elif any(word in message_lower for word in ['overthink', 'overthinking', 'constant thoughts', 'racing mind']):
-            context = 'overthinking'
-        
-        # Multiple response options for each emotion to avoid repetition
-        response_options = {
-            'sadness': [
-                f"I can hear the sadness in what you're sharing, {username}, and I want you to acknowledge how brave it is to reach out when you're struggling. Sadness often carries important information about what matters to us. I'm curious - what thoughts have been most present for you during these difficult moments?",
-                
-                f"I'm noticing the heaviness in what you're describing, {username}. When we're feeling sad, it can feel like we're carrying a weight that no one else can see. What's been the hardest part about what you're going through? Sometimes just naming the struggle can help us feel less alone in it.",
-                
-                f"Thank you for trusting me with these feelings, {username}. Sadness can be so isolating, but you're not alone in this experience. What would it feel like to give yourself permission to feel this way without judgment? What do you think your sadness might be trying to tell you?",
-                
-                f"I can sense the depth of what you're experiencing, {username}. Sadness often comes with a lot of self-criticism, but reaching out like this shows real strength. What's been your experience of trying to cope with these feelings? Sometimes the ways we try to help ourselves can give us important clues about what we really need."
-            ],
-            
-            'anxiety': [
-                f"I notice there's a lot of worry and tension in what you're telling me, {username}. Anxiety can feel so overwhelming, like your mind is racing ahead to all the 'what-ifs.' Let's take a moment to ground ourselves in the present. Can you tell me what thoughts are contributing most to these anxious feelings?",
-                
-                f"I'm hearing the anxiety in your voice, {username}, and I want you to know that anxiety is your brain's way of trying to protect you. It's working overtime, but that doesn't mean the threats are real. What would it feel like to take a few deep breaths together? What's the most immediate thing that's worrying you right now?",
-                
-                f"Anxiety can feel like being stuck in a loop of worry, {username}. It's exhausting trying to manage all those 'what if' thoughts. Sometimes anxiety is our brain's way of trying to solve a problem, but it's just spinning in circles. What do you think your anxiety is trying to solve for you?",
-                
-                f"I can hear how overwhelming this anxiety feels, {username}. It's like your nervous system is stuck in high alert. What would it feel like to acknowledge that your anxiety is trying to help, even if it's not being very helpful right now? What's one small thing that might help you feel a bit more grounded?"
-            ],
-            
-            'greeting': [
-                f"Hello {username}! I'm here and ready to listen. How are you feeling today? What's been on your mind lately?",
-                
-                f"Hi {username}! Thank you for reaching out. I'm here to support you. What would you like to talk about today?",
-                
-                f"Hey {username}! I'm glad you're here. How can I help you today? What's been your experience lately?",
-                
-                f"Hello {username}! I'm here to listen and support you. What's been on your mind? How are you doing?"
-            ],
-            
-            'gratitude': [
-                f"You're very welcome, {username}! I'm here for you whenever you need support. Is there anything else you'd like to talk about?",
-                
-                f"Thank you for your kind words, {username}. I'm glad I could help. What else is on your mind today?",
-                
-                f"That means a lot to me, {username}. I'm here to support you. Is there anything else you'd like to explore?",
-                
-                f"You're welcome, {username}! I'm here whenever you need someone to talk to. What's next for you?"
-            ],
-            
-            'work_stress': [
-                f"I can hear how challenging the job search process has been for you, {username}. It's completely normal to feel overwhelmed by the uncertainty and constant applications. What's been the most difficult part about this experience for you?",
-                
-                f"Job searching can be such a rollercoaster, {username}. The constant overthinking and rejection can really take a toll on your mental health. What do you think might help you feel a bit more grounded during this process?",
-                
-                f"I understand how stressful this job search journey can be, {username}. It's like you're carrying this constant weight of uncertainty. What would it feel like to acknowledge that this is genuinely hard work?",
-                
-                f"The job market can feel so overwhelming, {username}. It's okay to feel frustrated and anxious about this. What's one small thing that might help you feel a bit more in control?"
-            ],
-            
-            'sleep_issues': [
-                f"Sleep is so crucial for our mental health, {username}. When we're stressed, it can really mess with our sleep patterns. Your brain is probably running through all the 'what ifs' when you're trying to rest. What do you think might help you feel more relaxed before bed?",
-                
-                f"I hear how difficult the sleep issues have been, {username}. It's exhausting when your mind won't quiet down. What's been your experience of trying to get rest? Sometimes just acknowledging that it's hard can help.",
-                
-                f"Sleep problems can feel so isolating, {username}. It's like you're the only one awake while everyone else is resting. What would it feel like to be gentle with yourself about this? What do you think your body might need right now?",
-                
-                f"I can sense how much this is affecting you, {username}. Poor sleep can make everything else feel so much harder. What's been your experience of trying to manage this? Sometimes the ways we try to help ourselves can give us important clues."
-            ],
-            
-            'overthinking': [
-                f"Overthinking is like having a broken record in your head, isn't it, {username}? Your brain is trying to solve a problem, but it's just spinning in circles. What do you think your mind is trying to figure out?",
-                
-                f"I can hear how exhausting this overthinking has been, {username}. It's like your mind is stuck in problem-solving mode. What would it feel like to give your brain permission to take a break? What might help you feel more present?",
-                
-                f"Overthinking can feel so overwhelming, {username}. It's like you're constantly trying to anticipate every possible outcome. What do you think your overthinking is trying to protect you from?",
-                
-                f"I understand how challenging this constant thinking can be, {username}. It's exhausting trying to manage all those thoughts. What would it feel like to acknowledge that your mind is working hard, even if it's not being very helpful right now?"
-            ],
-            
-            'not_well': [
-                f"I hear that you're not feeling well, {username}. That can be really hard to deal with, especially when you're not sure exactly what's wrong. Sometimes our bodies and minds just feel off, and that's completely normal. What do you think might be contributing to feeling this way?",
-                
-                f"I'm sorry you're not feeling well, {username}. It's okay to not be okay, and reaching out like this shows real strength. What would it feel like to be gentle with yourself about not feeling well? What kind of support do you think might help you feel a bit better?",
-                
-                f"I can hear that you're struggling, {username}. Not feeling well can be so frustrating and isolating. What's been the hardest part about what you're experiencing? Sometimes just naming what's difficult can help us feel less alone in it.",
-                
-                f"Thank you for telling me you're not feeling well, {username}. It takes courage to admit when we're struggling. What would it feel like to give yourself permission to not be okay right now? What do you think you might need to help you through this?"
-            ],
-            
-            'neutral': [
-                f"Thank you for taking the time to share with me, {username}. I'm here to listen and understand your experience without judgment. Sometimes it can be helpful to check in with ourselves - what's been on your mind lately? What feels most important for you to explore or work through today?",
-                
-                f"I appreciate you reaching out, {username}. It takes courage to open up, even when we're not sure what to say. What's been your experience lately? Sometimes just starting with what's present for us right now can lead to important insights.",
-                
-                f"I'm here to listen, {username}. There's no pressure to have everything figured out - we can simply start wherever you are right now. What feels most present for you in this moment? What would be most helpful for you to explore or work through?",
-                
-                f"Thank you for trusting me with your thoughts, {username}. I want you to know that whatever you're experiencing is valid and worth exploring. What's been on your mind? Sometimes the things we think are 'small' can actually be quite significant when we give them space."
-            ]
-        }
+        for candidate, pattern in self.FALLBACK_CONTEXT_PATTERNS:
+            if pattern.search(message_lower):
+                context = candidate
+                break
         
         # Determine the best response category based on context and emotion
         if context != 'neutral':
             category = context
-        elif emotion in response_options:
+        elif emotion in self.FALLBACK_RESPONSES:
             category = emotion
         else:
             category = 'neutral'
         
-        # Get available responses for this category
-        responses = response_options.get(category, response_options['neutral'])
+        # Get available templates for this category
+        templates = self.FALLBACK_RESPONSES.get(category, self.FALLBACK_RESPONSES['neutral'])
+        choices = range(len(templates))
         
         # Use cache to avoid immediate repetition
         cache_key = f"{username}_{category}"
-        if cache_key in self.response_cache:
-            # Remove the cached response from options to avoid repetition
-            cached_response = self.response_cache[cache_key]
-            available_responses = [r for r in responses if r != cached_response]
-            if available_responses:
-                responses = available_responses
-        
-        # Select a random response and cache it
-        selected_response = random.choice(responses)
-        self.response_cache[cache_key] = selected_response
-        
-        # Clear old cache entries to prevent memory buildup
-        if len(self.response_cache) > 50:
-            self.response_cache.clear()
+        last_choice = self.response_cache.get(cache_key)
+        if last_choice is not None:
+            # Remove the last used template from options to avoid repetition
+            available_choices = [i for i in choices if i != last_choice]
+            if available_choices:
+                choices = available_choices
+        
+        # Select a random template, remember it and fill in the name
+        choice = random.choice(choices)
+        self.response_cache.set(cache_key, choice)
+        selected_response = templates[choice].format(username=username)
         
         return selected_response
\ No newline at end of file
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
@@ -7,11 +7,26 @@ import secrets
 import bcrypt
 import jwt
 from functools import wraps
+import click
+import base64
+import itertools
+import json
 import random
+import threading
+import time
+from sqlalchemy import or_, tuple_
 from dotenv import load_dotenv
 load_dotenv() 
 # Import database models
-from database.models import db, User, Conversation, Activity, MoodEntry, UserPreferences, Contact
+from database.models import db, User, Conversation, Activity, MoodEntry, UserPreferences, Contact, UserStats, RevokedToken, ensure_columns, ensure_indexes
+from database.user_stats import WELLNESS_REPORTS, register_stats_listeners, rebuild_user_stats
+from database.storage import backend_label, configure_storage, database_uri, install_pragmas
+from database.write_behind import WriteBehindQueue
+from database.memory_cache import UserMemoryCache
+from database.principal_cache import PrincipalCache
+from database.password_hasher import DEFAULT_ROUNDS, PasswordHasher, PasswordHasherBusy
+from cache import TTLCache
+from audio_cache import is_audio_key
 # Import AI therapy agent
 from agents.therapy_agent import TherapyAgent
 # Import additional AI agents for enhanced capabilities
@@ -23,33 +38,150 @@ app = Flask(__name__)
 
 # Configuration
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(32))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///mental_health_buddy.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 'aggregate' keeps a user_stats table current on every insert; 'sql'
+# computes /user-stats on demand for deployments without that table
+app.config['USER_STATS_MODE'] = os.getenv('USER_STATS_MODE', 'aggregate')
+if app.config['USER_STATS_MODE'] not in WELLNESS_REPORTS:
+    raise ValueError(f"Unknown USER_STATS_MODE: {app.config['USER_STATS_MODE']}")
+if app.config['USER_STATS_MODE'] == 'aggregate':
+    register_stats_listeners()
+
+# Storage profile and pool options: WAL/pragmas for SQLite, DB_POOL_* for any backend
+db_storage_profile = configure_storage(app)
 
 # Initialize extensions
 db.init_app(app)
+with app.app_context():
+    install_pragmas(db.engine, db_storage_profile['pragmas'])
+
+# 'sync' commits conversations and activities inside the request;
+# 'write_behind' queues them for a background writer that commits in
+# batches, so replies don't wait on disk sync
+app.config['PERSISTENCE_MODE'] = os.getenv('PERSISTENCE_MODE', 'sync')
+if app.config['PERSISTENCE_MODE'] not in ('sync', 'write_behind'):
+    raise ValueError(f"Unknown PERSISTENCE_MODE: {app.config['PERSISTENCE_MODE']}")
+write_behind = None
+if app.config['PERSISTENCE_MODE'] == 'write_behind':
+    write_behind = WriteBehindQueue(
+        app,
+        max_size=int(os.getenv('WRITE_BEHIND_MAX_QUEUE', '10000')),
+        batch_size=int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '200')),
+        flush_interval=float(os.getenv('WRITE_BEHIND_FLUSH_MS', '50')) / 1000,
+        enqueue_timeout=float(os.getenv('WRITE_BEHIND_ENQUEUE_TIMEOUT', '1'))
+    )
+
+# Per-user persistent memory for the chat path, kept current on commit
+memory_cache = UserMemoryCache(
+    maxsize=int(os.getenv('MEMORY_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('MEMORY_CACHE_TTL_SECONDS', '300'))
+)
+memory_cache.register(db.session)
+
+# Authenticated users per (user, token id), so token_required skips the
+# user query; committed changes to a user retire their entries. The cache
+# is per process: other workers only see a change (deactivation, logout's
+# token_version bump) once their entry expires, so keep the TTL short.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv('AUTH_CACHE_TTL_SECONDS', '10'))
+principal_cache = PrincipalCache(
+    maxsize=int(os.getenv('AUTH_CACHE_SIZE', '10000')),
+    ttl=AUTH_CACHE_TTL_SECONDS
+)
+principal_cache.register(db.session)
+# Recently verified tokens, so repeat requests skip the signature check
+verified_tokens = TTLCache(
+    maxsize=int(os.getenv('AUTH_CACHE_SIZE', '10000')),
+    ttl=AUTH_CACHE_TTL_SECONDS
+)
+
+# bcrypt runs in its own small process pool with a bounded queue, so a
+# login burst can't starve chat requests of CPU; BCRYPT_WORKERS=0 hashes inline
+_bcrypt_workers = int(os.getenv('BCRYPT_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+password_hasher = PasswordHasher(
+    rounds=int(os.getenv('BCRYPT_ROUNDS', str(DEFAULT_ROUNDS))),
+    workers=_bcrypt_workers,
+    max_pending=int(os.getenv('BCRYPT_MAX_PENDING', str(max(1, _bcrypt_workers) * 16))),
+    queue_timeout=float(os.getenv('BCRYPT_QUEUE_TIMEOUT', '5')),
+    niceness=int(os.getenv('BCRYPT_NICE', '10'))
+)
 CORS(app)
 
-# Initialize AI Therapy Agent
-therapy_agent = TherapyAgent()
+# AI agents are created lazily and warmed up in the background, so
+# importing the app (and booting a worker) never waits on the network
+AGENT_FACTORIES = {
+    'therapy': TherapyAgent,
+    'listener': ListenerAgent,
+    'escalation': EscalationAgent
+}
+_agents = {}
+_agents_lock = threading.Lock()
+agent_warm_up = {
+    'started': False,
+    'ready': False,
+    'gemini_connected': None,
+    'error': None,
+    'duration_ms': None
+}
 
-# Initialize additional AI agents for enhanced capabilities
-listener_agent = ListenerAgent()
-escalation_agent = EscalationAgent()
+def get_agent(name):
+    """Return the shared agent instance, creating it on first use"""
+    agent = _agents.get(name)
+    if agent is None:
+        with _agents_lock:
+            agent = _agents.get(name)
+            if agent is None:
+                agent = AGENT_FACTORIES[name]()
+                _agents[name] = agent
+    return agent
+
+def _warm_up_agents():
+    """Create every agent and probe Gemini once, off the request path"""
+    started = time.perf_counter()
+    try:
+        for name in AGENT_FACTORIES:
+            get_agent(name)
+        agent_warm_up['gemini_connected'] = get_agent('therapy').warm_up()
+    except Exception as e:
+        print(f"❌ Agent warm-up failed: {e}")
+        agent_warm_up['error'] = str(e)
+    finally:
+        agent_warm_up['duration_ms'] = (time.perf_counter() - started) * 1000
+        agent_warm_up['ready'] = True
+        print(f"✅ Agents warmed up in {agent_warm_up['duration_ms']:.0f}ms (Therapy Agent: {'Active' if agent_warm_up['gemini_connected'] else 'Fallback'})")
+
+def start_agent_warm_up():
+    """Start the background warm-up once per process"""
+    with _agents_lock:
+        if agent_warm_up['started']:
+            return
+        agent_warm_up['started'] = True
+    threading.Thread(target=_warm_up_agents, name='agent-warm-up', daemon=True).start()
+
+@app.before_request
+def ensure_agent_warm_up():
+    # The first request a worker receives kicks off warm-up, which works
+    # with preforking servers where threads started at import don't survive
+    if not agent_warm_up['started']:
+        start_agent_warm_up()
 
 # JWT Configuration
 JWT_SECRET = os.getenv('JWT_SECRET', secrets.token_hex(32))
 JWT_ALGORITHM = 'HS256'
+# Put the user id in new tokens so authentication can look users up by primary key
+JWT_EMBED_USER_ID = os.getenv('JWT_EMBED_USER_ID', 'true').lower() in ('1', 'true', 'yes', 'on')
 
 # AI Configuration
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY')
+# Longest text the voice endpoints will send for synthesis (ElevenLabs bills per character)
+VOICE_MAX_TEXT_CHARS = int(os.getenv('VOICE_MAX_TEXT_CHARS', '2500'))
 
 print("💙 Mental Health Buddy AI - Enhanced Multi-Agent System")
 print(f"📅 Current Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-print(f"🔧 Database: SQLite with SQLAlchemy")
+print(f"🔧 Database: {backend_label(app.config['SQLALCHEMY_DATABASE_URI'])} with SQLAlchemy")
 print(f"🤖 AI System: Multi-Agent Coordination")
-print(f"   - Therapy Agent: {'Active' if therapy_agent.is_connected else 'Fallback'}")
+print(f"   - Therapy Agent: Warming up in background")
 print(f"   - Listener Agent: Active")
 print(f"   - Escalation Agent: Active")
 print(f"   - Primary Model: {'Gemini 2.0 Flash' if GOOGLE_API_KEY else 'Enhanced Fallback'}")
@@ -64,97 +196,260 @@ def token_required(f):
         
         try:
             token = token.split(' ')[1]  # Remove 'Bearer ' prefix
-            data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            current_user = User.query.filter_by(username=data['username']).first()
-            if not current_user:
+            data = decode_token(token)
+            current_user = principal_cache.get(principal_key(data), lambda: load_principal(data))
+            if not current_user or current_user.is_active is False:
                 return jsonify({'error': 'Invalid token'}), 401
+            g.token_claims = data
         except:
             return jsonify({'error': 'Invalid token'}), 401
         
         return f(current_user, *args, **kwargs)
     return decorated
 
+def decode_token(token):
+    """Verify a JWT's signature and expiry, reusing the result for repeat requests"""
+    claims = verified_tokens.get(token)
+    if claims is None or claims.get('exp', 0) <= time.time():
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        verified_tokens.set(token, claims)
+    return claims
+
+def issue_token(user):
+    """Signed JWT for a user, with a unique token id (and the user id if enabled)"""
+    claims = {
+        'username': user.username,
+        'email': user.email,
+        'jti': secrets.token_urlsafe(12),
+        'ver': user.token_version or 0,
+        'exp': datetime.utcnow() + timedelta(days=30)
+    }
+    if JWT_EMBED_USER_ID:
+        claims['uid'] = user.id
+    return jwt.encode(claims, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def principal_key(claims):
+    """Principal cache key: (user id, or username for older tokens; token id)"""
+    return (claims.get('uid', claims['username']), claims.get('jti'))
+
+def load_principal(claims):
+    """Look up a token's user, by primary key when the token carries one
+    
+    Revoked token ids (logout) and tokens issued before the user's current
+    token_version (logout everywhere) are rejected; both checks read the
+    database, so they are shared by every worker process.
+    """
+    if claims.get('jti') and db.session.get(RevokedToken, claims['jti']) is not None:
+        return None
+    if 'uid' in claims:
+        user = db.session.get(User, claims['uid'])
+        if user and user.username != claims['username']:
+            user = None
+    else:
+        user = User.query.filter_by(username=claims['username']).first()
+    if user and (user.token_version or 0) != claims.get('ver', 0):
+        return None
+    return user
+
 # AI-powered response generation using multiple agents
+def new_turn():
+    """Empty turn result: response, ListenerAgent analysis, escalation decision and timings"""
+    return {
+        'response': None,
+        'analysis': None,
+        'emotion': 'neutral',
+        'crisis_level': 'none',
+        'escalated': False,
+        'escalation': None,
+        'timings': {},
+        'started': time.perf_counter()
+    }
+
+def prepare_ai_turn(message, username, sentiment='neutral', history=None, memory=None):
+    """Analyze a message and decide how the turn should be answered
+
+    Returns ``(turn, generation)``. ``turn`` is the turn result dict (see
+    generate_ai_response); when the EscalationAgent already answered it,
+    ``turn['response']`` is set and ``generation`` is None. Otherwise
+    ``generation`` holds the keyword arguments for the TherapyAgent.
+    """
+    turn = new_turn()
+    
+    # Step 1: Use ListenerAgent for sophisticated emotion and crisis analysis
+    listener_analysis = get_agent('listener').analyze_message(message)
+    turn['analysis'] = listener_analysis
+    turn['timings']['analysis_ms'] = (time.perf_counter() - turn['started']) * 1000
+    
+    # Extract analysis results
+    detected_emotion = listener_analysis['emotion']['primary_emotion']
+    emotion_confidence = listener_analysis['emotion']['confidence']
+    crisis_level = listener_analysis['crisis']['crisis_level']
+    needs_escalation = listener_analysis['crisis']['needs_escalation']
+    turn['emotion'] = detected_emotion
+    turn['crisis_level'] = crisis_level
+    
+    print(f"🎧 ListenerAgent Analysis:")
+    print(f"   - Detected Emotion: {detected_emotion} (confidence: {emotion_confidence:.2f})")
+    print(f"   - Crisis Level: {crisis_level}")
+    print(f"   - Needs Escalation: {needs_escalation}")
+    
+    # Step 2: Handle crisis situations with EscalationAgent
+    if needs_escalation:
+        print(f"🚨 Crisis detected! Using EscalationAgent...")
+        escalation_response = get_agent('escalation').handle_crisis(crisis_level, 'CA')  # Canada
+        turn['escalated'] = True
+        turn['escalation'] = escalation_response
+        turn['response'] = escalation_response['response']
+        return turn, None
+    
+    # Step 3: Use TherapyAgent for normal therapeutic responses
+    # Prepare enhanced emotion data for the therapy agent
+    emotion_data = {
+        'primary_emotion': detected_emotion,
+        'sentiment': sentiment,
+        'confidence': emotion_confidence,
+        'all_emotions': listener_analysis['emotion']['all_emotions']
+    }
+    
+    # Prepare user history for context
+    user_history = []
+    if history and len(history) > 0:
+        for h in history[-5:]:  # Last 5 interactions
+            user_history.append((h['text'], '', detected_emotion, datetime.now().isoformat()))
+    
+    # Prepare enhanced context with listener analysis
+    context = {
+        'sentiment_score': sentiment,
+        'time_of_day': datetime.now().hour,
+        'message_length': listener_analysis['message_length'],
+        'word_count': listener_analysis['word_count'],
+        'user_history_length': len(history) if history else 0,
+        'previous_emotions': [detected_emotion] if detected_emotion != 'neutral' else [],
+        'emotion_confidence': emotion_confidence,
+        'crisis_level': crisis_level
+    }
+    
+    # Add memory context if available
+    if memory:
+        context['user_preferences'] = memory.get('preferences', {})
+        context['last_mood'] = memory.get('last_mood', {})
+    
+    generation = {
+        'message': message,
+        'emotion_data': emotion_data,
+        'user_history': user_history,
+        'username': username,
+        'context': context
+    }
+    return turn, generation
+
+def welcome_greeting(username, history=None, memory=None):
+    """Greeting prepended to the first reply of a session, if any"""
+    if (not history or len(history) == 0) and memory:
+        if memory.get('last_mood') and memory['last_mood'].get('mood_label'):
+            return f"Welcome back, {username}! Last time you mentioned feeling {memory['last_mood']['mood_label']}. How are you today?"
+        elif memory.get('first_name'):
+            return f"Welcome back, {username}! How can I support you today?"
+    return None
+
+def fallback_turn_response(username):
+    """Simple empathetic response used when the AI pipeline fails"""
+    return f"I hear you, {username}. I'm having trouble processing that right now, but I'm here to listen. Can you tell me more about what's on your mind?"
+
 def generate_ai_response(message, username, emotion='neutral', sentiment='neutral', history=None, memory=None):
-    """Generate AI-powered response using multiple AI agents working together"""
+    """Generate AI-powered response using multiple AI agents working together
+
+    Returns a turn result dict holding the response text together with the
+    ListenerAgent analysis, the escalation decision and per-stage timings, so
+    callers can reuse the analysis instead of re-running it.
+    """
+    turn = None
     try:
-        # Step 1: Use ListenerAgent for sophisticated emotion and crisis analysis
-        listener_analysis = listener_agent.analyze_message(message)
-        
-        # Extract analysis results
-        detected_emotion = listener_analysis['emotion']['primary_emotion']
-        emotion_confidence = listener_analysis['emotion']['confidence']
-        crisis_level = listener_analysis['crisis']['crisis_level']
-        needs_escalation = listener_analysis['crisis']['needs_escalation']
-        
-        print(f"🎧 ListenerAgent Analysis:")
-        print(f"   - Detected Emotion: {detected_emotion} (confidence: {emotion_confidence:.2f})")
-        print(f"   - Crisis Level: {crisis_level}")
-        print(f"   - Needs Escalation: {needs_escalation}")
-        
-        # Step 2: Handle crisis situations with EscalationAgent
-        if needs_escalation:
-            print(f"🚨 Crisis detected! Using EscalationAgent...")
-            escalation_response = escalation_agent.handle_crisis(crisis_level, 'CA')  # Canada
-            return escalation_response['response']
-        
-        # Step 3: Use TherapyAgent for normal therapeutic responses
-        # Prepare enhanced emotion data for the therapy agent
-        emotion_data = {
-            'primary_emotion': detected_emotion,
-            'sentiment': sentiment,
-            'confidence': emotion_confidence,
-            'all_emotions': listener_analysis['emotion']['all_emotions']
-        }
-        
-        # Prepare user history for context
-        user_history = []
-        if history and len(history) > 0:
-            for h in history[-5:]:  # Last 5 interactions
-                user_history.append((h['text'], '', detected_emotion, datetime.now().isoformat()))
-        
-        # Prepare enhanced context with listener analysis
-        context = {
-            'sentiment_score': sentiment,
-            'time_of_day': datetime.now().hour,
-            'message_length': listener_analysis['message_length'],
-            'word_count': listener_analysis['word_count'],
-            'user_history_length': len(history) if history else 0,
-            'previous_emotions': [detected_emotion] if detected_emotion != 'neutral' else [],
-            'emotion_confidence': emotion_confidence,
-            'crisis_level': crisis_level
-        }
-        
-        # Add memory context if available
-        if memory:
-            context['user_preferences'] = memory.get('preferences', {})
-            context['last_mood'] = memory.get('last_mood', {})
+        turn, generation = prepare_ai_turn(message, username, sentiment, history, memory)
+        if generation is None:
+            return turn
         
         # Generate response using AI therapy agent
         print(f"🤖 Generating therapeutic response with TherapyAgent...")
-        ai_response = therapy_agent.generate_empathetic_response(
-            message=message,
-            emotion_data=emotion_data,
-            user_history=user_history,
-            username=username,
-            context=context
-        )
+        generation_started = time.perf_counter()
+        ai_response = get_agent('therapy').generate_empathetic_response(**generation)
+        turn['timings']['generation_ms'] = (time.perf_counter() - generation_started) * 1000
         
         # Add greeting for first message if needed
-        if (not history or len(history) == 0) and memory:
-            if memory.get('last_mood') and memory['last_mood'].get('mood_label'):
-                greeting = f"Welcome back, {username}! Last time you mentioned feeling {memory['last_mood']['mood_label']}. How are you today?"
-                return f"{greeting}\n\n{ai_response}"
-            elif memory.get('first_name'):
-                greeting = f"Welcome back, {username}! How can I support you today?"
-                return f"{greeting}\n\n{ai_response}"
-        
-        return ai_response
+        greeting = welcome_greeting(username, history, memory)
+        turn['response'] = f"{greeting}\n\n{ai_response}" if greeting else ai_response
+        return turn
         
     except Exception as e:
         print(f"❌ AI response generation failed: {e}")
         # Fallback to simple empathetic response
-        return f"I hear you, {username}. I'm having trouble processing that right now, but I'm here to listen. Can you tell me more about what's on your mind?"
+        if turn is None:
+            turn = new_turn()
+        turn['response'] = fallback_turn_response(username)
+        return turn
+    finally:
+        if turn is not None:
+            turn['timings']['total_ms'] = (time.perf_counter() - turn['started']) * 1000
+
+def build_persistent_memory(user):
+    """Profile, preferences, last mood and last conversation, served from the per-user cache"""
+    return memory_cache.get(user.id, lambda: load_persistent_memory(user))
+
+def load_persistent_memory(user):
+    """Collect the profile, preferences, last mood and last conversation for a user"""
+    preferences = UserPreferences.query.filter_by(user_id=user.id).first()
+    last_mood = MoodEntry.query.filter_by(user_id=user.id).order_by(MoodEntry.timestamp.desc()).first()
+    last_conversation = Conversation.query.filter_by(user_id=user.id).order_by(Conversation.timestamp.desc()).first()
+    return {
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'age': user.age,
+        'gender': user.gender,
+        'preferences': preferences.to_dict() if preferences else {},
+        'last_mood': last_mood.to_dict() if last_mood else {},
+        'last_conversation': last_conversation.to_dict() if last_conversation else {}
+    }
+
+def turn_labels(turn):
+    """Stored/returned crisis and sentiment labels for a turn"""
+    return {
+        'emotion_detected': turn['emotion'],
+        'crisis_level': 'high' if turn['crisis_level'] in ['high', 'medium'] else 'none',
+        'sentiment_score': 'negative' if turn['crisis_level'] != 'none' else 'neutral'
+    }
+
+def persist_row(model, **values):
+    """Insert a row now, or queue it when write-behind persistence is on
+    
+    Returns the committed row, or None when it was queued. A full queue
+    falls back to writing synchronously.
+    """
+    if write_behind is not None and write_behind.enqueue(model, **values):
+        return None
+    row = model(**values)
+    db.session.add(row)
+    db.session.commit()
+    return row
+
+def save_conversation_turn(user_id, message, turn):
+    """Persist a finished chat turn as a Conversation row"""
+    return persist_row(
+        Conversation,
+        user_id=user_id,
+        message=message,
+        response=turn['response'],
+        timestamp=datetime.utcnow(),  # Time of the turn, not of a later batch flush
+        **turn_labels(turn)
+    )
+
+def busy_response():
+    """503 for auth requests shed while the password hashing queue is full"""
+    response = jsonify({
+        'error': 'Too many sign-in attempts right now. Please try again shortly.',
+        'timestamp': datetime.now().isoformat()
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 # Authentication endpoints
 @app.route('/auth/signup', methods=['POST'])
@@ -188,7 +483,7 @@ def signup():
             age=data['age'],
             gender=data.get('gender', '')
         )
-        user.set_password(data['password'])
+        user.set_password(data['password'], password_hasher)
         
         # Save to database
         db.session.add(user)
@@ -200,15 +495,7 @@ def signup():
         db.session.commit()
         
         # Generate JWT token
-        token = jwt.encode(
-            {
-                'username': username,
-                'email': email,
-                'exp': datetime.utcnow() + timedelta(days=30)
-            },
-            JWT_SECRET,
-            algorithm=JWT_ALGORITHM
-        )
+        token = issue_token(user)
         
         print(f"✅ New user registered: {username}")
         
@@ -220,6 +507,10 @@ def signup():
             'timestamp': datetime.now().isoformat()
         }), 201
         
+    except PasswordHasherBusy as e:
+        print(f"⚠️ Signup rejected: {e}")
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         print(f"❌ Error in signup: {e}")
         db.session.rollback()
@@ -244,23 +535,20 @@ def signin():
         # Find user by email
         user = User.query.filter_by(email=email).first()
         
-        if not user or not user.check_password(password):
+        if not user or not user.check_password(password, password_hasher):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Upgrade hashes made with a different work factor while we have the password
+        if password_hasher.needs_rehash(user.password_hash):
+            user.set_password(password, password_hasher)
+            password_hasher.record_rehash()
+        
         # Update last login
         user.last_login = datetime.utcnow()
         db.session.commit()
         
         # Generate JWT token
-        token = jwt.encode(
-            {
-                'username': user.username,
-                'email': user.email,
-                'exp': datetime.utcnow() + timedelta(days=30)
-            },
-            JWT_SECRET,
-            algorithm=JWT_ALGORITHM
-        )
+        token = issue_token(user)
         
         print(f"✅ User logged in: {user.username}")
         
@@ -272,6 +560,10 @@ def signin():
             'timestamp': datetime.now().isoformat()
         }), 200
             
+    except PasswordHasherBusy as e:
+        print(f"⚠️ Signin rejected: {e}")
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         print(f"❌ Error in signin: {e}")
         return jsonify({
@@ -300,8 +592,20 @@ def verify_token(current_user):
 @app.route('/auth/logout', methods=['POST'])
 @token_required
 def logout(current_user):
-    """User logout endpoint"""
+    """User logout endpoint: revokes the token used for this request"""
     try:
+        claims = g.token_claims
+        if claims.get('jti'):
+            now = datetime.utcnow()
+            # Expired tokens are rejected anyway; their entries can go
+            RevokedToken.query.filter(RevokedToken.expires_at < now).delete(synchronize_session=False)
+            db.session.merge(RevokedToken(
+                jti=claims['jti'],
+                user_id=current_user.id,
+                expires_at=datetime.utcfromtimestamp(claims['exp']) if 'exp' in claims else now + timedelta(days=30)
+            ))
+            db.session.commit()
+        principal_cache.forget(principal_key(claims))
         print(f"✅ User logged out: {current_user.username}")
         
         return jsonify({
@@ -312,6 +616,32 @@ def logout(current_user):
             
     except Exception as e:
         print(f"❌ Error in logout: {e}")
+        db.session.rollback()
+        return jsonify({
+            'error': 'Logout failed',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/auth/logout-all', methods=['POST'])
+@token_required
+def logout_all(current_user):
+    """Revoke every token the user holds, on every device"""
+    try:
+        # Committing the bump also drops the user's principal cache entries here
+        user = db.session.get(User, current_user.id)
+        user.token_version = (user.token_version or 0) + 1
+        db.session.commit()
+        print(f"✅ User logged out everywhere: {current_user.username}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Logged out on all devices',
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    
+    except Exception as e:
+        print(f"❌ Error in logout-all: {e}")
+        db.session.rollback()
         return jsonify({
             'error': 'Logout failed',
             'timestamp': datetime.now().isoformat()
@@ -330,21 +660,10 @@ def chat(current_user):
         print(f"💬 Received message from {current_user.username}: {message[:50]}...")
 
         # Persistent memory
-        preferences = UserPreferences.query.filter_by(user_id=current_user.id).first()
-        last_mood = MoodEntry.query.filter_by(user_id=current_user.id).order_by(MoodEntry.timestamp.desc()).first()
-        last_conversation = Conversation.query.filter_by(user_id=current_user.id).order_by(Conversation.timestamp.desc()).first()
-        persistent_memory = {
-            'first_name': current_user.first_name,
-            'last_name': current_user.last_name,
-            'age': current_user.age,
-            'gender': current_user.gender,
-            'preferences': preferences.to_dict() if preferences else {},
-            'last_mood': last_mood.to_dict() if last_mood else {},
-            'last_conversation': last_conversation.to_dict() if last_conversation else {}
-        }
+        persistent_memory = build_persistent_memory(current_user)
 
         # Use enhanced AI system with multiple agents
-        response = generate_ai_response(
+        turn = generate_ai_response(
             message,
             current_user.first_name,
             emotion='neutral',  # Will be detected by ListenerAgent
@@ -353,36 +672,25 @@ def chat(current_user):
             memory=persistent_memory
         )
 
-        # Get final analysis from ListenerAgent for database storage
-        listener_analysis = listener_agent.analyze_message(message)
-        final_emotion = listener_analysis['emotion']['primary_emotion']
-        final_crisis_level = listener_analysis['crisis']['crisis_level']
+        # Reuse the turn's ListenerAgent analysis for database storage
+        response = turn['response']
 
         # Debug logging
         print(f"🔍 Message: '{message}'")
-        print(f"🔍 Final Emotion: {final_emotion}")
-        print(f"🔍 Crisis Level: {final_crisis_level}")
+        print(f"🔍 Final Emotion: {turn['emotion']}")
+        print(f"🔍 Crisis Level: {turn['crisis_level']}")
         print(f"🔍 Response: {response[:100]}...")
+        print(f"⏱️ Turn timings: " + ", ".join(f"{k}={v:.1f}" for k, v in turn['timings'].items()))
 
-        # Save conversation
-        conversation = Conversation(
-            user_id=current_user.id,
-            message=message,
-            response=response,
-            emotion_detected=final_emotion,
-            sentiment_score='negative' if final_crisis_level != 'none' else 'neutral',
-            crisis_level='high' if final_crisis_level in ['high', 'medium'] else 'none'
-        )
-        db.session.add(conversation)
-        db.session.commit()
+        # Save conversation (the commit expires current_user, so read it first)
+        username = current_user.username
+        save_conversation_turn(current_user.id, message, turn)
 
         return jsonify({
             'response': response,
-            'emotion_detected': final_emotion,
-            'crisis_level': 'high' if final_crisis_level in ['high', 'medium'] else 'none',
-            'sentiment_score': 'negative' if final_crisis_level != 'none' else 'neutral',
+            **turn_labels(turn),
             'timestamp': datetime.now().isoformat(),
-            'username': current_user.username
+            'username': username
         })
 
     except Exception as e:
@@ -392,6 +700,79 @@ def chat(current_user):
             'error': str(e)
         }), 500
 
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+@token_required
+def chat_stream(current_user):
+    """Streaming chat endpoint: sends the reply as Server-Sent Events
+
+    Emits ``chunk`` events with text as the model produces it, then a
+    ``done`` event with the emotion/crisis metadata once the full reply has
+    been saved as a Conversation row.
+    """
+    data = request.json or {}
+    message = data.get('message', '')
+    history = data.get('history', [])
+    user_id = current_user.id
+    username = current_user.username
+    first_name = current_user.first_name
+
+    print(f"💬 Streaming reply to {username}: {message[:50]}...")
+
+    try:
+        persistent_memory = build_persistent_memory(current_user)
+        turn, generation = prepare_ai_turn(message, first_name, 'neutral', history, persistent_memory)
+    except Exception as e:
+        print(f"❌ AI response preparation failed: {e}")
+        turn, generation = new_turn(), None
+        turn['response'] = fallback_turn_response(first_name)
+
+    def events():
+        parts = []
+        try:
+            if generation is None:
+                parts.append(turn['response'])
+                yield sse_event('chunk', {'text': turn['response']})
+            else:
+                greeting = welcome_greeting(first_name, history, persistent_memory)
+                if greeting:
+                    parts.append(f"{greeting}\n\n")
+                    yield sse_event('chunk', {'text': parts[-1]})
+                generation_started = time.perf_counter()
+                for text in get_agent('therapy').stream_empathetic_response(**generation):
+                    if 'first_chunk_ms' not in turn['timings']:
+                        turn['timings']['first_chunk_ms'] = (time.perf_counter() - turn['started']) * 1000
+                    parts.append(text)
+                    yield sse_event('chunk', {'text': text})
+                turn['timings']['generation_ms'] = (time.perf_counter() - generation_started) * 1000
+
+            turn['response'] = ''.join(parts)
+            turn['timings']['total_ms'] = (time.perf_counter() - turn['started']) * 1000
+            save_conversation_turn(user_id, message, turn)
+
+            yield sse_event('done', {
+                **turn_labels(turn),
+                'timings': turn['timings'],
+                'timestamp': datetime.now().isoformat(),
+                'username': username
+            })
+        except Exception as e:
+            print(f"❌ Error in chat stream: {e}")
+            db.session.rollback()
+            yield sse_event('error', {
+                'response': f"I'm having trouble right now, but I'm here for you, {first_name}. Could you try again?",
+                'error': str(e)
+            })
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # User data endpoints
 @app.route('/user-stats/<username>')
 @token_required
@@ -401,67 +782,14 @@ def get_user_stats(current_user, username):
         if current_user.username != username:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        # Get stats
-        conversations = Conversation.query.filter_by(user_id=current_user.id).all()
-        activities = Activity.query.filter_by(user_id=current_user.id).all()
-        mood_entries = MoodEntry.query.filter_by(user_id=current_user.id).all()
-        
-        # --- Weighted Wellness Score Calculation ---
-        # Weights: Conversations 20%, Activities 25%, Mood 30%, Insights 25%
-        # All normalized to 0-100, then weighted sum
-        # New users start at 0
-        
-        # Conversations (max 20 for full score)
-        convo_count = len(conversations)
-        convo_score = min(convo_count, 20) / 20 * 100 if convo_count > 0 else 0
-        
-        # Activities (max 20 for full score)
-        activity_count = len(activities)
-        activity_score = min(activity_count, 20) / 20 * 100 if activity_count > 0 else 0
-        
-        # Mood Tracking (average mood 1-10, normalized)
-        if mood_entries:
-            avg_mood = sum(m.mood_score for m in mood_entries) / len(mood_entries)
-            mood_score = (avg_mood - 1) / 9 * 100  # 1-10 scale to 0-100
-        else:
-            mood_score = 0
-        
-        # Insights (e.g., improvement streaks, positive trends)
-        # For now, use streak of positive/neutral moods in last 7 entries
-        insight_score = 0
-        if mood_entries:
-            last_7 = sorted(mood_entries, key=lambda m: m.timestamp, reverse=True)[:7]
-            streak = 0
-            for m in last_7:
-                if m.mood_score >= 6:  # 6-10 is positive
-                    streak += 1
-                else:
-                    break
-            insight_score = streak / 7 * 100 if last_7 else 0
-        
-        # Weighted sum
-        wellness_score = (
-            convo_score * 0.20 +
-            activity_score * 0.25 +
-            mood_score * 0.30 +
-            insight_score * 0.25
-        )
-        wellness_score = round(max(0, min(100, wellness_score)))
-        
-        # Emotions count for frontend
-        emotions_count = {}
-        for conv in conversations:
-            emotion = conv.emotion_detected or 'neutral'
-            emotions_count[emotion] = emotions_count.get(emotion, 0) + 1
+        report = WELLNESS_REPORTS[app.config['USER_STATS_MODE']](current_user.id)
+        last_activity_id = report.pop('last_activity_id')
+        last_activity = db.session.get(Activity, last_activity_id) if last_activity_id else None
         
         return jsonify({
             'username': current_user.username,
-            'total_conversations': convo_count,
-            'activity_count': activity_count,
-            'emotions_count': emotions_count,
-            'most_common_emotion': max(emotions_count.items(), key=lambda x: x[1])[0] if emotions_count else 'neutral',
-            'wellness_score': wellness_score,
-            'last_activity': activities[-1].to_dict() if activities else None,
+            **report,
+            'last_activity': last_activity.to_dict() if last_activity else None,
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
@@ -471,20 +799,86 @@ def get_user_stats(current_user, username):
             'timestamp': datetime.now().isoformat()
         }), 500
 
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+HISTORY_FIELDS = ['id', 'user_id', 'message', 'response', 'emotion_detected', 'sentiment_score', 'crisis_level', 'timestamp']
+
+def encode_history_cursor(timestamp, conversation_id):
+    """Opaque keyset cursor pointing just past a conversation (timestamp may be None)"""
+    timestamp = timestamp.isoformat() if timestamp else ''
+    return base64.urlsafe_b64encode(f"{timestamp}|{conversation_id}".encode('utf-8')).decode('ascii')
+
+def decode_history_cursor(cursor):
+    """Return (timestamp or None, id) from a cursor; raises ValueError if malformed"""
+    try:
+        timestamp, conversation_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp) if timestamp else None, int(conversation_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
 @app.route('/history/<username>')
 @token_required
 def get_history(current_user, username):
-    """Get user conversation history"""
+    """Get user conversation history, newest first, one keyset page at a time
+    
+    Query params: ``limit`` (default 20, max 100), ``before`` (the
+    ``next_cursor`` of the previous page) and ``fields`` (comma-separated
+    subset of conversation fields, e.g. ``fields=id,message,timestamp``).
+    """
     try:
         if current_user.username != username:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        conversations = Conversation.query.filter_by(user_id=current_user.id).order_by(Conversation.timestamp.desc()).limit(20).all()
+        try:
+            limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        
+        fields = HISTORY_FIELDS
+        if request.args.get('fields'):
+            fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+            unknown = [field for field in fields if field not in HISTORY_FIELDS]
+            if unknown:
+                return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+        
+        # Only the requested columns are read, plus the (timestamp, id) keyset
+        columns = [getattr(Conversation, field) for field in fields if field not in ('id', 'timestamp')]
+        query = db.session.query(Conversation.id, Conversation.timestamp, *columns).filter(
+            Conversation.user_id == current_user.id
+        )
+        if request.args.get('before'):
+            try:
+                before_timestamp, before_id = decode_history_cursor(request.args['before'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            # Rows without a timestamp come last (a NULL never compares
+            # true in the tuple), paged by id alone
+            if before_timestamp is None:
+                query = query.filter(Conversation.timestamp.is_(None), Conversation.id < before_id)
+            else:
+                query = query.filter(or_(
+                    tuple_(Conversation.timestamp, Conversation.id) < tuple_(before_timestamp, before_id),
+                    Conversation.timestamp.is_(None)
+                ))
+        
+        rows = query.order_by(Conversation.timestamp.desc().nulls_last(), Conversation.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        history = []
+        for row in rows:
+            item = {}
+            for field in fields:
+                value = getattr(row, field)
+                item[field] = value.isoformat() if field == 'timestamp' and value else value
+            history.append(item)
         
         return jsonify({
-            'history': [conv.to_dict() for conv in conversations],
+            'history': history,
             'username': current_user.username,
-            'total_conversations': len(conversations),
+            'total_conversations': len(history),
+            'has_more': has_more,
+            'next_cursor': encode_history_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None,
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
@@ -504,13 +898,13 @@ def save_activity(current_user):
         activity_type = data.get('activity_type', '')
         activity_data = data.get('activity_data', {})
         
-        activity = Activity(
+        persist_row(
+            Activity,
             user_id=current_user.id,
             activity_type=activity_type,
-            activity_data=activity_data
+            activity_data=activity_data,
+            completed_at=datetime.utcnow()
         )
-        db.session.add(activity)
-        db.session.commit()
         
         print(f"💾 Activity saved for {current_user.username}: {activity_type}")
         
@@ -532,56 +926,57 @@ def save_activity(current_user):
         }), 500
 
 # Wellness tips endpoint
+# Daily wellness tips by weekday (Monday = 0); also pre-rendered into the voice pack
+WELLNESS_TIPS_BY_DAY = {
+    0: {  # Monday
+        'tip': 'Start your week with intention! Set three small, achievable goals for today.',
+        'activity': 'Try our breathing exercise to center yourself for the week ahead.',
+        'emoji': '🌟',
+        'focus': 'Goal Setting'
+    },
+    1: {  # Tuesday
+        'tip': 'Take breaks between tasks. Even 5 minutes of mindfulness can refresh your mind.',
+        'activity': 'Play our memory game to give your brain a fun workout!',
+        'emoji': '🧠',
+        'focus': 'Mindfulness'
+    },
+    2: {  # Wednesday
+        'tip': 'Midweek check-in: How are you feeling? It\'s okay to adjust your expectations.',
+        'activity': 'Use our mood tracker to reflect on your current emotional state.',
+        'emoji': '💙',
+        'focus': 'Self-Awareness'
+    },
+    3: {  # Thursday
+        'tip': 'Practice gratitude today. What are three things that went well this week?',
+        'activity': 'Try our gratitude game to focus on the positive aspects of your life.',
+        'emoji': '🙏',
+        'focus': 'Gratitude'
+    },
+    4: {  # Friday
+        'tip': 'As the week winds down, celebrate your accomplishments, big or small!',
+        'activity': 'Relax with our progressive muscle relaxation exercise.',
+        'emoji': '🎉',
+        'focus': 'Celebration'
+    },
+    5: {  # Saturday
+        'tip': 'Weekend self-care: Do something that brings you joy and peace.',
+        'activity': 'Engage your mind with our word puzzle games.',
+        'emoji': '🌸',
+        'focus': 'Self-Care'
+    },
+    6: {  # Sunday
+        'tip': 'Sunday reflection: What did you learn about yourself this week?',
+        'activity': 'Try all our activities and see which ones resonate with you.',
+        'emoji': '🧘',
+        'focus': 'Reflection'
+    }
+}
+
 @app.route('/wellness-tips')
 def get_wellness_tips():
     """Get daily wellness tips"""
-    tips_by_day = {
-        0: {  # Monday
-            'tip': 'Start your week with intention! Set three small, achievable goals for today.',
-            'activity': 'Try our breathing exercise to center yourself for the week ahead.',
-            'emoji': '🌟',
-            'focus': 'Goal Setting'
-        },
-        1: {  # Tuesday
-            'tip': 'Take breaks between tasks. Even 5 minutes of mindfulness can refresh your mind.',
-            'activity': 'Play our memory game to give your brain a fun workout!',
-            'emoji': '🧠',
-            'focus': 'Mindfulness'
-        },
-        2: {  # Wednesday
-            'tip': 'Midweek check-in: How are you feeling? It\'s okay to adjust your expectations.',
-            'activity': 'Use our mood tracker to reflect on your current emotional state.',
-            'emoji': '💙',
-            'focus': 'Self-Awareness'
-        },
-        3: {  # Thursday
-            'tip': 'Practice gratitude today. What are three things that went well this week?',
-            'activity': 'Try our gratitude game to focus on the positive aspects of your life.',
-            'emoji': '🙏',
-            'focus': 'Gratitude'
-        },
-        4: {  # Friday
-            'tip': 'As the week winds down, celebrate your accomplishments, big or small!',
-            'activity': 'Relax with our progressive muscle relaxation exercise.',
-            'emoji': '🎉',
-            'focus': 'Celebration'
-        },
-        5: {  # Saturday
-            'tip': 'Weekend self-care: Do something that brings you joy and peace.',
-            'activity': 'Engage your mind with our word puzzle games.',
-            'emoji': '🌸',
-            'focus': 'Self-Care'
-        },
-        6: {  # Sunday
-            'tip': 'Sunday reflection: What did you learn about yourself this week?',
-            'activity': 'Try all our activities and see which ones resonate with you.',
-            'emoji': '🧘',
-            'focus': 'Reflection'
-        }
-    }
-    
     current_day = datetime.now().weekday()
-    daily_tip = tips_by_day[current_day]
+    daily_tip = WELLNESS_TIPS_BY_DAY[current_day]
     
     return jsonify({
         'daily_tip': daily_tip,
@@ -665,18 +1060,180 @@ def submit_contact():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+# Voice endpoints
+_voice_service = None
+_voice_service_lock = threading.Lock()
+
+def get_voice_service():
+    """Shared VoiceService, imported on first use (it probes the microphone
+    and needs the optional speech packages); None if unavailable"""
+    global _voice_service
+    if _voice_service is None:
+        with _voice_service_lock:
+            if _voice_service is None:
+                try:
+                    from voice_service import voice_service
+                except Exception as e:
+                    print(f"⚠️ Voice service unavailable: {e}")
+                    return None
+                _voice_service = voice_service
+    return _voice_service
+
+def audio_response(key, audio):
+    """Cacheable audio: the content-addressed key doubles as a strong ETag
+    
+    Replies are per-user, so only the client may cache them, never a shared proxy.
+    """
+    if key in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(audio, mimetype='audio/mpeg')
+    response.set_etag(key)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+def parse_voice_request(service):
+    """(text, voice_id, voice_style) from a voice request body, or an error response
+    
+    Voices must be an alias, catalog name or catalog id the service knows;
+    anything else is rejected rather than passed into the upstream URL.
+    """
+    data = request.json or {}
+    text = (data.get('text') or '').strip()
+    if not text:
+        return None, (jsonify({'error': 'text is required'}), 400)
+    if len(text) > VOICE_MAX_TEXT_CHARS:
+        return None, (jsonify({'error': f'text is longer than {VOICE_MAX_TEXT_CHARS} characters'}), 400)
+    
+    voice = data.get('voice') or data.get('voice_id')
+    voice_id = None
+    if voice:
+        voice_id = service.resolve_voice(voice) if isinstance(voice, str) else None
+        if voice_id is None:
+            return None, (jsonify({'error': 'Unknown voice'}), 400)
+    
+    voice_style = data.get('voice_style') or data.get('style') or 'empathetic'
+    return (text, voice_id, voice_style), None
+
+@app.route('/voice/generate', methods=['POST'])
+@token_required
+def generate_voice(current_user):
+    """Text-to-speech; repeated text is served from the audio cache"""
+    service = get_voice_service()
+    if service is None:
+        return jsonify({'success': False, 'error': 'Voice service is not available'}), 503
+    
+    parsed, error = parse_voice_request(service)
+    if error:
+        return error
+    text, voice_id, voice_style = parsed
+    
+    result = service.synthesize(
+        text,
+        voice_id=voice_id,
+        voice_style=voice_style,
+        # Chat replies address the user by first name
+        name=current_user.first_name
+    )
+    if result is None:
+        if not service.api_key:
+            # Not cached or pre-rendered, and nothing to synthesize it with
+            return jsonify({'success': False, 'error': 'Speech generation is not configured'}), 503
+        return jsonify({
+            'success': False,
+            'error': 'Speech generation failed',
+            'timestamp': datetime.now().isoformat()
+        }), 502
+    
+    key, audio = result
+    return jsonify({
+        'success': True,
+        'audio_base64': base64.b64encode(audio).decode('ascii'),
+        'audio_key': key,
+        'audio_url': f"/voice/audio/{key}",
+        'content_type': 'audio/mpeg',
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/voice/stream', methods=['POST'])
+@token_required
+def stream_voice(current_user):
+    """Text-to-speech streamed as MP3 while it's synthesized, sentence by sentence"""
+    service = get_voice_service()
+    if service is None:
+        return jsonify({'success': False, 'error': 'Voice service is not available'}), 503
+    
+    parsed, error = parse_voice_request(service)
+    if error:
+        return error
+    text, voice_id, voice_style = parsed
+    if not service.api_key:
+        return jsonify({'success': False, 'error': 'Speech generation is not configured'}), 503
+    
+    from voice_service import SpeechStreamError
+    chunks = service.stream_speech(
+        text,
+        voice_id=voice_id,
+        voice_style=voice_style,
+        # Chat replies address the user by first name
+        name=current_user.first_name
+    )
+    # Wait for the first chunk so an upstream failure is still a proper error status
+    try:
+        first_chunk = next(chunks)
+    except (SpeechStreamError, StopIteration):
+        return jsonify({
+            'success': False,
+            'error': 'Speech generation failed',
+            'timestamp': datetime.now().isoformat()
+        }), 502
+    return Response(
+        stream_with_context(itertools.chain([first_chunk], chunks)),
+        mimetype='audio/mpeg',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/voice/audio/<key>')
+@token_required
+def get_voice_audio(current_user, key):
+    """Raw audio for a key returned by /voice/generate (supports If-None-Match)"""
+    if not is_audio_key(key):
+        return jsonify({'error': 'Invalid audio key'}), 400
+    # Content-addressed: a matching ETag is valid without looking anything up
+    if key in request.if_none_match:
+        return audio_response(key, None)
+    
+    service = get_voice_service()
+    audio = service.get_cached_audio(key) if service else None
+    if audio is None:
+        return jsonify({'error': 'Audio not found'}), 404
+    return audio_response(key, audio)
+
 # Health check endpoint
 @app.route('/health')
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (liveness: the process is up and serving)"""
+    therapy_agent = get_agent('therapy')
     return jsonify({
         'status': 'healthy',
         'service': 'Mental Health Buddy AI - Enhanced Multi-Agent System',
         'version': '3.0.0',
-        'database': 'SQLite with SQLAlchemy',
+        'database': f"{backend_label(app.config['SQLALCHEMY_DATABASE_URI'])} with SQLAlchemy",
+        'persistence': {
+            'mode': app.config['PERSISTENCE_MODE'],
+            'write_behind': write_behind.stats() if write_behind else None
+        },
+        'memory_cache': memory_cache.stats(),
+        'auth_cache': principal_cache.stats(),
+        'password_hashing': password_hasher.stats(),
+        'audio_cache': _voice_service.audio_cache.stats() if _voice_service else None,
+        'voice_pack': _voice_service.voice_pack.stats() if _voice_service and _voice_service.voice_pack else None,
+        'voice_api': _voice_service.http.stats() if _voice_service else None,
+        'voice_catalog': _voice_service.catalog_stats() if _voice_service else None,
         'ai_system': {
             'primary_model': 'Gemini 2.0 Flash' if GOOGLE_API_KEY else 'Enhanced Fallback',
-            'therapy_agent': 'Active',
+            'therapy_agent': 'Active' if therapy_agent.is_connected else 'Fallback',
+            'therapy_agent_calls': therapy_agent.get_status(),
             'listener_agent': 'Active',
             'escalation_agent': 'Active',
             'multi_agent_coordination': 'Enabled'
@@ -694,10 +1251,79 @@ def health_check():
         }
     })
 
+# Readiness endpoint
+@app.route('/ready')
+def readiness_check():
+    """Readiness endpoint: 200 once agents are created and warmed up, 503 before"""
+    return jsonify({
+        'ready': agent_warm_up['ready'],
+        'agent_warm_up': agent_warm_up,
+        'current_time': datetime.now().isoformat()
+    }), 200 if agent_warm_up['ready'] else 503
+
+@app.cli.command('rebuild-user-stats')
+@click.option('--username', default=None, help='Only rebuild this user')
+def rebuild_user_stats_command(username):
+    """Recompute the per-user stats aggregates from existing rows"""
+    user_id = None
+    if username:
+        user = User.query.filter_by(username=username).first()
+        if not user:
+            raise click.ClickException(f"Unknown user: {username}")
+        user_id = user.id
+    rebuilt = rebuild_user_stats(user_id)
+    print(f"✅ Rebuilt stats for {rebuilt} user(s)")
+
+@app.cli.command('build-voice-pack')
+@click.option('--output', default=None, help='Pack file to write (default: VOICE_PACK_PATH)')
+@click.option('--voices', default=None, help='Comma-separated voice names (default: all)')
+@click.option('--style', default='empathetic', help='Voice style to render')
+def build_voice_pack_command(output, voices, style):
+    """Pre-render crisis, fallback and wellness-tip phrases into a voice pack"""
+    from agents.therapy_agent_fallback import TherapyAgentFallback
+    from voice_pack import build_corpus, write_pack
+    service = get_voice_service()
+    if service is None:
+        raise click.ClickException("Voice service is not available")
+    selected = service.voice_options
+    if voices:
+        names = [name.strip() for name in voices.split(',') if name.strip()]
+        unknown = [name for name in names if name not in service.voice_options]
+        if unknown:
+            raise click.ClickException(f"Unknown voice(s): {', '.join(unknown)}")
+        selected = {name: service.voice_options[name] for name in names}
+    corpus = build_corpus(
+        get_agent('escalation'),
+        TherapyAgent.FALLBACK_RESPONSES,
+        TherapyAgentFallback().therapeutic_responses,
+        WELLNESS_TIPS_BY_DAY
+    )
+    stats = write_pack(
+        output or service.voice_pack_path,
+        corpus,
+        selected,
+        style,
+        service.model_id,
+        lambda text, voice_id: service.synthesize(text, voice_id, style)
+    )
+    print(f"✅ Voice pack written: {stats['phrases']} phrases x {stats['voices']} voice(s), "
+          f"{stats['clips']} clips, {stats['bytes'] / 1024 / 1024:.1f} MB ({stats['failed']} failed)")
+
 # Create database tables
 def create_tables():
     with app.app_context():
-        db.create_all()
+        if app.config['USER_STATS_MODE'] == 'aggregate':
+            db.create_all()
+        else:
+            db.metadata.create_all(db.engine, tables=[
+                table for table in db.metadata.sorted_tables if table.name != UserStats.__tablename__
+            ])
+        added_columns = ensure_columns(db.engine)
+        if added_columns:
+            print(f"🗂️ Added database columns: {', '.join(added_columns)}")
+        created_indexes = ensure_indexes(db.engine)
+        if created_indexes:
+            print(f"🗂️ Added database indexes: {', '.join(created_indexes)}")
         print("✅ Database tables created successfully")
 
 if __name__ == '__main__':
@@ -706,7 +1332,7 @@ if __name__ == '__main__':
     
     print("💙 Mental Health Buddy AI - Enhanced Multi-Agent System")
     print("💙 Visit http://localhost:5000/health for system health check")
-    print("🔧 Database: SQLite with SQLAlchemy")
+    print(f"🔧 Database: {backend_label(app.config['SQLALCHEMY_DATABASE_URI'])} with SQLAlchemy ({db_storage_profile['name']} storage profile)")
     print("🤖 AI System: Multi-Agent Coordination")
     print("🚀 Starting Flask server...")
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+def normalize_text(text: str) -> str:
+    """Canonical form of an utterance: NFC, whitespace collapsed and trimmed"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+def audio_key(text: str, voice_id: str, voice_settings: Dict, model_id: str) -> str:
+    """Content address of a synthesized utterance (sha256 hex)
+
+    Everything that changes the audio goes into the hash, so a key never
+    maps to two different clips.
+    """
+    payload = json.dumps({
+        'text': normalize_text(text),
+        'voice_id': voice_id,
+        'voice_settings': voice_settings,
+        'model_id': model_id
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def is_audio_key(key: str) -> bool:
+    return bool(_KEY_PATTERN.match(key or ''))
+
+class AudioCache:
+    def __init__(self, directory: str, memory_bytes: int = 64 * 1024 * 1024,
+                 disk_bytes: int = 1024 * 1024 * 1024, extension: str = 'mp3'):
+        """Two-tier cache of synthesized audio keyed by ``audio_key``
+
+        Recently used clips live in an in-memory LRU bounded by
+        ``memory_bytes``. Every clip is also written to ``directory`` (one
+        file per key, written atomically) and read back on a memory miss,
+        so a restart or another worker process starts warm. The disk tier
+        evicts least recently used files once it grows past ``disk_bytes``.
+        """
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.extension = extension
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> bytes
+        self._memory_size = 0
+        self._disk = OrderedDict()  # key -> file size, least recently used first
+        self._disk_size = 0
+        self._inflight = {}  # key -> lock held by the thread producing it
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+            'coalesced': 0
+        }
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{self.extension}")
+
+    def _scan(self):
+        """Index files left by earlier runs, oldest access first"""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                key, _, extension = name.partition('.')
+                if extension != self.extension or not is_audio_key(key):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((stat.st_atime, key, stat.st_size))
+        for _, key, size in sorted(found):
+            self._disk[key] = size
+            self._disk_size += size
+
+    def _remember(self, key: str, data: bytes):
+        # Caller holds the lock
+        if len(data) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self._counters['memory_evictions'] += 1
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                # One plain read: callers get bytes, so a mapping only adds a copy
+                return f.read() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        evict = []
+        with self._lock:
+            self._disk_size += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_size -= size
+                self._counters['disk_evictions'] += 1
+                evict.append(old_key)
+        for old_key in evict:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached audio for ``key`` from memory, then disk; None on a miss"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return data
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                # Another process may have evicted it; forget the stale index entry
+                self._disk_size -= self._disk.pop(key, 0)
+                self._counters['misses'] += 1
+                return None
+            if key not in self._disk:
+                # Written by another worker process sharing the directory
+                self._disk[key] = len(data)
+                self._disk_size += len(data)
+            self._disk.move_to_end(key)
+            self._counters['disk_hits'] += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        if not data:
+            # Nothing to serve; an empty entry would read as a hit
+            return
+        with self._lock:
+            self._remember(key, data)
+            self._counters['stores'] += 1
+        try:
+            self._write_disk(key, data)
+        except OSError as e:
+            print(f"⚠️ Audio cache disk write failed: {e}")
+
+    def get_or_create(self, key: str, producer: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        """Cached audio, or ``producer()`` stored under ``key``
+
+        Concurrent misses for the same key wait for the first producer
+        rather than each calling upstream. ``None`` results aren't cached.
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+        with self._lock:
+            lock = self._inflight.get(key)
+            leader = lock is None
+            if leader:
+                lock = self._inflight[key] = threading.Lock()
+                lock.acquire()
+            else:
+                self._counters['coalesced'] += 1
+        if not leader:
+            with lock:
+                pass
+            data = self.get(key)
+            if data is not None:
+                return data
+            return producer()
+        try:
+            data = producer()
+            if data:
+                self.put(key, data)
+            return data
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            lock.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            lookups = counters['memory_hits'] + counters['disk_hits'] + counters['misses']
+            return {
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'memory_limit_bytes': self.memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_size,
+                'disk_limit_bytes': self.disk_bytes,
+                'hit_rate': round((lookups - counters['misses']) / lookups, 3) if lookups else None,
+                **counters
+            }
@@ -0,0 +1,115 @@
+"""Per-user query latency with and without the model indexes
+
+Fills a scratch SQLite database with conversations and mood entries spread
+over many users, then times the hot per-user queries (latest conversation,
+latest mood, history page) before and after ``ensure_indexes``.
+
+    python benchmarks/query_index_benchmark.py --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from database.models import db, User, Conversation, MoodEntry, ensure_indexes
+
+BATCH_SIZE = 50000
+
+def build_app(path: str) -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+def populate(rows: int, users: int):
+    """Insert users plus ``rows`` conversations and rows/10 mood entries"""
+    db.session.execute(db.insert(User), [
+        {
+            'username': f"user{i}", 'email': f"user{i}@example.com", 'password_hash': 'x',
+            'first_name': 'Bench', 'last_name': 'User', 'age': 30
+        }
+        for i in range(1, users + 1)
+    ])
+    start = datetime(2024, 1, 1)
+    rng = random.Random(42)
+    for offset in range(0, rows, BATCH_SIZE):
+        count = min(BATCH_SIZE, rows - offset)
+        db.session.execute(db.insert(Conversation), [
+            {
+                'user_id': rng.randint(1, users), 'message': 'hello', 'response': 'hi there',
+                'emotion_detected': 'neutral', 'sentiment_score': 'neutral', 'crisis_level': 'none',
+                'timestamp': start + timedelta(seconds=offset + i)
+            }
+            for i in range(count)
+        ])
+    for offset in range(0, rows // 10, BATCH_SIZE):
+        count = min(BATCH_SIZE, rows // 10 - offset)
+        db.session.execute(db.insert(MoodEntry), [
+            {
+                'user_id': rng.randint(1, users), 'mood_score': rng.randint(1, 10),
+                'timestamp': start + timedelta(seconds=offset + i)
+            }
+            for i in range(count)
+        ])
+    db.session.commit()
+
+def time_queries(users: int, samples: int) -> dict:
+    """Median latency in milliseconds of each hot query over random users"""
+    rng = random.Random(7)
+    queries = {
+        'latest_conversation': lambda user_id: Conversation.query.filter_by(user_id=user_id).order_by(Conversation.timestamp.desc()).first(),
+        'latest_mood': lambda user_id: MoodEntry.query.filter_by(user_id=user_id).order_by(MoodEntry.timestamp.desc()).first(),
+        'history_page': lambda user_id: Conversation.query.filter_by(user_id=user_id).order_by(Conversation.timestamp.desc()).limit(20).all()
+    }
+    results = {}
+    for name, query in queries.items():
+        latencies = []
+        for _ in range(samples):
+            user_id = rng.randint(1, users)
+            started = time.perf_counter()
+            query(user_id)
+            latencies.append((time.perf_counter() - started) * 1000)
+            db.session.expunge_all()
+        latencies.sort()
+        results[name] = latencies[len(latencies) // 2]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--samples', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'query':<22} {'no index (ms)':>14} {'indexed (ms)':>13}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            app = build_app(os.path.join(directory, 'bench.db'))
+            with app.app_context():
+                # Start from the pre-index schema, as an existing database would
+                for table in db.metadata.tables.values():
+                    table.indexes, saved = set(), table.indexes
+                    table.info['saved_indexes'] = saved
+                db.create_all()
+                for table in db.metadata.tables.values():
+                    table.indexes = table.info.pop('saved_indexes')
+
+                populate(rows, args.users)
+                before = time_queries(args.users, args.samples)
+                ensure_indexes(db.engine)
+                after = time_queries(args.users, args.samples)
+                db.session.remove()
+                db.engine.dispose()
+
+        for name in before:
+            print(f"{rows:>10} {name:<22} {before[name]:>14.3f} {after[name]:>13.3f}")
+
+if __name__ == '__main__':
+    main()
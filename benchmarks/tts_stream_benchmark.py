@@ -0,0 +1,145 @@
+"""Time to first audio: buffered text_to_speech vs sentence-pipelined streaming
+
+Starts a local stand-in for the ElevenLabs text-to-speech API and points
+VoiceService at it through ELEVENLABS_BASE_URL. The fake server waits
+``--first-byte-ms`` before answering, then produces audio at a fixed rate
+per character of text, sent in chunks on the /stream endpoint and as one
+body otherwise; both endpoints return the same bytes for the same text.
+Each run uses a fresh audio cache, so every request goes upstream.
+
+    python benchmarks/tts_stream_benchmark.py --runs 5
+
+The fake server can also be run on its own for manual testing:
+
+    python benchmarks/tts_stream_benchmark.py --serve --port 8765
+    ELEVENLABS_BASE_URL=http://127.0.0.1:8765/v1 ELEVENLABS_API_KEY=fake python app.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPLY = (
+    "I can hear how much you've been carrying lately, and I'm really glad you reached out. "
+    "It makes sense that you feel exhausted after weeks of pushing through on your own. "
+    "Would it help to slow down together for a moment and take one deep breath? "
+    "There's no right way to feel about this, and you don't have to sort it all out tonight. "
+    "What's one small thing that usually helps you feel a little more grounded? "
+    "I'm here, and we can take this one step at a time."
+)
+
+class FakeTTSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    first_byte = 0.4      # seconds before any audio
+    per_char = 0.004      # seconds of synthesis per character
+    chunk_bytes = 2048
+    bytes_per_char = 160  # ~128 kbps MP3 for typical speech rates
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        text = json.loads(self.rfile.read(length) or b'{}').get('text', '')
+        if '/text-to-speech/' not in self.path:
+            self.send_error(404)
+            return
+        audio = self.fake_audio(text)
+        duration = len(text) * self.per_char
+        time.sleep(self.first_byte)
+        if self.path.endswith('/stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'audio/mpeg')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            chunks = range(0, len(audio), self.chunk_bytes)
+            for offset in chunks:
+                time.sleep(duration / len(chunks))
+                payload = audio[offset:offset + self.chunk_bytes]
+                self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            time.sleep(duration)
+            self.send_response(200)
+            self.send_header('Content-Type', 'audio/mpeg')
+            self.send_header('Content-Length', str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+
+    @classmethod
+    def fake_audio(cls, text: str) -> bytes:
+        """Stand-in clip for ``text``: the text repeated out to the target size"""
+        seed = text.encode('utf-8') or b'\xff'
+        size = max(1, len(text)) * cls.bytes_per_char
+        return (seed * (size // len(seed) + 1))[:size]
+
+def start_server(port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeTTSHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def measure(service, mode: str, text: str):
+    started = time.perf_counter()
+    first = None
+    size = 0
+    if mode == 'buffered':
+        audio = service.text_to_speech(text) or b''
+        first = time.perf_counter()
+        size = len(audio)
+    else:
+        for chunk in service.stream_speech(text):
+            if first is None:
+                first = time.perf_counter()
+            size += len(chunk)
+    finished = time.perf_counter()
+    return (first - started) * 1000, (finished - started) * 1000, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--first-byte-ms', type=float, default=400)
+    parser.add_argument('--ms-per-char', type=float, default=4)
+    parser.add_argument('--serve', action='store_true', help='Only run the fake TTS server')
+    parser.add_argument('--port', type=int, default=0)
+    args = parser.parse_args()
+
+    FakeTTSHandler.first_byte = args.first_byte_ms / 1000
+    FakeTTSHandler.per_char = args.ms_per_char / 1000
+    server = start_server(args.port)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    if args.serve:
+        print(f"Fake TTS API listening on {base_url}")
+        threading.Event().wait()
+
+    os.environ['ELEVENLABS_BASE_URL'] = base_url
+    os.environ.setdefault('ELEVENLABS_API_KEY', 'fake')
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['AUDIO_CACHE_DIR'] = directory
+        os.environ['VOICE_PACK_PATH'] = os.path.join(directory, 'no-pack.vpk')
+        from audio_cache import AudioCache
+        from voice_service import VoiceService
+        service = VoiceService()
+        print(f"{len(REPLY)} characters, {args.runs} runs per mode")
+        print(f"{'mode':<10} {'first audio ms':>15} {'total ms':>10} {'bytes':>8}")
+        for mode in ('buffered', 'streaming'):
+            firsts, totals, size = [], [], 0
+            for run in range(args.runs):
+                # A fresh cache keeps every sentence a miss
+                service.audio_cache = AudioCache(os.path.join(directory, f"{mode}-{run}"))
+                first, total, size = measure(service, mode, REPLY)
+                firsts.append(first)
+                totals.append(total)
+            print(f"{mode:<10} {statistics.median(firsts):>15.0f} {statistics.median(totals):>10.0f} {size:>8}")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
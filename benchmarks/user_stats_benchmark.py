@@ -0,0 +1,98 @@
+"""/user-stats latency: Python row loading vs SQL aggregation vs aggregate table
+
+Fills a scratch SQLite database with one heavy user (conversations,
+activities and mood entries) and times each USER_STATS_MODE, checking
+that all of them produce the same report.
+
+    python benchmarks/user_stats_benchmark.py --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from database.models import db, User, Conversation, Activity, MoodEntry, ensure_indexes
+from database.user_stats import WELLNESS_REPORTS, rebuild_user_stats
+
+BATCH_SIZE = 50000
+EMOTIONS = ['happy', 'sad', 'anxious', 'angry', 'neutral', '', None]
+MESSAGE = "I've been feeling a bit overwhelmed with work lately and can't sleep well. " * 2
+RESPONSE = "It sounds like you're carrying a lot right now. Would you like to try a short breathing exercise together? " * 3
+
+def build_app(path: str) -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+def insert_batched(model, rows: int, make_row):
+    for offset in range(0, rows, BATCH_SIZE):
+        db.session.execute(db.insert(model), [make_row(i) for i in range(offset, min(rows, offset + BATCH_SIZE))])
+
+def populate(rows: int):
+    """One user with ``rows`` conversations and rows/10 activities and mood entries"""
+    db.session.execute(db.insert(User), [{
+        'username': 'heavy', 'email': 'heavy@example.com', 'password_hash': 'x',
+        'first_name': 'Heavy', 'last_name': 'User', 'age': 30
+    }])
+    start = datetime(2024, 1, 1)
+    rng = random.Random(42)
+    insert_batched(Conversation, rows, lambda i: {
+        'user_id': 1, 'message': MESSAGE, 'response': RESPONSE,
+        'emotion_detected': rng.choice(EMOTIONS), 'sentiment_score': 'neutral', 'crisis_level': 'none',
+        'timestamp': start + timedelta(seconds=i)
+    })
+    insert_batched(Activity, rows // 10, lambda i: {
+        'user_id': 1, 'activity_type': 'breathing', 'activity_data': {}, 'completed_at': start + timedelta(seconds=i)
+    })
+    insert_batched(MoodEntry, rows // 10, lambda i: {
+        'user_id': 1, 'mood_score': rng.randint(1, 10), 'timestamp': start + timedelta(seconds=rng.randint(0, rows))
+    })
+    db.session.commit()
+
+def time_mode(mode: str, repeats: int):
+    """Median latency in milliseconds and the report of one stats mode"""
+    latencies = []
+    report = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        report = WELLNESS_REPORTS[mode](1)
+        latencies.append((time.perf_counter() - started) * 1000)
+        db.session.expunge_all()
+    latencies.sort()
+    return latencies[len(latencies) // 2], report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'mode':<10} {'median (ms)':>12}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            app = build_app(os.path.join(directory, 'bench.db'))
+            with app.app_context():
+                db.create_all()
+                ensure_indexes(db.engine)
+                populate(rows)
+                rebuild_user_stats()
+
+                reports = {}
+                for mode in WELLNESS_REPORTS:
+                    latency, reports[mode] = time_mode(mode, args.repeats)
+                    print(f"{rows:>10} {mode:<10} {latency:>12.2f}")
+                if any(report != reports['python'] for report in reports.values()):
+                    print(f"⚠️ Reports differ at {rows} rows: {reports}")
+                db.session.remove()
+                db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
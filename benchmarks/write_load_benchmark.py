@@ -0,0 +1,113 @@
+"""Concurrent /chat-style write throughput per SQLite storage profile
+
+Each worker thread repeatedly does what a /chat request does against the
+database: look up the user, insert a Conversation and commit. It runs
+once per storage profile on a fresh database file and reports commits per
+second, lock errors and commit latency percentiles.
+
+    python benchmarks/write_load_benchmark.py --threads 16 --seconds 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+from database.models import db, User, Conversation, ensure_indexes
+from database.storage import SQLITE_PROFILES, configure_storage, install_pragmas
+
+RESPONSE = "It sounds like you're carrying a lot right now. Would you like to try a short breathing exercise together? " * 3
+
+def build_app(path: str, profile: str) -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    storage = configure_storage(app, profile)
+    db.init_app(app)
+    with app.app_context():
+        install_pragmas(db.engine, storage['pragmas'])
+    return app
+
+def worker(app: Flask, users: int, deadline: float, results: dict, lock: threading.Lock):
+    committed = 0
+    errors = 0
+    latencies = []
+    with app.app_context():
+        index = 0
+        while time.perf_counter() < deadline:
+            index += 1
+            started = time.perf_counter()
+            try:
+                user = User.query.filter_by(username=f"user{index % users}").first()
+                db.session.add(Conversation(
+                    user_id=user.id, message='hello', response=RESPONSE,
+                    emotion_detected='neutral', sentiment_score='neutral', crisis_level='none'
+                ))
+                db.session.commit()
+                committed += 1
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+        db.session.remove()
+    with lock:
+        results['committed'] += committed
+        results['errors'] += errors
+        results['latencies'].extend(latencies)
+
+def run(profile: str, threads: int, seconds: float, users: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        app = build_app(os.path.join(directory, 'load.db'), profile)
+        with app.app_context():
+            db.create_all()
+            ensure_indexes(db.engine)
+            db.session.execute(db.insert(User), [
+                {
+                    'username': f"user{i}", 'email': f"user{i}@example.com", 'password_hash': 'x',
+                    'first_name': 'Load', 'last_name': 'Test', 'age': 30
+                }
+                for i in range(users)
+            ])
+            db.session.commit()
+
+        results = {'committed': 0, 'errors': 0, 'latencies': []}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+        pool = [threading.Thread(target=worker, args=(app, users, deadline, results, lock)) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        with app.app_context():
+            db.engine.dispose()
+
+    latencies = sorted(results['latencies'])
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float('nan')
+    return {
+        'commits_per_second': results['committed'] / seconds,
+        'errors': results['errors'],
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--profiles', nargs='+', default=list(SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'commits/s':>10} {'lock errors':>12} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for profile in args.profiles:
+        result = run(profile, args.threads, args.seconds, args.users)
+        print(f"{profile:<12} {result['commits_per_second']:>10.1f} {result['errors']:>12} "
+              f"{result['p50_ms']:>10.2f} {result['p99_ms']:>10.2f}")
+
+if __name__ == '__main__':
+    main()
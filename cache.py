@@ -0,0 +1,233 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, clock=time.monotonic):
+        """Thread-safe in-memory cache with LRU eviction and an optional per-entry TTL
+
+        Once ``maxsize`` entries are stored, setting a new key evicts the
+        least recently used one. Entries older than ``ttl`` seconds are
+        treated as missing and dropped on access.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key, default=None):
+        """Return the cached value (marking it recently used) or default"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def peek(self, key, default=None):
+        """Return a live cached value without touching LRU order or counters"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[0] is not None and entry[0] <= self._clock()):
+                return default
+            return entry[1]
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entries past maxsize"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def delete(self, key) -> bool:
+        """Remove a key; returns whether it was present"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[0] is None or entry[0] > self._clock())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                'backend': 'memory',
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hit_rate': round(self._counters['hits'] / lookups, 3) if lookups else None,
+                **self._counters
+            }
+
+class SQLiteCache:
+    # Evict in batches rather than after every write
+    EVICTION_CHECK_INTERVAL = 100
+
+    def __init__(self, path: str, maxsize: int = 10000, ttl: Optional[float] = None, namespace: str = 'default'):
+        """Cache shared across worker processes through a local SQLite file
+
+        Same interface as TTLCache. Values must be JSON-serializable. LRU
+        order is tracked with a last-access timestamp; eviction trims the
+        namespace back to ``maxsize`` every EVICTION_CHECK_INTERVAL writes.
+        Counters are per process.
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.namespace = namespace
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entries_access ON cache_entries (namespace, last_access)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """One autocommit connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def get(self, key, default=None):
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            'SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+            (self.namespace, str(key))
+        ).fetchone()
+        if row is None:
+            self._count('misses')
+            return default
+        value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (self.namespace, str(key)))
+            self._count('expirations')
+            self._count('misses')
+            return default
+        conn.execute(
+            'UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?',
+            (now, self.namespace, str(key))
+        )
+        self._count('hits')
+        return json.loads(value)
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, last_access) VALUES (?, ?, ?, ?, ?)',
+            (self.namespace, str(key), json.dumps(value), now + ttl if ttl is not None else None, now)
+        )
+        with self._lock:
+            self._writes += 1
+            check_eviction = self._writes % self.EVICTION_CHECK_INTERVAL == 0
+        if check_eviction:
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then the least recently used ones past maxsize"""
+        expired = conn.execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?',
+            (self.namespace, now)
+        ).rowcount
+        evicted = conn.execute('''
+            DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                SELECT key FROM cache_entries WHERE namespace = ?
+                ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.namespace, self.namespace, self.maxsize)).rowcount
+        self._count('expirations', max(expired, 0))
+        self._count('evictions', max(evicted, 0))
+
+    def delete(self, key) -> bool:
+        cursor = self._connection().execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (self.namespace, str(key))
+        )
+        return cursor.rowcount > 0
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries WHERE namespace = ?', (self.namespace,))
+
+    def __contains__(self, key) -> bool:
+        row = self._connection().execute(
+            'SELECT expires_at FROM cache_entries WHERE namespace = ? AND key = ?', (self.namespace, str(key))
+        ).fetchone()
+        return row is not None and (row[0] is None or row[0] > time.time())
+
+    def __len__(self) -> int:
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM cache_entries WHERE namespace = ?', (self.namespace,)
+        ).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'size': len(self),
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl,
+            'hit_rate': round(counters['hits'] / lookups, 3) if lookups else None,
+            **counters
+        }
+
+def create_cache(url: Optional[str] = None, maxsize: int = 1024, ttl: Optional[float] = None, namespace: str = 'default'):
+    """Build a cache from a URL: empty or 'memory://' for TTLCache, 'sqlite:///path' for SQLiteCache"""
+    if not url or url.startswith('memory://'):
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    if url.startswith('sqlite:///'):
+        return SQLiteCache(url[len('sqlite:///'):], maxsize=maxsize, ttl=ttl, namespace=namespace)
+    raise ValueError(f"Unsupported cache URL: {url}")
@@ -0,0 +1,109 @@
+import threading
+from typing import Callable, Dict
+from sqlalchemy import event
+from cache import TTLCache
+from database.models import User, Conversation, MoodEntry, UserPreferences
+
+_PENDING_KEY = 'user_memory_cache_pending'
+
+class UserMemoryCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        """Per-user cache of the persistent memory a chat turn needs
+
+        Entries hold the profile, preferences, last mood and last
+        conversation. Committed writes keep them current: new conversations
+        and mood entries are written through into the cached entry, and any
+        other change to those tables (or to the user) invalidates it. The
+        TTL bounds staleness from writes made outside the ORM session.
+        """
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        # user_id -> token of the load in progress; any change for that user
+        # drops the token so a load racing a commit can't store stale data
+        self._loading = {}
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0, 'write_throughs': 0, 'stale_loads_discarded': 0}
+
+    def get(self, user_id: int, loader: Callable[[], Dict]) -> Dict:
+        """Cached memory for a user, calling ``loader`` on a miss"""
+        memory = self._entries.get(user_id)
+        with self._lock:
+            if memory is not None:
+                self._counters['hits'] += 1
+                return dict(memory)
+            self._counters['misses'] += 1
+            token = self._loading[user_id] = object()
+        memory = loader()
+        with self._lock:
+            if self._loading.get(user_id) is token:
+                del self._loading[user_id]
+                self._entries.set(user_id, memory)
+            else:
+                self._counters['stale_loads_discarded'] += 1
+        return dict(memory)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._loading.pop(user_id, None)
+            self._counters['invalidations'] += 1
+            self._entries.delete(user_id)
+
+    def write_through(self, user_id: int, field: str, row: Dict):
+        """Replace ``last_mood`` / ``last_conversation`` if the new row is at least as recent"""
+        with self._lock:
+            self._loading.pop(user_id, None)
+            self._counters['write_throughs'] += 1
+            memory = self._entries.peek(user_id)
+            if memory is None:
+                return
+            current = memory.get(field) or {}
+            if (row.get('timestamp') or '') >= (current.get('timestamp') or ''):
+                memory = dict(memory, **{field: row})
+                self._entries.set(user_id, memory)
+
+    def stats(self) -> Dict:
+        """Hit rate and size of the cache plus invalidation counters"""
+        with self._lock:
+            counters = dict(self._counters)
+        entries = self._entries.stats()
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'size': entries['size'],
+            'maxsize': entries['maxsize'],
+            'ttl_seconds': entries['ttl_seconds'],
+            'evictions': entries['evictions'],
+            'expirations': entries['expirations'],
+            'hit_rate': round(counters['hits'] / lookups, 3) if lookups else None,
+            **counters
+        }
+
+    def register(self, session):
+        """Track commits on ``session`` (e.g. ``db.session``) to keep entries current"""
+        event.listen(session, 'after_flush', self._after_flush)
+        event.listen(session, 'after_commit', self._after_commit)
+        event.listen(session, 'after_soft_rollback', self._after_rollback)
+
+    def _after_flush(self, session, flush_context):
+        # Changes only apply once the transaction commits
+        pending = session.info.setdefault(_PENDING_KEY, [])
+        for obj in session.new:
+            if isinstance(obj, Conversation):
+                pending.append(('write', obj.user_id, 'last_conversation', obj.to_dict()))
+            elif isinstance(obj, MoodEntry):
+                pending.append(('write', obj.user_id, 'last_mood', obj.to_dict()))
+            elif isinstance(obj, UserPreferences):
+                pending.append(('invalidate', obj.user_id))
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, User):
+                pending.append(('invalidate', obj.id))
+            elif isinstance(obj, (Conversation, MoodEntry, UserPreferences)):
+                pending.append(('invalidate', obj.user_id))
+
+    def _after_commit(self, session):
+        for change in session.info.pop(_PENDING_KEY, []):
+            if change[0] == 'write':
+                self.write_through(*change[1:])
+            else:
+                self.invalidate(change[1])
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop(_PENDING_KEY, None)
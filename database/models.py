@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
 from datetime import datetime
-import bcrypt
+from database.password_hasher import hash_password, verify_password
 
 db = SQLAlchemy()
 
@@ -18,17 +20,25 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    # Tokens carry the version they were issued at; bumping it revokes them all
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     conversations = db.relationship('Conversation', backref='user', lazy=True)
     activities = db.relationship('Activity', backref='user', lazy=True)
     mood_entries = db.relationship('MoodEntry', backref='user', lazy=True)
     
-    def set_password(self, password):
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    def set_password(self, password, hasher=None):
+        """Hash with ``hasher`` (the app's PasswordHasher pool), or inline without one"""
+        if hasher is not None:
+            self.password_hash = hasher.hash(password)
+        else:
+            self.password_hash = hash_password(password)
     
-    def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+    def check_password(self, password, hasher=None):
+        if hasher is not None:
+            return hasher.verify(password, self.password_hash)
+        return verify_password(password, self.password_hash)
     
     def to_dict(self):
         return {
@@ -46,6 +56,10 @@ class User(db.Model):
 
 class Conversation(db.Model):
     __tablename__ = 'conversations'
+    __table_args__ = (
+        # Latest conversation and history lookups per user
+        db.Index('ix_conversations_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -70,6 +84,9 @@ class Conversation(db.Model):
 
 class Activity(db.Model):
     __tablename__ = 'activities'
+    __table_args__ = (
+        db.Index('ix_activities_user_completed_at', 'user_id', 'completed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -88,6 +105,10 @@ class Activity(db.Model):
 
 class MoodEntry(db.Model):
     __tablename__ = 'mood_entries'
+    __table_args__ = (
+        # Latest mood lookups per user
+        db.Index('ix_mood_entries_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -106,11 +127,38 @@ class MoodEntry(db.Model):
             'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
 
+class UserStats(db.Model):
+    """Running per-user aggregates behind /user-stats, maintained on insert"""
+    __tablename__ = 'user_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    conversation_count = db.Column(db.Integer, nullable=False, default=0)
+    activity_count = db.Column(db.Integer, nullable=False, default=0)
+    mood_sum = db.Column(db.Integer, nullable=False, default=0)
+    mood_count = db.Column(db.Integer, nullable=False, default=0)
+    emotions_count = db.Column(db.JSON, nullable=False, default=dict)  # emotion -> count, in first-seen order
+    recent_moods = db.Column(db.JSON, nullable=False, default=list)  # [timestamp, id, score], newest first
+    last_activity_id = db.Column(db.Integer)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'conversation_count': self.conversation_count,
+            'activity_count': self.activity_count,
+            'mood_sum': self.mood_sum,
+            'mood_count': self.mood_count,
+            'emotions_count': self.emotions_count,
+            'recent_moods': self.recent_moods,
+            'last_activity_id': self.last_activity_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 class UserPreferences(db.Model):
     __tablename__ = 'user_preferences'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     voice_preference = db.Column(db.String(50), default='bella')
     theme_preference = db.Column(db.String(20), default='light')
     notification_enabled = db.Column(db.Boolean, default=True)
@@ -150,4 +198,60 @@ class Contact(db.Model):
             'message': self.message,
             'status': self.status,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        } 
\ No newline at end of file
+        }
+
+class RevokedToken(db.Model):
+    """Token ids revoked by logout, kept until the token would have expired anyway"""
+    __tablename__ = 'revoked_tokens'
+    
+    jti = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def ensure_columns(engine):
+    """Add model columns missing from existing tables
+
+    Like ``ensure_indexes``, for databases created before a column was
+    declared. Only columns that are nullable or have a server default can
+    be added this way. Returns the added columns as 'table.column'.
+    """
+    added = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns or not (column.nullable or column.server_default is not None):
+                    continue
+                definition = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {definition}")
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+def ensure_indexes(engine):
+    """Create any model indexes missing from an existing database
+
+    ``db.create_all()`` skips tables that already exist, so databases created
+    before an index was declared never get it. Returns the names of the
+    indexes that were created.
+    """
+    created = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=connection, checkfirst=True)
+                    created.append(index.name)
+        if created and engine.dialect.name == 'sqlite':
+            # Refresh planner statistics so the new indexes get used
+            connection.exec_driver_sql('ANALYZE')
+    return created
@@ -0,0 +1,180 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+import bcrypt
+
+DEFAULT_ROUNDS = 12
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when the hashing queue stays full; callers should answer 503"""
+
+def hash_password(password: str, rounds: int = DEFAULT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def verify_password(password: str, password_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+def hash_rounds(password_hash: str) -> Optional[int]:
+    """Work factor of a bcrypt hash ('$2b$12$...' -> 12), None if unrecognised"""
+    parts = password_hash.split('$')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+def _lower_priority(niceness: int):
+    # Hashing yields the CPU to request threads when both want it
+    if niceness and hasattr(os, 'nice'):
+        try:
+            os.nice(niceness)
+        except OSError:
+            pass
+
+def _run_timed(func, *args):
+    """Worker-side wrapper reporting when the job actually started"""
+    started = time.monotonic()
+    return func(*args), started, time.monotonic()
+
+class PasswordHasher:
+    def __init__(self, rounds: int = DEFAULT_ROUNDS, workers: int = 1, max_pending: int = 32,
+                 queue_timeout: float = 5.0, niceness: int = 10, start_method: Optional[str] = None):
+        """bcrypt hashing and verification off the request threads
+
+        Jobs run in a dedicated process pool of ``workers`` processes, so
+        a login burst uses at most that many cores (at lowered priority)
+        and never holds the GIL the request threads need. At most
+        ``max_pending`` jobs may be queued or running; a caller that can't
+        get a slot within ``queue_timeout`` seconds gets
+        ``PasswordHasherBusy`` instead of piling onto the queue.
+
+        ``workers=0`` hashes inline in the calling thread (the old
+        behaviour). New hashes use ``rounds``; ``needs_rehash`` reports
+        stored hashes made with a different work factor.
+        """
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.niceness = niceness
+        if start_method is None and workers:
+            # Never fork the threaded app: a child can inherit locks held by
+            # other threads. The forkserver forks from a clean, single-threaded
+            # helper instead, and spawn works everywhere. (Workers import the
+            # main module once at startup, so it must be import-safe.)
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._owner_pid = None
+        self._counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'in_flight': 0,
+            'max_in_flight': 0,
+            'queue_wait_ms_total': 0.0,
+            'queue_wait_ms_max': 0.0,
+            'hash_ms_total': 0.0,
+            'rehashes': 0
+        }
+        atexit.register(self.close)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # One pool per process: a preforked server worker builds its own
+        if self._executor is None or self._owner_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._owner_pid != os.getpid():
+                    context = multiprocessing.get_context(self.start_method)
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=context,
+                        initializer=_lower_priority,
+                        initargs=(self.niceness,)
+                    )
+                    self._owner_pid = os.getpid()
+        return self._executor
+
+    def _discard(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is not pool:
+                return
+            self._executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _call(self, func, *args):
+        queued = time.monotonic()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise PasswordHasherBusy(f"Password hashing queue full ({self.max_pending} pending)")
+        with self._lock:
+            self._counters['submitted'] += 1
+            self._counters['in_flight'] += 1
+            self._counters['max_in_flight'] = max(self._counters['max_in_flight'], self._counters['in_flight'])
+        started = finished = None
+        try:
+            if self.workers:
+                pool = self._pool()
+                try:
+                    result, started, finished = pool.submit(_run_timed, func, *args).result()
+                except BrokenProcessPool:
+                    # A worker died; drop the pool so the next call builds a new one
+                    self._discard(pool)
+                    raise
+            else:
+                result, started, finished = _run_timed(func, *args)
+            return result
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._counters['in_flight'] -= 1
+                if started is None:
+                    self._counters['failed'] += 1
+                else:
+                    wait_ms = max(0.0, (started - queued) * 1000)
+                    self._counters['completed'] += 1
+                    self._counters['queue_wait_ms_total'] += wait_ms
+                    self._counters['queue_wait_ms_max'] = max(self._counters['queue_wait_ms_max'], wait_ms)
+                    self._counters['hash_ms_total'] += (finished - started) * 1000
+
+    def hash(self, password: str) -> str:
+        return self._call(hash_password, password, self.rounds)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return self._call(verify_password, password, password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return hash_rounds(password_hash) != self.rounds
+
+    def record_rehash(self):
+        with self._lock:
+            self._counters['rehashes'] += 1
+
+    def close(self):
+        if self._executor is not None and self._owner_pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def stats(self) -> Dict:
+        """Queue depth, rejections and average wait/hash times for health reporting"""
+        with self._lock:
+            counters = dict(self._counters)
+        completed = counters['completed']
+        wait_total = counters.pop('queue_wait_ms_total')
+        hash_total = counters.pop('hash_ms_total')
+        return {
+            'rounds': self.rounds,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            **counters,
+            'queue_wait_ms_max': round(counters['queue_wait_ms_max'], 2),
+            'queue_wait_ms_avg': round(wait_total / completed, 2) if completed else None,
+            'hash_ms_avg': round(hash_total / completed, 2) if completed else None
+        }
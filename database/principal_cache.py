@@ -0,0 +1,115 @@
+import threading
+from typing import Callable, Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from cache import TTLCache
+from database.models import User
+
+_PENDING_KEY = 'principal_cache_pending'
+
+class PrincipalCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 10.0):
+        """Short-lived cache of authenticated users, keyed by (user, token id)
+
+        Stores a snapshot of the user's columns, so a cached request builds
+        a detached ``User`` without touching the database. Any committed
+        change to a user (deactivation, password change, profile edits)
+        bumps that user's generation, which retires all their cached
+        entries at once. ``forget`` drops a single token's entry, e.g. on
+        logout.
+
+        Invalidation only reaches this process: other workers keep serving
+        their entries until ``ttl`` runs out, so keep it to seconds and do
+        revocation checks that must be shared in the loader.
+        """
+        self.ttl = ttl
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Generations only need to outlive the entries they guard
+        self._generations = TTLCache(maxsize=maxsize, ttl=ttl * 2)
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0, 'stale_loads_discarded': 0}
+
+    @staticmethod
+    def _snapshot(user: User) -> Dict:
+        return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+    @staticmethod
+    def _materialize(snapshot: Dict) -> User:
+        """Fresh detached User per request, so callers never share an instance"""
+        # Skip the declarative constructor and its per-attribute events:
+        # values land in the instance dict as loaded state
+        user = User.__mapper__.class_manager.new_instance()
+        user.__dict__.update(snapshot)
+        make_transient_to_detached(user)
+        return user
+
+    def get(self, key, loader: Callable[[], Optional[User]]) -> Optional[User]:
+        """Cached user for a (user, token id) key, calling ``loader`` on a miss
+
+        ``key[0]`` must identify the user the same way ``invalidate`` is
+        called (the user id, or the username for tokens without one).
+        """
+        entry = self._entries.get(key)
+        with self._lock:
+            generation = self._generations.peek(key[0], 0)
+            if entry is not None and entry[0] == generation:
+                self._counters['hits'] += 1
+                return self._materialize(entry[1])
+            self._counters['misses'] += 1
+            token = self._loading[key] = object()
+        user = loader()
+        with self._lock:
+            current = self._loading.get(key) is token
+            if current:
+                del self._loading[key]
+            if user is None:
+                return None
+            if current:
+                self._entries.set(key, (generation, self._snapshot(user)))
+            else:
+                self._counters['stale_loads_discarded'] += 1
+        return user
+
+    def invalidate(self, *user_keys):
+        """Retire every cached entry for a user (pass both id and username)"""
+        with self._lock:
+            for user_key in user_keys:
+                self._generations.set(user_key, self._generations.peek(user_key, 0) + 1)
+                for key in [key for key in self._loading if key[0] == user_key]:
+                    del self._loading[key]
+            self._counters['invalidations'] += 1
+
+    def forget(self, key):
+        """Drop one token's cached entry"""
+        self._entries.delete(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'size': len(self._entries),
+            'ttl_seconds': self.ttl,
+            'hit_rate': round(counters['hits'] / lookups, 3) if lookups else None,
+            **counters
+        }
+
+    def register(self, session):
+        """Invalidate users whose rows change in committed transactions on ``session``"""
+        event.listen(session, 'after_flush', self._after_flush)
+        event.listen(session, 'after_commit', self._after_commit)
+        event.listen(session, 'after_soft_rollback', self._after_rollback)
+
+    def _after_flush(self, session, flush_context):
+        pending = session.info.setdefault(_PENDING_KEY, set())
+        for obj in list(session.dirty) + list(session.deleted):
+            if isinstance(obj, User):
+                pending.add((obj.id, obj.username))
+
+    def _after_commit(self, session):
+        for user_id, username in session.info.pop(_PENDING_KEY, ()):
+            self.invalidate(user_id, username)
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,157 @@
+import os
+from typing import Dict
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+# Storage profiles for file-backed SQLite. 'default' leaves SQLAlchemy and
+# SQLite settings untouched; 'production' (opt in with DB_STORAGE_PROFILE)
+# suits a multi-threaded WSGI server with concurrent writers.
+SQLITE_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'engine_options': {}
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',         # readers no longer block the writer
+            'synchronous': 'NORMAL',       # fsync at checkpoints only; safe with WAL
+            'busy_timeout': 5000,          # ms to wait for the write lock before "database is locked"
+            'mmap_size': 268435456,        # 256 MB of the file memory-mapped for reads
+            'cache_size': -65536,          # 64 MB page cache per connection (negative = KiB)
+            'temp_store': 'MEMORY'
+        },
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30,
+            'connect_args': {'check_same_thread': False, 'timeout': 5}
+        }
+    }
+}
+
+# Per-pragma overrides, e.g. SQLITE_BUSY_TIMEOUT=10000
+PRAGMA_ENV_OVERRIDES = {
+    'journal_mode': 'SQLITE_JOURNAL_MODE',
+    'synchronous': 'SQLITE_SYNCHRONOUS',
+    'busy_timeout': 'SQLITE_BUSY_TIMEOUT',
+    'mmap_size': 'SQLITE_MMAP_SIZE',
+    'cache_size': 'SQLITE_CACHE_SIZE'
+}
+
+DEFAULT_DATABASE_URI = 'sqlite:///mental_health_buddy.db'
+
+# Pool settings for server databases (PostgreSQL etc.), overridable from env
+SERVER_ENGINE_OPTIONS = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30,
+    'pool_pre_ping': True,   # drop connections the server closed while idle
+    'pool_recycle': 1800
+}
+
+POOL_ENV_OPTIONS = {
+    'pool_size': ('DB_POOL_SIZE', int),
+    'max_overflow': ('DB_MAX_OVERFLOW', int),
+    'pool_timeout': ('DB_POOL_TIMEOUT', float),
+    'pool_pre_ping': ('DB_POOL_PRE_PING', lambda value: value.lower() in ('1', 'true', 'yes', 'on')),
+    'pool_recycle': ('DB_POOL_RECYCLE', int)
+}
+
+def database_uri() -> str:
+    """Database URI from DATABASE_URL or SQLALCHEMY_DATABASE_URI, defaulting to the local SQLite file"""
+    uri = os.getenv('DATABASE_URL') or os.getenv('SQLALCHEMY_DATABASE_URI') or DEFAULT_DATABASE_URI
+    # Hosted Postgres URLs often use the scheme SQLAlchemy no longer accepts
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+def backend_label(uri: str) -> str:
+    """Human-readable database backend for startup logs and /health"""
+    backend = make_url(uri).get_backend_name()
+    return {'sqlite': 'SQLite', 'postgresql': 'PostgreSQL', 'mysql': 'MySQL'}.get(backend, backend)
+
+def pool_options_from_env() -> Dict:
+    """Engine pool options set through DB_POOL_* / DB_MAX_OVERFLOW"""
+    options = {}
+    for option, (env_var, parse) in POOL_ENV_OPTIONS.items():
+        if os.getenv(env_var):
+            options[option] = parse(os.getenv(env_var))
+    return options
+
+def is_sqlite_file(uri: str) -> bool:
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+def storage_profile(name: str = None) -> Dict:
+    """Resolve a SQLite storage profile (DB_STORAGE_PROFILE by default) with env overrides"""
+    name = name or os.getenv('DB_STORAGE_PROFILE', 'default')
+    if name not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown DB_STORAGE_PROFILE: {name}")
+    profile = SQLITE_PROFILES[name]
+    pragmas = dict(profile['pragmas'])
+    for pragma, env_var in PRAGMA_ENV_OVERRIDES.items():
+        if os.getenv(env_var):
+            pragmas[pragma] = os.getenv(env_var)
+    return {
+        'name': name,
+        'pragmas': pragmas,
+        'engine_options': dict(profile['engine_options'])
+    }
+
+def engine_options(uri: str, profile_name: str = None) -> Dict:
+    """Resolve the storage profile and pool options for a database URI
+
+    File-backed SQLite gets its storage profile and server databases get
+    SERVER_ENGINE_OPTIONS, both with DB_POOL_* overrides applied.
+    In-memory SQLite keeps SQLAlchemy's single-connection defaults.
+    """
+    if make_url(uri).get_backend_name() == 'sqlite':
+        if not is_sqlite_file(uri):
+            return {'name': 'default', 'pragmas': {}, 'engine_options': {}}
+        profile = storage_profile(profile_name)
+    else:
+        profile = {'name': 'server', 'pragmas': {}, 'engine_options': dict(SERVER_ENGINE_OPTIONS)}
+    profile['engine_options'].update(pool_options_from_env())
+    return profile
+
+def configure_storage(app, profile_name: str = None) -> Dict:
+    """Apply storage and pool options to the app's engine options; call before db.init_app
+
+    Returns the resolved profile; pass its pragmas to ``install_pragmas``
+    once the engine exists. Options already in SQLALCHEMY_ENGINE_OPTIONS win.
+    """
+    profile = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], profile_name)
+    options = dict(profile['engine_options'])
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    return profile
+
+def create_configured_engine(uri: str, profile_name: str = None):
+    """Standalone engine with the same storage profile, pool options and pragmas as the app"""
+    profile = engine_options(uri, profile_name)
+    engine = create_engine(uri, **profile['engine_options'])
+    install_pragmas(engine, profile['pragmas'])
+    return engine
+
+def install_pragmas(engine, pragmas: Dict):
+    """Run the profile's PRAGMA statements on every new connection of a SQLite engine"""
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
+
+def describe_storage(engine) -> Dict:
+    """Effective SQLite pragmas and pool status, for health reporting"""
+    info = {'dialect': engine.dialect.name, 'pool': engine.pool.status()}
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            for pragma in PRAGMA_ENV_OVERRIDES:
+                info[pragma] = connection.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+    return info
@@ -1,132 +1,177 @@
-import sqlite3
-import json
-from datetime import datetime
 import os
+from flask import has_app_context
+from sqlalchemy import (
+    Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text,
+    bindparam, func, insert, select, update
+)
+from database.models import db
+from database.storage import create_configured_engine
+
+DEFAULT_DB_PATH = 'database/user_data.db'
 
 class UserMemory:
-    def __init__(self, db_path='database/user_data.db'):
+    def __init__(self, db_path=None, engine=None, table_prefix=None):
+        """Conversation memory store on a pooled SQLAlchemy engine
+
+        By default it shares the app's pooled ``db.engine`` (whatever
+        backend DATABASE_URL points at); that needs an active app context.
+        Pass ``engine`` to use another engine. In both cases tables are
+        prefixed with ``memory_`` so they don't collide with the app's own
+        users/conversations tables.
+
+        Given a ``db_path`` (or used outside an app context) it keeps its
+        own SQLite file instead, defaulting to database/user_data.db, with
+        the original unprefixed table names so existing files keep working.
+
+        Connections come from the engine's pool and every statement is built
+        once up front, so each call is a pool checkout plus a cached
+        compiled statement.
+        """
+        if engine is None and db_path is None and has_app_context():
+            engine = db.engine
+        if engine is None:
+            db_path = db_path or DEFAULT_DB_PATH
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            engine = create_configured_engine(f"sqlite:///{db_path}")
+            prefix = '' if table_prefix is None else table_prefix
+        else:
+            prefix = 'memory_' if table_prefix is None else table_prefix
         self.db_path = db_path
+        self.engine = engine
+        self.table_prefix = prefix
         self.init_database()
-    
+
     def init_database(self):
         """Create database tables if they don't exist"""
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create conversations table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                message TEXT,
-                response TEXT,
-                emotion_detected TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Create user preferences table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_preferences (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                preference_type TEXT,
-                preference_value TEXT,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
+        self.metadata = MetaData()
+        prefix = self.table_prefix
+
+        self.users = Table(
+            f"{prefix}users", self.metadata,
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('username', String(255), unique=True),
+            Column('created_at', DateTime, server_default=func.current_timestamp())
+        )
+
+        self.conversations = Table(
+            f"{prefix}conversations", self.metadata,
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('user_id', Integer, ForeignKey(f"{prefix}users.id"), index=True),
+            Column('message', Text),
+            Column('response', Text),
+            Column('emotion_detected', String(50)),
+            Column('timestamp', DateTime, server_default=func.current_timestamp())
+        )
+
+        self.user_preferences = Table(
+            f"{prefix}user_preferences", self.metadata,
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('user_id', Integer, ForeignKey(f"{prefix}users.id"), index=True),
+            Column('preference_type', String(100)),
+            Column('preference_value', Text)
+        )
+
+        self.metadata.create_all(self.engine)
+        self._prepare_statements()
+
+    def _prepare_statements(self):
+        """Build the statements once; SQLAlchemy reuses their compiled form"""
+        users, conversations, preferences = self.users, self.conversations, self.user_preferences
+
+        self._select_user_id = select(users.c.id).where(users.c.username == bindparam('username'))
+        self._insert_user = insert(users).values(username=bindparam('username'))
+        self._insert_conversation = insert(conversations).values(
+            user_id=bindparam('user_id'),
+            message=bindparam('message'),
+            response=bindparam('response'),
+            emotion_detected=bindparam('emotion')
+        )
+        self._select_history = (
+            select(conversations.c.message, conversations.c.response,
+                   conversations.c.emotion_detected, conversations.c.timestamp)
+            .where(conversations.c.user_id == bindparam('user_id'))
+            .order_by(conversations.c.timestamp.desc())
+            .limit(bindparam('limit'))
+        )
+        self._update_preference = (
+            update(preferences)
+            .where(preferences.c.user_id == bindparam('match_user_id'),
+                   preferences.c.preference_type == bindparam('match_type'))
+            .values(preference_value=bindparam('value'))
+        )
+        self._insert_preference = insert(preferences).values(
+            user_id=bindparam('match_user_id'),
+            preference_type=bindparam('match_type'),
+            preference_value=bindparam('value')
+        )
+        self._select_preferences = (
+            select(preferences.c.preference_type, preferences.c.preference_value)
+            .where(preferences.c.user_id == bindparam('user_id'))
+            .order_by(preferences.c.id)
+        )
+
     def get_or_create_user(self, username):
         """Get existing user or create new one"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Try to get existing user
-        cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
-        user = cursor.fetchone()
-        
-        if user:
-            user_id = user[0]
-        else:
-            # Create new user
-            cursor.execute('INSERT INTO users (username) VALUES (?)', (username,))
-            user_id = cursor.lastrowid
-            conn.commit()
-        
-        conn.close()
+        with self.engine.begin() as conn:
+            # Try to get existing user
+            user_id = conn.execute(self._select_user_id, {'username': username}).scalar()
+
+            if user_id is None:
+                # Create new user
+                user_id = conn.execute(self._insert_user, {'username': username}).inserted_primary_key[0]
+
         return user_id
-    
+
     def save_conversation(self, user_id, message, response, emotion):
         """Save conversation to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO conversations (user_id, message, response, emotion_detected)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, message, response, emotion))
-        
-        conn.commit()
-        conn.close()
-    
+        with self.engine.begin() as conn:
+            conn.execute(self._insert_conversation, {
+                'user_id': user_id,
+                'message': message,
+                'response': response,
+                'emotion': emotion
+            })
+
+    def save_conversations_bulk(self, conversations):
+        """Save many conversations in one transaction with a single executemany
+
+        ``conversations`` is an iterable of (user_id, message, response,
+        emotion) tuples. Returns the number of rows written.
+        """
+        rows = [
+            {'user_id': user_id, 'message': message, 'response': response, 'emotion': emotion}
+            for user_id, message, response, emotion in conversations
+        ]
+        if not rows:
+            return 0
+        with self.engine.begin() as conn:
+            conn.execute(self._insert_conversation, rows)
+        return len(rows)
+
     def get_user_history(self, user_id, limit=10):
         """Get recent conversation history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT message, response, emotion_detected, timestamp
-            FROM conversations
-            WHERE user_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (user_id, limit))
-        
-        history = cursor.fetchall()
-        conn.close()
-        return history
-    
+        with self.engine.connect() as conn:
+            rows = conn.execute(self._select_history, {'user_id': user_id, 'limit': limit}).all()
+
+        # Timestamps as the same text the original sqlite3 store returned
+        return [
+            (message, response, emotion, timestamp.isoformat(sep=' ') if timestamp is not None else None)
+            for message, response, emotion, timestamp in rows
+        ]
+
     def save_preference(self, user_id, pref_type, pref_value):
         """Save user preference"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Update if exists, insert if not
-        cursor.execute('''
-            INSERT OR REPLACE INTO user_preferences (user_id, preference_type, preference_value)
-            VALUES (?, ?, ?)
-        ''', (user_id, pref_type, pref_value))
-        
-        conn.commit()
-        conn.close()
-    
+        params = {'match_user_id': user_id, 'match_type': pref_type, 'value': pref_value}
+        with self.engine.begin() as conn:
+            # Update if exists, insert if not
+            if not conn.execute(self._update_preference, params).rowcount:
+                conn.execute(self._insert_preference, params)
+
     def get_preferences(self, user_id):
         """Get all user preferences"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT preference_type, preference_value
-            FROM user_preferences
-            WHERE user_id = ?
-        ''', (user_id,))
-        
-        prefs = dict(cursor.fetchall())
-        conn.close()
-        return prefs
\ No newline at end of file
+        with self.engine.connect() as conn:
+            rows = conn.execute(self._select_preferences, {'user_id': user_id}).all()
+
+        return dict(rows)
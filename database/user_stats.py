@@ -0,0 +1,268 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from database.models import db, User, Conversation, Activity, MoodEntry, UserStats
+
+# Wellness insight: streak of positive moods among the most recent entries
+RECENT_MOOD_WINDOW = 7
+POSITIVE_MOOD_SCORE = 6
+
+def _timestamp_key(timestamp: Optional[datetime]) -> str:
+    return timestamp.isoformat(timespec='microseconds') if timestamp else ''
+
+def _newest_first(entries: List[list]) -> List[list]:
+    """Order [timestamp, id, score] entries by timestamp desc, then id asc, and keep the window"""
+    return sorted(entries, key=lambda entry: (entry[0], -entry[1]), reverse=True)[:RECENT_MOOD_WINDOW]
+
+def compute_user_stats(connection, user_id: int, through: Optional[Tuple[type, int]] = None) -> Dict:
+    """Build a user's aggregates from their rows with SQL aggregates
+
+    Only the columns the aggregates need are read; message and response
+    text never leave the database. ``through=(Model, id)`` leaves out rows
+    of that model inserted after ``id``.
+    """
+    conversations = Conversation.__table__
+    activities = Activity.__table__
+    moods = MoodEntry.__table__
+
+    def owned(table):
+        condition = table.c.user_id == user_id
+        if through is not None and through[0].__table__ is table:
+            condition = condition & (table.c.id <= through[1])
+        return condition
+
+    emotion = func.coalesce(func.nullif(conversations.c.emotion_detected, ''), 'neutral')
+    emotion_rows = connection.execute(
+        select(emotion, func.count())
+        .where(owned(conversations))
+        .group_by(emotion)
+        .order_by(func.min(conversations.c.id))
+    ).all()
+    emotions_count = {name: count for name, count in emotion_rows}
+
+    activity_count, last_activity_id = connection.execute(
+        select(func.count(), func.max(activities.c.id)).where(owned(activities))
+    ).one()
+
+    mood_count, mood_sum = connection.execute(
+        select(func.count(), func.coalesce(func.sum(moods.c.mood_score), 0)).where(owned(moods))
+    ).one()
+    recent_rows = connection.execute(
+        select(moods.c.timestamp, moods.c.id, moods.c.mood_score)
+        .where(owned(moods))
+        .order_by(moods.c.timestamp.desc(), moods.c.id.asc())
+        .limit(RECENT_MOOD_WINDOW)
+    ).all()
+
+    return {
+        'conversation_count': sum(emotions_count.values()),
+        'activity_count': activity_count,
+        'mood_sum': int(mood_sum),
+        'mood_count': mood_count,
+        'emotions_count': emotions_count,
+        'recent_moods': [[_timestamp_key(timestamp), mood_id, score] for timestamp, mood_id, score in recent_rows],
+        'last_activity_id': last_activity_id
+    }
+
+def _store_stats(connection, user_id: int, values: Dict, exists: bool):
+    table = UserStats.__table__
+    values = dict(values, updated_at=datetime.utcnow())
+    if exists:
+        connection.execute(update(table).where(table.c.user_id == user_id).values(**values))
+    else:
+        connection.execute(insert(table).values(user_id=user_id, **values))
+
+# Dialects whose INSERT supports ON CONFLICT DO NOTHING
+_UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def _create_stats(connection, user_id: int, values: Dict) -> bool:
+    """Insert the user's stats row unless one exists; False if another transaction got there first"""
+    table = UserStats.__table__
+    values = dict(values, user_id=user_id, updated_at=datetime.utcnow())
+    dialect_insert = _UPSERT_INSERTS.get(connection.dialect.name)
+    if dialect_insert is None:
+        connection.execute(insert(table).values(**values))
+        return True
+    statement = dialect_insert(table).values(**values).on_conflict_do_nothing(index_elements=[table.c.user_id])
+    return connection.execute(statement).rowcount > 0
+
+def _apply_insert(connection, target, apply):
+    """Fold one inserted row into the user's aggregates inside the same transaction"""
+    user_id = target.user_id
+    table = UserStats.__table__
+    locked_row = select(table).where(table.c.user_id == user_id).with_for_update()
+    row = connection.execute(locked_row).mappings().first()
+    if row is None:
+        # Stats not built yet for this user: start from their rows up to and
+        # including this one. Rows batched into the same INSERT with higher
+        # ids are already stored but still get their own event.
+        values = compute_user_stats(connection, user_id, through=(type(target), target.id))
+        if _create_stats(connection, user_id, values):
+            return
+        # A concurrent first insert created the row (FOR UPDATE had nothing
+        # to lock); it can't see our uncommitted row, so add ours to it
+        row = connection.execute(locked_row).mappings().one()
+    _store_stats(connection, user_id, apply(row), exists=True)
+
+def _conversation_inserted(mapper, connection, target):
+    def apply(row):
+        emotions_count = dict(row['emotions_count'] or {})
+        emotion = target.emotion_detected or 'neutral'
+        emotions_count[emotion] = emotions_count.get(emotion, 0) + 1
+        return {'conversation_count': row['conversation_count'] + 1, 'emotions_count': emotions_count}
+    _apply_insert(connection, target, apply)
+
+def _activity_inserted(mapper, connection, target):
+    def apply(row):
+        return {
+            'activity_count': row['activity_count'] + 1,
+            'last_activity_id': max(row['last_activity_id'] or 0, target.id)
+        }
+    _apply_insert(connection, target, apply)
+
+def _mood_inserted(mapper, connection, target):
+    def apply(row):
+        recent_moods = list(row['recent_moods'] or [])
+        recent_moods.append([_timestamp_key(target.timestamp), target.id, target.mood_score])
+        return {
+            'mood_sum': row['mood_sum'] + target.mood_score,
+            'mood_count': row['mood_count'] + 1,
+            'recent_moods': _newest_first(recent_moods)
+        }
+    _apply_insert(connection, target, apply)
+
+_STATS_LISTENERS = (
+    (Conversation, _conversation_inserted),
+    (Activity, _activity_inserted),
+    (MoodEntry, _mood_inserted)
+)
+
+def register_stats_listeners():
+    """Keep user_stats up to date on every insert (the 'aggregate' stats mode)"""
+    for model, listener in _STATS_LISTENERS:
+        if not event.contains(model, 'after_insert', listener):
+            event.listen(model, 'after_insert', listener)
+
+def rebuild_user_stats(user_id: Optional[int] = None) -> int:
+    """Recompute aggregates from existing rows for one user or everyone; returns users rebuilt"""
+    connection = db.session.connection()
+    if user_id is None:
+        user_ids = [row[0] for row in connection.execute(select(User.__table__.c.id))]
+    else:
+        user_ids = [user_id]
+    table = UserStats.__table__
+    existing = {row[0] for row in connection.execute(select(table.c.user_id))}
+    for uid in user_ids:
+        _store_stats(connection, uid, compute_user_stats(connection, uid), exists=uid in existing)
+    db.session.commit()
+    return len(user_ids)
+
+def load_user_stats(user_id: int) -> UserStats:
+    """Primary-key lookup of a user's aggregates, building them on first use"""
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        rebuild_user_stats(user_id)
+        stats = db.session.get(UserStats, user_id)
+    return stats
+
+def wellness_report(conversation_count: int, activity_count: int, mood_sum: int, mood_count: int,
+                    recent_mood_scores: List[int], emotions_count: Dict[str, int]) -> Dict:
+    """Weighted wellness score and emotion summary from a user's aggregates"""
+    # --- Weighted Wellness Score Calculation ---
+    # Weights: Conversations 20%, Activities 25%, Mood 30%, Insights 25%
+    # All normalized to 0-100, then weighted sum
+    # New users start at 0
+
+    # Conversations (max 20 for full score)
+    convo_score = min(conversation_count, 20) / 20 * 100 if conversation_count > 0 else 0
+
+    # Activities (max 20 for full score)
+    activity_score = min(activity_count, 20) / 20 * 100 if activity_count > 0 else 0
+
+    # Mood Tracking (average mood 1-10, normalized)
+    if mood_count:
+        avg_mood = mood_sum / mood_count
+        mood_score = (avg_mood - 1) / 9 * 100  # 1-10 scale to 0-100
+    else:
+        mood_score = 0
+
+    # Insights: streak of positive/neutral moods in the last 7 entries
+    insight_score = 0
+    if mood_count:
+        last_7 = recent_mood_scores[:RECENT_MOOD_WINDOW]
+        streak = 0
+        for score in last_7:
+            if score >= POSITIVE_MOOD_SCORE:  # 6-10 is positive
+                streak += 1
+            else:
+                break
+        insight_score = streak / 7 * 100 if last_7 else 0
+
+    # Weighted sum
+    wellness_score = (
+        convo_score * 0.20 +
+        activity_score * 0.25 +
+        mood_score * 0.30 +
+        insight_score * 0.25
+    )
+    wellness_score = round(max(0, min(100, wellness_score)))
+
+    return {
+        'total_conversations': conversation_count,
+        'activity_count': activity_count,
+        'emotions_count': emotions_count,
+        'most_common_emotion': max(emotions_count.items(), key=lambda x: x[1])[0] if emotions_count else 'neutral',
+        'wellness_score': wellness_score
+    }
+
+def _report_from_values(values: Dict) -> Dict:
+    report = wellness_report(
+        values['conversation_count'],
+        values['activity_count'],
+        values['mood_sum'],
+        values['mood_count'],
+        [score for _, _, score in values['recent_moods']],
+        dict(values['emotions_count'])
+    )
+    report['last_activity_id'] = values['last_activity_id']
+    return report
+
+def aggregate_wellness_report(user_id: int) -> Dict:
+    """Wellness report from the user_stats aggregate row"""
+    return _report_from_values(load_user_stats(user_id).to_dict())
+
+def sql_wellness_report(user_id: int) -> Dict:
+    """Wellness report computed on demand with GROUP BY / COUNT / SUM / LIMIT queries"""
+    return _report_from_values(compute_user_stats(db.session.connection(), user_id))
+
+def python_wellness_report(user_id: int) -> Dict:
+    """Reference implementation: load the user's rows and aggregate them in Python"""
+    conversations = Conversation.query.filter_by(user_id=user_id).order_by(Conversation.id).all()
+    activities = Activity.query.filter_by(user_id=user_id).order_by(Activity.id).all()
+    mood_entries = MoodEntry.query.filter_by(user_id=user_id).order_by(MoodEntry.id).all()
+
+    emotions_count = {}
+    for conv in conversations:
+        emotion = conv.emotion_detected or 'neutral'
+        emotions_count[emotion] = emotions_count.get(emotion, 0) + 1
+    last_7 = sorted(mood_entries, key=lambda m: m.timestamp, reverse=True)[:RECENT_MOOD_WINDOW]
+
+    report = wellness_report(
+        len(conversations),
+        len(activities),
+        sum(m.mood_score for m in mood_entries),
+        len(mood_entries),
+        [m.mood_score for m in last_7],
+        emotions_count
+    )
+    report['last_activity_id'] = activities[-1].id if activities else None
+    return report
+
+# USER_STATS_MODE values: 'aggregate' reads the user_stats table, 'sql'
+# aggregates on demand without it, 'python' is the row-loading reference
+WELLNESS_REPORTS = {
+    'aggregate': aggregate_wellness_report,
+    'sql': sql_wellness_report,
+    'python': python_wellness_report
+}
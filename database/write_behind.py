@@ -0,0 +1,172 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Dict
+from database.models import db
+
+_STOP = object()
+
+class WriteBehindQueue:
+    def __init__(self, app, max_size: int = 10000, batch_size: int = 200,
+                 flush_interval: float = 0.05, enqueue_timeout: float = 1.0):
+        """Bounded in-process queue of row inserts flushed by a background writer
+
+        Requests enqueue plain column values and return without waiting
+        for the commit. The writer thread commits them in batches of up to
+        ``batch_size`` rows, or whatever arrived within ``flush_interval``
+        seconds, in one transaction per batch. ORM events still fire, since
+        rows are inserted through the session.
+
+        Backpressure: when the queue is full, ``enqueue`` waits up to
+        ``enqueue_timeout`` seconds and then returns False so the caller
+        can write synchronously instead. Queued rows are drained on
+        interpreter exit; rows still queued when the process is killed
+        outright are lost, which is the trade-off for not waiting on disk sync.
+        """
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._counters = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'failed': 0,
+            'rejected': 0,
+            'max_batch': 0,
+            'last_flush_ms': None
+        }
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                    self._thread.start()
+
+    def enqueue(self, model, **values) -> bool:
+        """Queue one row insert; False when the queue stayed full (caller should write directly)"""
+        if self._closed:
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put((model, values), timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._lock:
+                self._counters['rejected'] += 1
+            return False
+        with self._lock:
+            self._counters['enqueued'] += 1
+        return True
+
+    def _next_batch(self, first, stopping: bool):
+        """Collect rows after ``first`` until the batch is full or the flush interval passes
+
+        Returns the batch and whether the stop marker was seen. Once
+        stopping, rows are taken without waiting until the queue is empty.
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if stopping or remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.task_done()
+                stopping = True
+                continue
+            batch.append(item)
+        return batch, stopping
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        with self.app.app_context():
+            try:
+                db.session.add_all([model(**values) for model, values in batch])
+                db.session.commit()
+                written, failed = len(batch), 0
+            except Exception as e:
+                # One bad row shouldn't take the batch down with it: retry row by row
+                db.session.rollback()
+                print(f"⚠️ Write-behind batch of {len(batch)} failed ({e}); retrying rows individually")
+                written, failed = 0, 0
+                for model, values in batch:
+                    try:
+                        db.session.add(model(**values))
+                        db.session.commit()
+                        written += 1
+                    except Exception as row_error:
+                        db.session.rollback()
+                        failed += 1
+                        print(f"❌ Dropped {model.__name__} row: {row_error}")
+            finally:
+                db.session.remove()
+        with self._lock:
+            self._counters['written'] += written
+            self._counters['failed'] += failed
+            self._counters['batches'] += 1
+            self._counters['max_batch'] = max(self._counters['max_batch'], len(batch))
+            self._counters['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+    def _run(self):
+        stopping = False
+        while True:
+            try:
+                item = self._queue.get_nowait() if stopping else self._queue.get()
+            except queue.Empty:
+                return  # Stopped and drained
+            if item is _STOP:
+                self._queue.task_done()
+                stopping = True
+                continue
+            batch, stopping = self._next_batch(item, stopping)
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Block until every row queued so far has been written"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self, timeout: float = 30.0):
+        """Stop accepting rows, drain the queue and stop the writer"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        pending = self._queue.qsize()
+        if pending:
+            print(f"💾 Draining {pending} queued write(s) before exit...")
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass  # Writer isn't keeping up; reported below if it doesn't finish
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"⚠️ Write-behind queue not drained within {timeout:.0f}s; {self._queue.qsize()} row(s) lost")
+
+    def stats(self) -> Dict:
+        """Queue depth and writer counters for health reporting"""
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'capacity': self._queue.maxsize,
+                'batch_size': self.batch_size,
+                'flush_interval_ms': self.flush_interval * 1000,
+                **self._counters
+            }
@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Seconds requested by a Retry-After header (delta or HTTP date), if any"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _percentile_ms(ordered, fraction: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 1)
+
+class HttpClient:
+    def __init__(self, base_url: str, headers: Optional[Dict] = None, pool_size: int = 16,
+                 connect_timeout: float = 3.05, read_timeout: float = 30.0, max_retries: int = 2,
+                 backoff_base: float = 0.25, backoff_max: float = 4.0, name: str = 'http'):
+        """Pooled keep-alive HTTP client with timeouts, jittered retries and latency metrics
+
+        One ``requests.Session`` with an adapter holding up to ``pool_size``
+        connections per host, so calls reuse TCP/TLS connections instead of
+        handshaking every time. Every call gets a (connect, read) timeout;
+        the read timeout bounds each wait for data, not the whole body.
+
+        Connection errors and 429/5xx responses are retried up to
+        ``max_retries`` times with full-jitter exponential backoff
+        (``backoff_base`` doubling up to ``backoff_max``). A Retry-After
+        header sets the minimum wait; if it asks for longer than
+        ``backoff_max`` the response is returned as-is instead.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _endpoint(self, label: str) -> Dict:
+        # Caller holds the lock
+        endpoint = self._endpoints.get(label)
+        if endpoint is None:
+            endpoint = self._endpoints[label] = {
+                'calls': 0,
+                'errors': 0,
+                'retries': 0,
+                'last_status': None,
+                'latencies': deque(maxlen=512)
+            }
+        return endpoint
+
+    def _record(self, label: str, started: float, status: Optional[int], retries: int):
+        latency = time.perf_counter() - started
+        with self._lock:
+            endpoint = self._endpoint(label)
+            endpoint['calls'] += 1
+            endpoint['retries'] += retries
+            endpoint['last_status'] = status
+            endpoint['latencies'].append(latency)
+            if status is None or status >= 400:
+                endpoint['errors'] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, path: str, label: Optional[str] = None,
+                timeout: Optional[Tuple[float, float]] = None, **kwargs) -> requests.Response:
+        """Send a request relative to ``base_url``, retrying transient failures
+
+        Latency is measured to the response headers (for ``stream=True``
+        that's time to first byte) and recorded under ``label``.
+        """
+        label = label or path
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                # Includes connect timeouts; read timeouts aren't retried (the wait already happened)
+                if attempt >= self.max_retries:
+                    self._record(label, started, None, attempt)
+                    raise
+                delay = self._backoff(attempt)
+                print(f"🔁 {self.name} {label}: {e.__class__.__name__}, retrying in {delay:.2f}s")
+            except requests.exceptions.RequestException:
+                self._record(label, started, None, attempt)
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    self._record(label, started, response.status_code, attempt)
+                    return response
+                delay = self._backoff(attempt)
+                requested = retry_after_seconds(response)
+                if requested is not None:
+                    if requested > self.backoff_max:
+                        self._record(label, started, response.status_code, attempt)
+                        return response
+                    delay = max(delay, requested)
+                print(f"🔁 {self.name} {label}: HTTP {response.status_code}, retrying in {delay:.2f}s")
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def stats(self) -> Dict:
+        """Per-endpoint call counts, errors, retries and latency percentiles (ms)"""
+        with self._lock:
+            snapshot = {label: dict(endpoint, latencies=sorted(endpoint['latencies']))
+                        for label, endpoint in self._endpoints.items()}
+        endpoints = {}
+        for label, endpoint in snapshot.items():
+            latencies = endpoint.pop('latencies')
+            endpoints[label] = {
+                **endpoint,
+                'p50_ms': _percentile_ms(latencies, 0.5),
+                'p95_ms': _percentile_ms(latencies, 0.95),
+                'max_ms': _percentile_ms(latencies, 1.0)
+            }
+        return {
+            'base_url': self.base_url,
+            'connect_timeout_s': self.timeout[0],
+            'read_timeout_s': self.timeout[1],
+            'max_retries': self.max_retries,
+            'endpoints': endpoints
+        }
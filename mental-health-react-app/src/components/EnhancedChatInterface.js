@@ -161,10 +161,12 @@ const EnhancedChatInterface = () => {
 
   const generateVoice = async (text) => {
     try {
+      const token = localStorage.getItem('token');
       const response = await fetch('http://localhost:5000/voice/generate', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Authorization': `Bearer ${token}`
         },
         body: JSON.stringify({
           text: text,
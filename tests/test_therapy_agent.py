@@ -0,0 +1,94 @@
+import threading
+from types import SimpleNamespace
+import pytest
+from agents.circuit_breaker import CircuitBreaker
+from agents.therapy_agent import TherapyAgent
+
+SAD = {'primary_emotion': 'sadness'}
+
+class StubModel:
+    """Stands in for the Gemini model: replies, blocks or fails on demand"""
+
+    def __init__(self, text='I hear you, that sounds really hard.'):
+        self.text = text
+        self.calls = 0
+        self.fail = False
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate_content(self, *args, **kwargs):
+        self.calls += 1
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError('model unavailable')
+        part = SimpleNamespace(text=self.text)
+        return SimpleNamespace(text=self.text, candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+def fallbacks(username='alice'):
+    return {template.format(username=username) for template in TherapyAgent.FALLBACK_RESPONSES['sadness']}
+
+@pytest.fixture
+def model():
+    stub = StubModel()
+    yield stub
+    stub.release.set()  # let abandoned worker calls finish
+
+def test_model_reply_is_returned(model):
+    agent = TherapyAgent(model=model, generation_timeout=1)
+    assert agent.generate_empathetic_response('rough day', SAD, username='alice') == model.text
+    assert agent.circuit_breaker.snapshot()['state'] == CircuitBreaker.CLOSED
+
+def test_slow_model_times_out_to_the_fallback(model):
+    agent = TherapyAgent(model=model, generation_timeout=0.05)
+    model.release.clear()
+
+    reply = agent.generate_empathetic_response('rough day', SAD, username='alice')
+
+    assert reply in fallbacks()
+    assert agent.get_status()['timed_out_calls'] == 1
+
+def test_zero_timeout_is_kept_and_expires_immediately(model, monkeypatch):
+    monkeypatch.setenv('GEMINI_TIMEOUT_SECONDS', '15')
+    assert TherapyAgent(model=model).generation_timeout == 15
+
+    agent = TherapyAgent(model=model, generation_timeout=0)
+    model.release.clear()
+
+    assert agent.generation_timeout == 0
+    assert agent.generate_empathetic_response('rough day', SAD, username='alice') in fallbacks()
+    assert agent.get_status()['timed_out_calls'] == 1
+
+def test_breaker_trips_on_failures_and_recovers_after_a_probe(model):
+    now = [0.0]
+    agent = TherapyAgent(model=model, generation_timeout=1)
+    agent.circuit_breaker = CircuitBreaker(min_calls=2, open_seconds=30, clock=lambda: now[0])
+    model.fail = True
+
+    for _ in range(2):
+        assert agent.generate_empathetic_response('rough day', SAD, username='alice') in fallbacks()
+    assert agent.circuit_breaker.state == CircuitBreaker.OPEN
+
+    # While open the model is skipped entirely
+    assert agent.generate_empathetic_response('rough day', SAD, username='alice') in fallbacks()
+    assert model.calls == 2
+
+    # After the cool-down a single successful probe closes the circuit
+    now[0] += 31
+    model.fail = False
+    assert agent.generate_empathetic_response('rough day', SAD, username='alice') == model.text
+    assert model.calls == 3
+    assert agent.circuit_breaker.state == CircuitBreaker.CLOSED
+    assert agent.generate_empathetic_response('rough day', SAD, username='alice') == model.text
+
+def test_failed_probe_reopens_the_circuit(model):
+    now = [0.0]
+    agent = TherapyAgent(model=model, generation_timeout=1)
+    agent.circuit_breaker = CircuitBreaker(min_calls=2, open_seconds=30, clock=lambda: now[0])
+    model.fail = True
+    for _ in range(2):
+        agent.generate_empathetic_response('rough day', SAD, username='alice')
+
+    now[0] += 31
+    assert agent.generate_empathetic_response('rough day', SAD, username='alice') in fallbacks()
+    assert agent.circuit_breaker.state == CircuitBreaker.OPEN
+    assert model.calls == 3
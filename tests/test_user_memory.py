@@ -0,0 +1,79 @@
+import os
+import uuid
+import pytest
+from flask import Flask
+from sqlalchemy import inspect
+from database.models import db
+from database.storage import create_configured_engine, database_uri
+from database.user_memory import UserMemory
+
+POSTGRES_URL = os.getenv('DATABASE_URL', '')
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def memory(request, tmp_path):
+    if request.param == 'sqlite':
+        yield UserMemory(db_path=str(tmp_path / 'user_data.db'))
+        return
+    if not POSTGRES_URL.startswith(('postgres://', 'postgresql')):
+        pytest.skip('set DATABASE_URL to a PostgreSQL database to run against PostgreSQL')
+    engine = create_configured_engine(database_uri())
+    store = UserMemory(engine=engine, table_prefix=f"test_{uuid.uuid4().hex[:8]}_")
+    try:
+        yield store
+    finally:
+        store.metadata.drop_all(engine)
+        engine.dispose()
+
+def test_get_or_create_user_is_idempotent(memory):
+    user_id = memory.get_or_create_user('alice')
+    assert memory.get_or_create_user('alice') == user_id
+    assert memory.get_or_create_user('bob') != user_id
+
+def test_history_is_newest_first_with_text_timestamps(memory):
+    user_id = memory.get_or_create_user('alice')
+    memory.save_conversation(user_id, 'hi', 'hello', 'neutral')
+    memory.save_conversations_bulk([
+        (user_id, 'sad today', 'I hear you', 'sad'),
+        (user_id, 'better now', 'Glad to hear it', 'happy'),
+    ])
+
+    history = memory.get_user_history(user_id)
+    assert len(history) == 3
+    assert {row[0] for row in history} == {'hi', 'sad today', 'better now'}
+    for message, response, emotion, timestamp in history:
+        assert isinstance(timestamp, str)
+    timestamps = [row[3] for row in history]
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert len(memory.get_user_history(user_id, limit=2)) == 2
+
+def test_history_is_per_user(memory):
+    alice = memory.get_or_create_user('alice')
+    bob = memory.get_or_create_user('bob')
+    memory.save_conversation(alice, 'hi', 'hello', 'neutral')
+    assert memory.get_user_history(bob) == []
+
+def test_bulk_save_with_no_rows(memory):
+    assert memory.save_conversations_bulk([]) == 0
+
+def test_save_preference_updates_in_place(memory):
+    user_id = memory.get_or_create_user('alice')
+    memory.save_preference(user_id, 'voice', 'bella')
+    memory.save_preference(user_id, 'theme', 'dark')
+    memory.save_preference(user_id, 'voice', 'josh')
+    assert memory.get_preferences(user_id) == {'voice': 'josh', 'theme': 'dark'}
+
+def test_sqlite_file_keeps_original_table_names(tmp_path):
+    memory = UserMemory(db_path=str(tmp_path / 'user_data.db'))
+    assert {'users', 'conversations', 'user_preferences'} <= set(inspect(memory.engine).get_table_names())
+
+def test_defaults_to_app_engine_in_app_context(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(app)
+    with app.app_context():
+        memory = UserMemory()
+        assert memory.engine is db.engine
+        assert 'memory_conversations' in inspect(db.engine).get_table_names()
+        user_id = memory.get_or_create_user('alice')
+        memory.save_conversation(user_id, 'hi', 'hello', 'neutral')
+        assert memory.get_user_history(user_id)[0][:3] == ('hi', 'hello', 'neutral')
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from database.models import db, User, Conversation, Activity, MoodEntry, UserStats
+from database.user_stats import WELLNESS_REPORTS, _STATS_LISTENERS, rebuild_user_stats, register_stats_listeners
+
+START = datetime(2024, 1, 1)
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'stats.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    register_stats_listeners()
+    with app.app_context():
+        db.create_all()
+        try:
+            yield app
+        finally:
+            db.session.remove()
+            db.engine.dispose()
+            for model, listener in _STATS_LISTENERS:
+                event.remove(model, 'after_insert', listener)
+
+def add_user(username: str) -> int:
+    user = User(username=username, email=f"{username}@example.com", password_hash='x',
+                first_name=username.title(), last_name='Test', age=30)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def add_conversations(user_id: int, emotions):
+    for i, emotion in enumerate(emotions):
+        db.session.add(Conversation(user_id=user_id, message=f"message {i}", response='reply',
+                                    emotion_detected=emotion, timestamp=START + timedelta(minutes=i)))
+        db.session.commit()
+
+def add_moods(user_id: int, scores_by_minute):
+    for minute, score in scores_by_minute:
+        db.session.add(MoodEntry(user_id=user_id, mood_score=score, timestamp=START + timedelta(minutes=minute)))
+        db.session.commit()
+
+def reports(user_id: int):
+    result = {}
+    for mode, report in WELLNESS_REPORTS.items():
+        result[mode] = report(user_id)
+        db.session.expunge_all()
+    return result
+
+def test_all_modes_agree_and_break_emotion_ties_by_first_seen(app):
+    user_id = add_user('alice')
+    # sad, happy and neutral ('' and None count as neutral) tie at two each;
+    # sad was seen first, so it wins in every mode
+    add_conversations(user_id, ['sad', 'happy', None, 'happy', 'sad', ''])
+    for i in range(3):
+        db.session.add(Activity(user_id=user_id, activity_type='breathing', activity_data={'round': i}))
+        db.session.commit()
+    # Two entries share the newest timestamp; more than a window's worth overall
+    add_moods(user_id, [(0, 2), (5, 7), (9, 8), (9, 3), (3, 9), (7, 6), (8, 10), (1, 6), (2, 7)])
+
+    result = reports(user_id)
+
+    assert result['python']['most_common_emotion'] == 'sad'
+    assert list(result['python']['emotions_count']) == ['sad', 'happy', 'neutral']
+    assert result['aggregate'] == result['python']
+    assert result['sql'] == result['python']
+    assert list(result['aggregate']['emotions_count']) == list(result['sql']['emotions_count']) == ['sad', 'happy', 'neutral']
+
+def test_modes_agree_for_a_new_user_and_after_a_rebuild(app):
+    empty_id = add_user('bob')
+    result = reports(empty_id)
+    assert result['aggregate'] == result['sql'] == result['python']
+    assert result['python']['most_common_emotion'] == 'neutral'
+    assert result['python']['wellness_score'] == 0
+
+    user_id = add_user('carol')
+    add_conversations(user_id, ['anxious', 'calm', 'calm', 'anxious'])
+    add_moods(user_id, [(0, 6), (0, 4), (1, 8)])
+    db.session.query(UserStats).delete()
+    db.session.commit()
+    rebuild_user_stats()
+
+    result = reports(user_id)
+    assert result['aggregate'] == result['sql'] == result['python']
+    assert result['python']['most_common_emotion'] == 'anxious'
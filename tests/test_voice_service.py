@@ -0,0 +1,104 @@
+import threading
+import pytest
+from agents.therapy_agent import TherapyAgent
+from audio_cache import audio_key
+from voice_pack import NAME_SLOT, build_corpus, write_pack
+
+pytest.importorskip('speech_recognition')
+from voice_service import SpeechStreamError, VoiceService
+
+MODEL_ID = 'eleven_multilingual_v2'
+VOICE_ID = 'EXAVITQu4vr4xnSDxMaL'
+TEMPLATE = TherapyAgent.FALLBACK_RESPONSES['sadness'][0]
+
+class NoCrisisLocations:
+    """Escalation agent stand-in with no per-location crisis replies"""
+    crisis_resources = {}
+
+def render(text, voice_id):
+    return audio_key(text, voice_id, {}, MODEL_ID), f"<{text}>".encode('utf-8')
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    pack_path = tmp_path / 'voice_pack.vpk'
+    corpus = build_corpus(NoCrisisLocations(), {'sadness': [TEMPLATE]}, {}, {})
+    write_pack(str(pack_path), corpus, {'bella': VOICE_ID}, 'empathetic', MODEL_ID, render, log=lambda message: None)
+
+    monkeypatch.delenv('ELEVENLABS_API_KEY', raising=False)
+    monkeypatch.setenv('AUDIO_CACHE_DIR', str(tmp_path / 'audio_cache'))
+    monkeypatch.setenv('VOICE_PACK_PATH', str(pack_path))
+    monkeypatch.setenv('VOICE_CATALOG_PATH', str(tmp_path / 'voice_catalog.json'))
+    service = VoiceService()
+    service.upstream = []
+    monkeypatch.setattr(service, '_request_speech', lambda text, *args: service.upstream.append(text))
+    monkeypatch.setattr(service, '_render_name_later', lambda name, *args: service.upstream.append(name))
+    return service
+
+def test_name_spliced_reply_is_served_from_the_pack(service):
+    assert NAME_SLOT in TEMPLATE
+    name_key = service._speech_request('Bob', VOICE_ID, 'empathetic')[2]
+    service.audio_cache.put(name_key, b'<Bob>')
+
+    key, audio = service.synthesize(TEMPLATE.format(username='Bob'), name='Bob')
+
+    assert service.upstream == []
+    assert b'<Bob>' in audio
+    assert audio.startswith(b'<I can hear the sadness')
+
+def test_unrendered_name_falls_back_to_the_name_free_clip(service):
+    key, audio = service.synthesize(TEMPLATE.format(username='Bob'), name='Bob')
+
+    assert b'Bob' not in audio
+    # Only the name itself is queued for rendering, never the whole reply
+    assert service.upstream == ['Bob']
+
+def test_stream_speech_uses_the_pack_for_the_named_reply(service):
+    name_key = service._speech_request('Bob', VOICE_ID, 'empathetic')[2]
+    service.audio_cache.put(name_key, b'<Bob>')
+
+    audio = b''.join(service.stream_speech(TEMPLATE.format(username='Bob'), name='Bob'))
+
+    assert service.upstream == []
+    assert b'<Bob>' in audio
+
+class EmptyStreamResponse:
+    status_code = 200
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_content(self, chunk_size=1):
+        return iter([])
+
+def test_empty_upstream_audio_is_an_error_and_not_cached(service, monkeypatch):
+    service.api_key = 'test'
+    monkeypatch.setattr(service.http, 'post', lambda *args, **kwargs: EmptyStreamResponse())
+    text = 'A sentence the pack has never heard of.'
+
+    with pytest.raises(SpeechStreamError):
+        list(service.stream_speech(text))
+
+    key = service._speech_request(text, VOICE_ID, 'empathetic')[2]
+    assert service.audio_cache.get(key) is None
+
+def test_missing_names_render_once_on_the_background_pool(service, monkeypatch):
+    release = threading.Event()
+    rendered = []
+
+    def slow_synthesize(text, *args):
+        release.wait(5)
+        rendered.append(text)
+    monkeypatch.setattr(service, 'synthesize', slow_synthesize)
+    monkeypatch.setattr(service, 'name_render_max_pending', 2)
+
+    for name in ['Bob', 'Bob', 'Ann', 'Bob', 'Cy']:
+        VoiceService._render_name_later(service, name, VOICE_ID, 'empathetic')
+    release.set()
+    service._name_executor.shutdown(wait=True)
+
+    # Repeats of a queued name are dropped, and so is anything past the backlog limit
+    assert sorted(rendered) == ['Ann', 'Bob']
+    assert service._pending_names == set()
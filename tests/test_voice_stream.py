@@ -0,0 +1,100 @@
+import base64
+import pytest
+from audio_cache import AudioCache
+from benchmarks.tts_stream_benchmark import REPLY, FakeTTSHandler, start_server
+
+pytest.importorskip('speech_recognition')
+from voice_service import VoiceService, split_sentences
+
+SENTENCE = 'It makes sense that you feel exhausted after weeks of pushing through.'
+
+@pytest.fixture
+def fake_tts(monkeypatch):
+    monkeypatch.setattr(FakeTTSHandler, 'first_byte', 0)
+    monkeypatch.setattr(FakeTTSHandler, 'per_char', 0)
+    server = start_server()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def service(fake_tts, tmp_path, monkeypatch):
+    monkeypatch.setenv('ELEVENLABS_BASE_URL', fake_tts)
+    monkeypatch.setenv('ELEVENLABS_API_KEY', 'fake')
+    monkeypatch.setenv('AUDIO_CACHE_DIR', str(tmp_path / 'audio_cache'))
+    monkeypatch.setenv('VOICE_PACK_PATH', str(tmp_path / 'no-pack.vpk'))
+    monkeypatch.setenv('VOICE_CATALOG_PATH', str(tmp_path / 'voice_catalog.json'))
+    return VoiceService()
+
+def buffered(service, text, directory):
+    """Audio for ``text`` through the buffered endpoint, bypassing anything already cached"""
+    cache, service.audio_cache = service.audio_cache, AudioCache(str(directory))
+    try:
+        return service.text_to_speech(text)
+    finally:
+        service.audio_cache = cache
+
+def test_stream_matches_buffered_audio_and_caches_each_sentence(service, tmp_path, monkeypatch):
+    sentences = split_sentences(REPLY)
+    assert len(sentences) > service.stream_lookahead + 1
+
+    streamed = b''.join(service.stream_speech(REPLY))
+
+    expected = b''.join(buffered(service, sentence, tmp_path / f"buffered-{i}") for i, sentence in enumerate(sentences))
+    assert streamed == expected
+    for sentence in sentences:
+        clean_text, _, key = service._speech_request(sentence, service.voice_id, 'empathetic')
+        assert service.audio_cache.get(key) == FakeTTSHandler.fake_audio(clean_text)
+
+    # A second pass is served from the per-sentence cache entries
+    monkeypatch.setattr(service.http, 'post', None)
+    assert b''.join(service.stream_speech(REPLY)) == streamed
+
+def test_single_sentence_stream_equals_buffered_clip(service, tmp_path):
+    assert split_sentences(SENTENCE) == [SENTENCE]
+    assert b''.join(service.stream_speech(SENTENCE)) == buffered(service, SENTENCE, tmp_path / 'buffered')
+
+@pytest.fixture(scope='module')
+def signed_in(tmp_path_factory):
+    """The app module (imported once, on a scratch database) and a user's token"""
+    pytest.importorskip('config')
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('DATABASE_URL', f"sqlite:///{tmp_path_factory.mktemp('app') / 'app.db'}")
+        app_module = pytest.importorskip('app')
+    with app_module.app.app_context():
+        app_module.db.create_all()
+        user = app_module.User(username='alice', email='alice@example.com', password_hash='x',
+                               first_name='Alice', last_name='Test', age=30)
+        app_module.db.session.add(user)
+        app_module.db.session.commit()
+        token = app_module.issue_token(user)
+    return app_module, token
+
+@pytest.fixture
+def client(signed_in, service, monkeypatch):
+    app_module, token = signed_in
+    monkeypatch.setattr(app_module, '_voice_service', service)
+    client = app_module.app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {token}"
+    return client
+
+def test_voice_stream_route_matches_voice_generate(client, service, tmp_path):
+    streamed = client.post('/voice/stream', json={'text': SENTENCE})
+    assert streamed.status_code == 200
+    assert streamed.mimetype == 'audio/mpeg'
+
+    service.audio_cache = AudioCache(str(tmp_path / 'buffered'))
+    generated = client.post('/voice/generate', json={'text': SENTENCE})
+    assert generated.status_code == 200
+    assert base64.b64decode(generated.get_json()['audio_base64']) == streamed.data
+
+    multi = client.post('/voice/stream', json={'text': REPLY})
+    assert multi.status_code == 200
+    assert multi.data == b''.join(service.stream_speech(REPLY))
+
+def test_voice_routes_without_an_api_key_are_unavailable(client, service, monkeypatch):
+    monkeypatch.setattr(service, 'api_key', None)
+
+    for route in ('/voice/generate', '/voice/stream'):
+        response = client.post(route, json={'text': SENTENCE})
+        assert response.status_code == 503, route
@@ -0,0 +1,217 @@
+import json
+import mmap
+import os
+import re
+import struct
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from audio_cache import normalize_text
+
+MAGIC = b'VPK1'
+NAME_SLOT = '{username}'
+# Name the agents fall back to (and the crisis templates hardcode)
+DEFAULT_NAME = 'Akashpatel2609'
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+def split_paragraphs(text: str) -> List[str]:
+    """Paragraphs of a response, each with its lines trimmed"""
+    paragraphs = []
+    for block in _PARAGRAPH_BREAK.split(text):
+        lines = [line.strip() for line in block.strip().splitlines()]
+        if any(lines):
+            paragraphs.append('\n'.join(line for line in lines if line))
+    return paragraphs
+
+def name_free(template: str) -> str:
+    """Template with the name slot removed: 'Hello {username}!' -> 'Hello!'"""
+    text = re.sub(r'^' + re.escape(NAME_SLOT) + r',\s*(\w)', lambda m: m.group(1).upper(), template)
+    text = re.sub(r',? ?' + re.escape(NAME_SLOT) + r'(?=[,.!?])', '', text)
+    return re.sub(r' {2,}', ' ', text.replace(NAME_SLOT, ''))
+
+def build_corpus(escalation_agent, fallback_responses: Dict, therapeutic_responses: Dict,
+                 wellness_tips: Dict) -> List[Dict]:
+    """Every known paragraph of static response text, with the name as a slot
+
+    Crisis replies are rendered for each configured location. Returns
+    phrase dicts with ``id``, ``template``, ``segments`` (text around the
+    name slot) and ``name_free``.
+    """
+    sources = []
+    locations = [key for key, value in escalation_agent.crisis_resources.items() if isinstance(value, dict)]
+    for level in ('high', 'medium', 'low'):
+        for location in locations:
+            response = escalation_agent.handle_crisis(level, location)['response']
+            sources.append((f"crisis/{level}/{location}", response.replace(DEFAULT_NAME, NAME_SLOT)))
+    for category, templates in fallback_responses.items():
+        for index, template in enumerate(templates):
+            sources.append((f"fallback/{category}/{index}", template))
+    for category, templates in therapeutic_responses.items():
+        for index, template in enumerate(templates):
+            sources.append((f"therapeutic/{category}/{index}", template))
+    for day, tip in sorted(wellness_tips.items()):
+        sources.append((f"tips/{day}/tip", tip['tip']))
+        sources.append((f"tips/{day}/activity", tip['activity']))
+
+    corpus, seen = [], set()
+    for source_id, text in sources:
+        for index, paragraph in enumerate(split_paragraphs(text)):
+            match_key = normalize_text(paragraph)
+            if match_key in seen:
+                continue
+            seen.add(match_key)
+            corpus.append({
+                'id': f"{source_id}/{index}",
+                'template': paragraph,
+                'segments': paragraph.split(NAME_SLOT),
+                'name_free': name_free(paragraph)
+            })
+    return corpus
+
+def write_pack(path: str, corpus: List[Dict], voices: Dict[str, str], style: str, model_id: str,
+               render: Callable[[str, str], Optional[Tuple[str, bytes]]], log=print) -> Dict:
+    """Render every phrase for every voice and write the pack file
+
+    ``render(text, voice_id)`` returns (content key, audio) or None.
+    Identical clips (by content key) are stored once. The file is a magic
+    header, a length-prefixed JSON index, then the concatenated clips.
+    """
+    blobs, chunks, offset = {}, [], 0
+    clips = {}
+    failed = 0
+
+    def store(text: str, voice_id: str) -> Optional[str]:
+        nonlocal offset, failed
+        if not text.strip():
+            return ''
+        result = render(text, voice_id)
+        if result is None:
+            failed += 1
+            return None
+        key, audio = result
+        if key not in blobs:
+            blobs[key] = [offset, len(audio)]
+            chunks.append(audio)
+            offset += len(audio)
+        return key
+
+    for voice_name, voice_id in voices.items():
+        log(f"🎙️ Rendering {len(corpus)} phrases for {voice_name}...")
+        voice_clips = clips[voice_id] = {}
+        for phrase in corpus:
+            segments = [store(segment, voice_id) for segment in phrase['segments']]
+            if None in segments:
+                continue
+            entry = {'segments': segments}
+            if len(segments) > 1:
+                entry['name_free'] = store(phrase['name_free'], voice_id)
+                if entry['name_free'] is None:
+                    continue
+            voice_clips[phrase['id']] = entry
+
+    index = json.dumps({
+        'version': 1,
+        'style': style,
+        'model_id': model_id,
+        'voices': voices,
+        'phrases': corpus,
+        'clips': clips,
+        'blobs': blobs
+    }, separators=(',', ':')).encode('utf-8')
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('>I', len(index)))
+        f.write(index)
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+    return {'phrases': len(corpus), 'voices': len(voices), 'clips': len(blobs), 'bytes': offset, 'failed': failed}
+
+class VoicePack:
+    def __init__(self, path: str):
+        """Read-only view of a pack file built by ``write_pack``
+
+        The index is parsed once; clip data stays in a shared read-only
+        memory map, so loading is cheap and every worker shares the pages.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(4) != MAGIC:
+                raise ValueError(f"{path} is not a voice pack")
+            (index_length,) = struct.unpack('>I', f.read(4))
+            index = json.loads(f.read(index_length).decode('utf-8'))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data_start = 8 + index_length
+        self.style = index['style']
+        self.model_id = index['model_id']
+        self.voices = index['voices']
+        self._phrases = {phrase['id']: phrase for phrase in index['phrases']}
+        self._by_text = {normalize_text(phrase['template']): phrase['id'] for phrase in index['phrases']}
+        self._clips = index['clips']
+        self._blobs = index['blobs']
+
+    def _clip(self, key: str) -> bytes:
+        offset, length = self._blobs[key]
+        start = self._data_start + offset
+        return self._map[start:start + length]
+
+    def __len__(self):
+        return len(self._phrases)
+
+    def match(self, paragraph: str, names: Iterable[str]) -> Optional[Tuple[str, Optional[str]]]:
+        """(phrase id, name spoken in it) for a paragraph in the pack, else None"""
+        text = normalize_text(paragraph)
+        phrase_id = self._by_text.get(text)
+        if phrase_id is not None:
+            return phrase_id, None
+        for name in names:
+            if name and name in text:
+                phrase_id = self._by_text.get(text.replace(name, NAME_SLOT))
+                if phrase_id is not None:
+                    return phrase_id, name
+        return None
+
+    def compose(self, text: str, voice_id: str, names: Iterable[str] = (DEFAULT_NAME,)) -> Optional[List[Tuple[str, object]]]:
+        """Plan the audio for ``text`` from pre-rendered clips
+
+        Returns a list of pieces: ('audio', clip) from the pack,
+        ('splice', segment clips, name, name-free clip) for a phrase that
+        says the user's name, and ('text', paragraph) for paragraphs the
+        pack doesn't know. None when the voice isn't in the pack or
+        nothing matched.
+        """
+        voice_clips = self._clips.get(voice_id)
+        if voice_clips is None:
+            return None
+        names = list(names)
+        pieces, matched = [], False
+        for paragraph in split_paragraphs(text):
+            found = self.match(paragraph, names)
+            clip = voice_clips.get(found[0]) if found else None
+            if clip is None:
+                # Consecutive unknown paragraphs are synthesized in one request
+                if pieces and pieces[-1][0] == 'text':
+                    pieces[-1] = ('text', f"{pieces[-1][1]}\n\n{paragraph}")
+                else:
+                    pieces.append(('text', paragraph))
+                continue
+            matched = True
+            segments = [self._clip(key) if key else b'' for key in clip['segments']]
+            if len(segments) == 1:
+                pieces.append(('audio', segments[0]))
+            else:
+                name_free_clip = self._clip(clip['name_free']) if clip['name_free'] else b''
+                pieces.append(('splice', segments, found[1], name_free_clip))
+        return pieces if matched else None
+
+    def stats(self) -> Dict:
+        return {
+            'path': self.path,
+            'phrases': len(self._phrases),
+            'voices': list(self.voices),
+            'style': self.style,
+            'bytes': os.path.getsize(self.path)
+        }
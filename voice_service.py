@@ -4,8 +4,40 @@ import json
 import speech_recognition as sr
 import io
 import base64
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Tuple
+import hashlib
+import queue
+import re
+import threading
 import time
+from audio_cache import AudioCache, audio_key
+from http_client import HttpClient
+from voice_pack import DEFAULT_NAME, VoicePack
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+class SpeechStreamError(RuntimeError):
+    """Raised by ``stream_speech`` when upstream fails before any audio was produced"""
+
+def split_sentences(text: str, min_length: int = 20) -> list:
+    """Split text into sentences for pipelined synthesis
+
+    Fragments shorter than ``min_length`` ("Hi!") are joined to the next
+    sentence so each request carries enough text to sound natural.
+    """
+    sentences, pending = [], ''
+    for part in _SENTENCE_END.split(text.strip()):
+        pending = f"{pending} {part}".strip() if pending else part.strip()
+        if len(pending) >= min_length:
+            sentences.append(pending)
+            pending = ''
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
 
 class VoiceService:
     def __init__(self):
@@ -25,7 +57,58 @@ class VoiceService:
         self.current_voice = 'bella'  # Default to Bella - most human-like
         self.voice_id = self.voice_options[self.current_voice]
         
-        self.base_url = "https://api.elevenlabs.io/v1"
+        # Point at a local stand-in (e.g. benchmarks/tts_stream_benchmark.py) for testing
+        self.base_url = os.getenv('ELEVENLABS_BASE_URL', "https://api.elevenlabs.io/v1").rstrip('/')
+        # Keep-alive connection pool shared by every ElevenLabs call
+        self.http = HttpClient(
+            self.base_url,
+            headers={"xi-api-key": self.api_key} if self.api_key else None,
+            pool_size=int(os.getenv('ELEVENLABS_POOL_SIZE', '16')),
+            connect_timeout=float(os.getenv('ELEVENLABS_CONNECT_TIMEOUT', '3.05')),
+            read_timeout=float(os.getenv('ELEVENLABS_READ_TIMEOUT', '30')),
+            max_retries=int(os.getenv('ELEVENLABS_MAX_RETRIES', '2')),
+            name='elevenlabs'
+        )
+        self.model_id = "eleven_multilingual_v2"  # Better model for natural speech
+        
+        # The voice catalog rarely changes: serve the last known list (kept on
+        # disk across restarts) and refresh it in the background once stale
+        self.catalog_path = os.getenv('VOICE_CATALOG_PATH', os.path.join('instance', 'voice_catalog.json'))
+        self.catalog_ttl = float(os.getenv('VOICE_CATALOG_TTL_SECONDS', '86400'))
+        self.catalog_retry_seconds = float(os.getenv('VOICE_CATALOG_RETRY_SECONDS', '60'))
+        self._catalog_lock = threading.Lock()
+        self._catalog_refreshing = False
+        self._catalog_failed_at = None
+        self._catalog_error = None
+        self._catalog = self._load_catalog()
+        
+        # Synthesized clips are content-addressed, so repeated phrases
+        # (greetings, crisis and fallback replies) never hit the API twice
+        self.audio_cache = AudioCache(
+            directory=os.getenv('AUDIO_CACHE_DIR', os.path.join('instance', 'audio_cache')),
+            memory_bytes=int(float(os.getenv('AUDIO_CACHE_MEMORY_MB', '64')) * 1024 * 1024),
+            disk_bytes=int(float(os.getenv('AUDIO_CACHE_DISK_MB', '1024')) * 1024 * 1024)
+        )
+        
+        # Pre-rendered crisis, fallback and wellness phrases (flask build-voice-pack)
+        self.voice_pack_path = os.getenv('VOICE_PACK_PATH', os.path.join('instance', 'voice_pack.vpk'))
+        self.voice_pack = self._load_voice_pack(self.voice_pack_path)
+        
+        # Streaming synthesizes up to this many sentences ahead of playback
+        self.stream_lookahead = max(1, int(os.getenv('TTS_STREAM_LOOKAHEAD', '2')))
+        self._stream_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('TTS_STREAM_WORKERS', '8')),
+            thread_name_prefix='tts-stream'
+        )
+        # Names missing from the pack's cache are rendered in the background,
+        # each at most once at a time, on a small pool with a bounded backlog
+        self._name_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('VOICE_NAME_RENDER_WORKERS', '2')),
+            thread_name_prefix='voice-name-render'
+        )
+        self.name_render_max_pending = int(os.getenv('VOICE_NAME_RENDER_MAX_PENDING', '100'))
+        self._pending_names = set()
+        self._pending_names_lock = threading.Lock()
         self.recognizer = sr.Recognizer()
         
         try:
@@ -42,41 +125,267 @@ class VoiceService:
     
     def text_to_speech(self, text: str, voice_id: Optional[str] = None, voice_style: str = 'empathetic') -> Optional[bytes]:
         """Convert text to speech with human-like natural voice"""
+        result = self.synthesize(text, voice_id, voice_style)
+        return result[1] if result else None
+    
+    def synthesize(self, text: str, voice_id: Optional[str] = None, voice_style: str = 'empathetic',
+                   name: Optional[str] = None) -> Optional[Tuple[str, bytes]]:
+        """Speech for ``text`` as (cache key, audio): audio cache, then voice pack, then ElevenLabs
+        
+        ``name`` is the name the reply addresses the user by (their first
+        name in chat replies), so pack phrases can splice it in.
+        """
+        # Use specified voice or current default
+        selected_voice_id = voice_id or self.voice_id
+        
+        clean_text, voice_settings, key = self._speech_request(text, selected_voice_id, voice_style)
+        
+        if self.voice_pack is not None and voice_style == self.voice_pack.style:
+            audio_data = self.audio_cache.get(key)
+            if audio_data is not None:
+                return key, audio_data
+            result = self._synthesize_from_pack(text, selected_voice_id, voice_style, name, key)
+            if result is not None:
+                return result
+        
+        audio_data = self.audio_cache.get_or_create(
+            key, lambda: self._request_speech(clean_text, selected_voice_id, voice_settings)
+        )
+        return (key, audio_data) if audio_data else None
+    
+    def _speech_request(self, text: str, voice_id: str, voice_style: str) -> Tuple[str, dict, str]:
+        """Enhanced text, voice settings and audio cache key for an utterance"""
+        # Clean and enhance text for natural speech
+        clean_text = self._enhance_text_for_natural_speech(text)
+        
+        # Human-like voice settings based on style
+        voice_settings = self._get_human_voice_settings(voice_style)
+        
+        return clean_text, voice_settings, audio_key(clean_text, voice_id, voice_settings, self.model_id)
+    
+    def _load_voice_pack(self, path: str) -> Optional[VoicePack]:
+        if not os.path.exists(path):
+            return None
+        try:
+            pack = VoicePack(path)
+        except Exception as e:
+            print(f"⚠️ Voice pack {path} could not be loaded: {e}")
+            return None
+        if pack.model_id != self.model_id:
+            print(f"⚠️ Voice pack {path} was rendered with {pack.model_id}; ignoring it")
+            return None
+        print(f"✅ Voice pack loaded - {len(pack)} pre-rendered phrases")
+        return pack
+    
+    def _synthesize_from_pack(self, text: str, voice_id: str, voice_style: str,
+                              name: Optional[str], key: str) -> Optional[Tuple[str, bytes]]:
+        """Assemble speech from pre-rendered phrases, splicing in the user's name
+        
+        Paragraphs the pack doesn't know are synthesized as usual. If the
+        name hasn't been rendered yet, the phrase's name-free variant is
+        used now and the name is rendered in the background for next time.
+        """
+        pieces = self.voice_pack.compose(text, voice_id, names=[name, DEFAULT_NAME])
+        if pieces is None:
+            return None
+        parts, complete = [], True
+        for piece in pieces:
+            if piece[0] == 'audio':
+                parts.append(piece[1])
+            elif piece[0] == 'text':
+                result = self.synthesize(piece[1], voice_id, voice_style)
+                if result is None:
+                    return None
+                parts.append(result[1])
+            else:
+                audio_data, spliced = self._splice(piece, voice_id, voice_style)
+                parts.append(audio_data)
+                complete = complete and spliced
+        # MP3 frames concatenate cleanly, so the pieces play as one clip
+        audio_data = b''.join(parts)
+        if not complete:
+            # Not what ``key`` promises (the name is missing): address it by content
+            key = hashlib.sha256(audio_data).hexdigest()
+        self.audio_cache.put(key, audio_data)
+        return key, audio_data
+    
+    def _splice(self, piece: tuple, voice_id: str, voice_style: str) -> Tuple[bytes, bool]:
+        """Audio for a pack 'splice' piece, and whether the name made it in"""
+        _, segments, name, name_free_clip = piece
+        name_clip = self.audio_cache.get(self._speech_request(name, voice_id, voice_style)[2])
+        if name_clip is None:
+            self._render_name_later(name, voice_id, voice_style)
+            return name_free_clip, False
+        parts = [segments[0]]
+        for segment in segments[1:]:
+            parts.extend((name_clip, segment))
+        return b''.join(parts), True
+    
+    def stream_speech(self, text: str, voice_id: Optional[str] = None, voice_style: str = 'empathetic',
+                      name: Optional[str] = None) -> Iterator[bytes]:
+        """Speech for ``text`` as MP3 chunks, yielded as soon as they're available
+        
+        Cached and pre-rendered audio is yielded immediately. The rest is
+        split into sentences synthesized through ElevenLabs' streaming
+        endpoint, up to ``stream_lookahead`` sentences ahead of the one
+        being played, with each upstream chunk forwarded as it arrives.
+        
+        If synthesis fails before the first chunk, ``SpeechStreamError`` is
+        raised so callers can still answer with an error status; a failure
+        after audio has been sent ends the stream early.
+        """
+        selected_voice_id = voice_id or self.voice_id
+        key = self._speech_request(text, selected_voice_id, voice_style)[2]
+        audio_data = self.audio_cache.get(key)
+        if audio_data is not None:
+            yield audio_data
+            return
+        
+        pieces = None
+        if self.voice_pack is not None and voice_style == self.voice_pack.style:
+            pieces = self.voice_pack.compose(text, selected_voice_id, names=[name, DEFAULT_NAME])
+        started = False
+        try:
+            for piece in pieces or [('text', text)]:
+                if piece[0] == 'audio':
+                    started = True
+                    yield piece[1]
+                elif piece[0] == 'splice':
+                    started = True
+                    yield self._splice(piece, selected_voice_id, voice_style)[0]
+                else:
+                    for chunk in self._stream_sentences(piece[1], selected_voice_id, voice_style):
+                        started = True
+                        yield chunk
+        except SpeechStreamError as e:
+            if not started:
+                raise
+            print(f"❌ Speech stream ended early: {e}")
+    
+    def _stream_sentences(self, text: str, voice_id: str, voice_style: str) -> Iterator[bytes]:
+        """Pipelined per-sentence synthesis, yielding chunks in sentence order"""
+        sentences = split_sentences(text)
+        cancelled = threading.Event()
+        channels = []
+        
+        def start(index):
+            channel = queue.Queue()
+            self._stream_executor.submit(self._stream_sentence, sentences[index], voice_id, voice_style, channel, cancelled)
+            channels.append(channel)
+        
+        try:
+            for index in range(min(len(sentences), self.stream_lookahead + 1)):
+                start(index)
+            for index in range(len(sentences)):
+                while True:
+                    chunk = channels[index].get()
+                    if chunk is None:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise SpeechStreamError(f"sentence {index + 1} of {len(sentences)} failed: {chunk}") from chunk
+                    yield chunk
+                if len(channels) < len(sentences):
+                    start(len(channels))
+        finally:
+            # Client went away (or we finished): stop sentences still in flight
+            cancelled.set()
+    
+    def _stream_sentence(self, sentence: str, voice_id: str, voice_style: str,
+                         channel: queue.Queue, cancelled: threading.Event):
+        """Worker: push one sentence's audio chunks into ``channel``, then None
+        
+        A failure is pushed as the exception itself, ahead of the None.
+        """
+        try:
+            clean_text, voice_settings, key = self._speech_request(sentence, voice_id, voice_style)
+            audio_data = self.audio_cache.get(key)
+            if audio_data is not None:
+                channel.put(audio_data)
+                return
+            if not self.api_key:
+                channel.put(RuntimeError("ElevenLabs API key not configured"))
+                return
+            
+            data = {
+                "text": clean_text,
+                "model_id": self.model_id,
+                "voice_settings": voice_settings
+            }
+            parts = []
+            with self.http.post(f"text-to-speech/{voice_id}/stream", label='tts_stream',
+                                json=data, headers=self._speech_headers(), stream=True) as response:
+                if response.status_code != 200:
+                    print(f"❌ Failed to stream speech: {response.status_code}")
+                    channel.put(RuntimeError(f"HTTP {response.status_code}"))
+                    return
+                for chunk in response.iter_content(chunk_size=4096):
+                    if cancelled.is_set():
+                        return
+                    if chunk:
+                        parts.append(chunk)
+                        channel.put(chunk)
+            if not parts:
+                # An empty clip would be cached and served as a hit from then on
+                raise RuntimeError("empty audio response")
+            self.audio_cache.put(key, b''.join(parts))
+        except Exception as e:
+            print(f"❌ Error streaming speech: {e}")
+            channel.put(e)
+        finally:
+            channel.put(None)
+    
+    def _speech_headers(self) -> dict:
+        # The API key travels as a session header
+        return {
+            "Accept": "audio/mpeg",
+            "Content-Type": "application/json"
+        }
+    
+    def _render_name_later(self, name: str, voice_id: str, voice_style: str):
+        """Queue a background render of a name clip, unless it's already queued or the backlog is full"""
+        job = (name, voice_id, voice_style)
+        with self._pending_names_lock:
+            if job in self._pending_names or len(self._pending_names) >= self.name_render_max_pending:
+                return
+            self._pending_names.add(job)
+        
+        def render():
+            try:
+                self.synthesize(name, voice_id, voice_style)
+            finally:
+                with self._pending_names_lock:
+                    self._pending_names.discard(job)
+        
+        try:
+            self._name_executor.submit(render)
+        except RuntimeError:
+            # Interpreter shutting down: the name is simply rendered next time
+            with self._pending_names_lock:
+                self._pending_names.discard(job)
+    
+    def get_cached_audio(self, key: str) -> Optional[bytes]:
+        """Previously synthesized audio by cache key"""
+        return self.audio_cache.get(key)
+    
+    def _request_speech(self, clean_text: str, selected_voice_id: str, voice_settings: dict) -> Optional[bytes]:
+        """Call ElevenLabs text-to-speech (cache misses only)"""
         try:
             if not self.api_key:
                 print("❌ ElevenLabs API key not configured")
                 return None
             
-            # Clean and enhance text for natural speech
-            clean_text = self._enhance_text_for_natural_speech(text)
-            
-            # Use specified voice or current default
-            selected_voice_id = voice_id or self.voice_id
-            
             print(f"🎤 Generating human-like speech: {clean_text[:50]}...")
             
-            # API endpoint
-            url = f"{self.base_url}/text-to-speech/{selected_voice_id}"
-            
-            # Headers
-            headers = {
-                "Accept": "audio/mpeg",
-                "Content-Type": "application/json",
-                "xi-api-key": self.api_key
-            }
-            
-            # Human-like voice settings based on style
-            voice_settings = self._get_human_voice_settings(voice_style)
-            
             # Enhanced data payload for natural speech
             data = {
                 "text": clean_text,
-                "model_id": "eleven_multilingual_v2",  # Better model for natural speech
+                "model_id": self.model_id,
                 "voice_settings": voice_settings
             }
             
-            # Make request with timeout
-            response = requests.post(url, json=data, headers=headers, timeout=50)
+            # Pooled connection; connect/read timeouts and retries live in the client
+            response = self.http.post(f"text-to-speech/{selected_voice_id}", label='tts',
+                                      json=data, headers=self._speech_headers())
             
             if response.status_code == 200:
                 audio_data = response.content
@@ -192,22 +501,45 @@ class VoiceService:
         return text
     
     def change_voice(self, voice_name: str) -> bool:
-        """Change the current voice"""
-        if voice_name in self.voice_options:
+        """Change the current voice (an alias from voice_options, or a catalog voice name or id)"""
+        voice_id = self.resolve_voice(voice_name, wait=True)
+        if voice_id:
             self.current_voice = voice_name
-            self.voice_id = self.voice_options[voice_name]
+            self.voice_id = voice_id
             print(f"✅ Voice changed to {voice_name}")
             return True
         else:
             print(f"❌ Voice '{voice_name}' not found")
             return False
     
+    def resolve_voice(self, voice: Optional[str], wait: bool = False) -> Optional[str]:
+        """Voice id for an alias, catalog name or id, if the catalog offers it
+        
+        Until a catalog is available only the voice_options aliases are
+        accepted. ``wait=False`` never blocks on the network.
+        """
+        if not voice:
+            return None
+        alias_id = self.voice_options.get(voice.lower())
+        voices = self.get_available_voices(wait=wait)
+        if not voices:
+            return alias_id
+        for entry in voices:
+            if alias_id is not None:
+                if entry['id'] == alias_id:
+                    return alias_id
+            elif entry['id'] == voice or entry['name'].lower() == voice.lower():
+                return entry['id']
+        return None
+    
     def get_current_voice_info(self) -> dict:
         """Get information about the current voice"""
+        catalog = self._catalog
         return {
             'name': self.current_voice,
             'id': self.voice_id,
-            'available_voices': list(self.voice_options.keys())
+            'available_voices': list(self.voice_options.keys()),
+            'catalog_voices': [voice['name'] for voice in catalog['voices']] if catalog else []
         }
     
     def speech_to_text(self, audio_data: bytes) -> Optional[str]:
@@ -269,27 +601,111 @@ class VoiceService:
             print(f"❌ Error in microphone listening: {e}")
             return None
     
-    def get_available_voices(self):
-        """Get list of available voices from ElevenLabs"""
+    def get_available_voices(self, wait: bool = True):
+        """Get list of available voices from ElevenLabs (cached catalog)
+        
+        A stale catalog is returned as-is while a background refresh runs.
+        With nothing cached yet, ``wait`` fetches it now; otherwise the
+        fetch starts in the background and an empty list is returned.
+        """
+        catalog = self._catalog
+        if catalog is not None:
+            if time.time() - catalog['fetched_at'] >= self.catalog_ttl:
+                self._refresh_catalog_in_background()
+            return list(catalog['voices'])
+        if not wait:
+            self._refresh_catalog_in_background()
+            return []
+        return self._refresh_catalog() or []
+    
+    def _fetch_voices(self) -> Optional[list]:
+        """Voice list straight from ElevenLabs; None if it couldn't be fetched"""
         try:
             if not self.api_key:
-                return []
-            
-            url = f"{self.base_url}/voices"
-            headers = {"xi-api-key": self.api_key}
+                return None
             
-            response = requests.get(url, headers=headers)
+            response = self.http.get("voices", label='voices')
             
             if response.status_code == 200:
                 voices = response.json().get('voices', [])
                 return [{'name': v['name'], 'id': v['voice_id']} for v in voices]
             else:
+                self._catalog_error = f"HTTP {response.status_code}"
                 print(f"❌ Failed to get voices: {response.status_code}")
-                return []
+                return None
                 
         except Exception as e:
+            self._catalog_error = str(e)
             print(f"❌ Error getting voices: {e}")
-            return []
+            return None
+    
+    def _refresh_catalog(self) -> Optional[list]:
+        voices = self._fetch_voices()
+        if voices is None:
+            self._catalog_failed_at = time.time()
+            return None
+        catalog = {'fetched_at': time.time(), 'voices': voices}
+        self._catalog = catalog
+        self._catalog_failed_at = None
+        self._catalog_error = None
+        self._save_catalog(catalog)
+        return voices
+    
+    def _refresh_catalog_in_background(self):
+        """Start one refresh at a time, backing off after a failed attempt"""
+        if not self.api_key:
+            return
+        with self._catalog_lock:
+            if self._catalog_refreshing:
+                return
+            if self._catalog_failed_at and time.time() - self._catalog_failed_at < self.catalog_retry_seconds:
+                return
+            self._catalog_refreshing = True
+        
+        def refresh():
+            try:
+                self._refresh_catalog()
+            finally:
+                self._catalog_refreshing = False
+        
+        threading.Thread(target=refresh, name='voice-catalog-refresh', daemon=True).start()
+    
+    def _load_catalog(self) -> Optional[dict]:
+        """Last saved catalog, so a cold start can answer without the network"""
+        try:
+            with open(self.catalog_path, 'r', encoding='utf-8') as f:
+                catalog = json.load(f)
+            if isinstance(catalog.get('voices'), list) and 'fetched_at' in catalog:
+                return catalog
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"⚠️ Ignoring unreadable voice catalog {self.catalog_path}: {e}")
+        return None
+    
+    def _save_catalog(self, catalog: dict):
+        try:
+            directory = os.path.dirname(self.catalog_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.catalog_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(catalog, f)
+            os.replace(tmp_path, self.catalog_path)
+        except OSError as e:
+            print(f"⚠️ Could not save voice catalog: {e}")
+    
+    def catalog_stats(self) -> dict:
+        catalog = self._catalog
+        age = time.time() - catalog['fetched_at'] if catalog else None
+        return {
+            'voices': len(catalog['voices']) if catalog else 0,
+            'age_seconds': round(age) if age is not None else None,
+            'ttl_seconds': self.catalog_ttl,
+            'stale': age is None or age >= self.catalog_ttl,
+            'refreshing': self._catalog_refreshing,
+            'last_error': self._catalog_error
+        }
     
     def test_voice_service(self) -> bool:
         """Test the voice service functionality"""